@@ -0,0 +1,13 @@
+from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+
+
+class CoreConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'core'
+
+    def ready(self):
+        from .sqlite_profile import apply_sqlite_pragmas
+
+        # Tunes SQLite connections that opted in to the production profile
+        connection_created.connect(apply_sqlite_pragmas, dispatch_uid='core.sqlite_profile')
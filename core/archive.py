@@ -0,0 +1,259 @@
+"""
+Archival of closed periods.
+
+Almost every read of sales and the stock ledger is for the last few months, but Sale,
+SaleItem, InventoryLog and StockMovement keep every row ever written, and their indexes
+grow with them. archive_history() moves rows from before a cutoff day into the Archived*
+tables, which core.db_routers.ArchiveRouter can put in a database of their own. Before
+anything moves:
+
+- a StockSnapshot is taken at the cutoff, so stock_as_of() for later moments only reads
+  hot ledger rows;
+- the sale items are folded into SalesRollup, which profit_and_loss() and the stock
+  valuation add to what is left in SaleItem.
+
+Only closed sales move. Pending sales, and sales linked to a Refund or RefundRequest, stay
+hot. Rows move in batches, walked by id. Each batch is locked with SKIP LOCKED, so rows a
+till is refunding or correcting right now are left for the next run instead of blocking
+it, then copied keeping their original ids (COPY on PostgreSQL, see core.bulk_load),
+rolled up and deleted in one transaction. When that transaction fails, the copies are
+deleted from the archive again. A copy replaces whatever an earlier, interrupted run left
+in the archive for the same ids, so a run that stops half way can be re-run, and the list
+and export reads show a row that is in both places only once.
+
+Historical reads go through the archive wherever their window starts before the cutoff:
+ledger_deltas() and so stock_as_of(), recost_inventory(), the sale and audit trail lists,
+single sale lookups and the exports. Each of them counts a row that is in both places once,
+from the hot table.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Exists, F, Max, OuterRef
+from django.utils import timezone
+
+from .bulk_load import copy_insert
+from .models import (
+    ArchiveRun, ArchivedInventoryLog, ArchivedSale, ArchivedSaleItem, ArchivedStockMovement, InventoryLog, Refund,
+    RefundRequest, Sale, SaleItem, SalesRollup, StockMovement,
+)
+from .time_windows import day_start, local_today
+
+RETENTION_DAYS = 90
+BATCH_SIZE = 1000
+
+SALE_FIELDS = (
+    'id', 'shop_id', 'cashier_id', 'total_amount', 'currency', 'payment_method', 'customer_name', 'customer_phone',
+    'status', 'refund_reason', 'refund_type', 'refund_amount', 'refunded_at', 'refunded_by_id', 'created_at',
+    'client_uuid', 'synced_at',
+)
+SALE_ITEM_FIELDS = (
+    'id', 'sale_id', 'product_id', 'quantity', 'unit_price', 'unit_cost', 'total_price', 'refunded', 'refund_quantity',
+    'refund_reason', 'refund_type', 'refund_amount', 'refunded_at', 'refunded_by_id',
+)
+INVENTORY_LOG_FIELDS = (
+    'id', 'shop_id', 'product_id', 'reason_code', 'quantity_change', 'previous_quantity', 'new_quantity',
+    'reference_number', 'notes', 'performed_by_id', 'cost_price', 'created_at',
+)
+STOCK_MOVEMENT_FIELDS = (
+    'id', 'shop_id', 'product_id', 'movement_type', 'transition_type', 'previous_stock', 'quantity_change', 'new_stock',
+    'cost_price', 'total_cost_value', 'inventory_value_change', 'reference_number', 'supplier_name', 'notes',
+    'performed_by_id', 'created_at',
+)
+ROLLUP_TOTALS = ('sale_item_count', 'gross_sales', 'refunds', 'net_revenue', 'quantity_sold', 'cost_of_goods_sold')
+
+
+class ArchiveError(Exception):
+    """A cutoff that is not a closed business day"""
+
+
+def archived_before(shop):
+    """
+    Moment before which rows of `shop` may have been moved to the archive, None if no
+    archive run has started. Failed runs count: the batches they finished did move.
+    """
+    return ArchiveRun.objects.filter(shop=shop).aggregate(cutoff=Max('cutoff'))['cutoff']
+
+
+def reads_archive(shop, start=None):
+    """Whether a read of rows created at or after `start` (None: all history) must include the archive"""
+    cutoff = archived_before(shop)
+    return cutoff is not None and (start is None or start < cutoff)
+
+
+def hot_ids_before(model, shop, cutoff, **filters):
+    """
+    Ids of `model` rows of `shop` created before `cutoff` but still hot. A run that died
+    between its archive and hot commits leaves such rows in both tables; aggregates over
+    the archive exclude these ids so the hot copy is counted once. One indexed query,
+    normally empty: besides those leftovers it only finds rows an archive run skipped
+    while they were locked and rows back-dated after the run, like offline sales.
+    """
+    return list(model.objects.filter(shop=shop, **filters).filter(created_at__lt=cutoff).values_list('id', flat=True))
+
+
+def archivable_sales(shop, cutoff):
+    """Closed sales created before `cutoff` that nothing hot still points at"""
+    from .reports import REPORTED_SALE_STATUSES
+
+    return Sale.objects.filter(shop=shop, created_at__lt=cutoff, status__in=REPORTED_SALE_STATUSES).exclude(
+        Exists(Refund.objects.filter(sale=OuterRef('pk')))
+    ).exclude(
+        Exists(RefundRequest.objects.filter(sale=OuterRef('pk')))
+    )
+
+
+def _roll_up_sales(shop, sale_items):
+    """Add the totals of `sale_items` to SalesRollup; call inside the transaction that deletes them"""
+    from .reports import sales_rollup_rows
+
+    rows = list(sales_rollup_rows(sale_items))
+    if not rows:
+        return
+    existing = {
+        (rollup.day, rollup.product_id): rollup
+        for rollup in SalesRollup.objects.select_for_update().filter(
+            shop=shop, day__in={row['day'] for row in rows}, product_id__in={row['product_id'] for row in rows}
+        )
+    }
+    created, updated = [], []
+    for row in rows:
+        rollup = existing.get((row['day'], row['product_id']))
+        if rollup is None:
+            rollup = SalesRollup(shop=shop, day=row['day'], product_id=row['product_id'])
+            created.append(rollup)
+        else:
+            updated.append(rollup)
+        for field in ROLLUP_TOTALS:
+            setattr(rollup, field, getattr(rollup, field) + (row[field] or 0))
+        if rollup.last_sale_at is None or row['last_sale_at'] > rollup.last_sale_at:
+            rollup.last_sale_at = row['last_sale_at']
+    SalesRollup.objects.bulk_create(created)
+    SalesRollup.objects.bulk_update(updated, [*ROLLUP_TOTALS, 'last_sale_at'])
+
+
+def _copy_to_archive(archived_model, rows):
+    """Insert `rows` into the archive, replacing rows with the same ids"""
+    using = archived_model.objects.db
+    with transaction.atomic(using=using):
+        archived_model.objects.filter(id__in=[row['id'] for row in rows]).delete()
+        copy_insert(archived_model, [archived_model(**row) for row in rows], using=using)
+
+
+def _discard_copies(archived_model, ids):
+    """
+    Delete the archived copies of rows whose move was rolled back. A separate archive
+    database commits them on its own, and a row that is both hot and archived would be
+    counted twice by the ledger and the reports.
+    """
+    archived_model.objects.filter(id__in=ids).delete()
+
+
+def _archive_sales(shop, sales, sale_ids):
+    """Archive the sales of `sale_ids` that can be locked; returns (sales, sale items) moved"""
+    copied = []
+    try:
+        with transaction.atomic():
+            sale_ids = list(sales.select_for_update(skip_locked=True).filter(id__in=sale_ids).values_list('id', flat=True))
+            if not sale_ids:
+                return 0, 0
+            items = list(SaleItem.objects.filter(sale_id__in=sale_ids).values(
+                *SALE_ITEM_FIELDS,
+                product_name=F('product__name'),
+                product_price=F('product__price'),
+                product_price_type=F('product__price_type'),
+            ))
+            # Sales before items: replacing an archived sale cascades to its archived items
+            copied = sale_ids
+            _copy_to_archive(ArchivedSale, list(Sale.objects.filter(id__in=sale_ids).values(
+                *SALE_FIELDS, cashier_name=F('cashier__name'), refunded_by_name=F('refunded_by__name')
+            )))
+            _copy_to_archive(ArchivedSaleItem, items)
+
+            _roll_up_sales(shop, SaleItem.objects.filter(sale_id__in=sale_ids))
+            SaleItem.objects.filter(sale_id__in=sale_ids).delete()
+            Sale.objects.filter(id__in=sale_ids).delete()
+    except Exception:
+        _discard_copies(ArchivedSale, copied)
+        raise
+    return len(sale_ids), len(items)
+
+
+def _archive_ledger(model, archived_model, fields, rows, ids, **names):
+    """Archive the rows of `ids` that can be locked; returns how many moved"""
+    copied = []
+    try:
+        with transaction.atomic():
+            ids = list(rows.select_for_update(skip_locked=True).filter(id__in=ids).values_list('id', flat=True))
+            if ids:
+                copied = ids
+                _copy_to_archive(archived_model, list(
+                    model.objects.filter(id__in=ids).values(*fields, product_name=F('product__name'), **names)
+                ))
+                model.objects.filter(id__in=ids).delete()
+    except Exception:
+        _discard_copies(archived_model, copied)
+        raise
+    return len(ids)
+
+
+def _batches(queryset, batch_size):
+    """Id lists of `queryset` rows in id order, batch_size at a time"""
+    last = 0
+    while True:
+        ids = list(queryset.filter(id__gt=last).order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return
+        yield ids
+        last = ids[-1]
+
+
+def archive_history(shop, archived_through=None, batch_size=BATCH_SIZE, progress=None):
+    """
+    Move sales and ledger rows of business days up to `archived_through` (default: all
+    but the last RETENTION_DAYS days) to the archive tables. `progress(table, done, total)`
+    is called after every batch. Returns the completed ArchiveRun.
+    """
+    from .stock_ledger import take_snapshots
+
+    today = local_today()
+    archived_through = archived_through or today - timedelta(days=RETENTION_DAYS)
+    if archived_through >= today:
+        raise ArchiveError("Only closed business days can be archived; archived_through must be before today")
+    cutoff = day_start(archived_through + timedelta(days=1))
+    progress = progress or (lambda table, done, total: None)
+
+    run = ArchiveRun.objects.create(shop=shop, archived_through=archived_through, cutoff=cutoff)
+    try:
+        # Reconstructed from the ledger, so it has to come before the ledger moves
+        take_snapshots(shop, archived_through)
+
+        sales = archivable_sales(shop, cutoff)
+        total = sales.count()
+        for sale_ids in _batches(sales, batch_size):
+            moved, items = _archive_sales(shop, sales, sale_ids)
+            run.sales += moved
+            run.sale_items += items
+            progress('sales', run.sales, total)
+
+        for model, archived_model, fields, names, counter in (
+            (InventoryLog, ArchivedInventoryLog, INVENTORY_LOG_FIELDS, {'performed_by_name': F('performed_by__name')}, 'inventory_logs'),
+            (StockMovement, ArchivedStockMovement, STOCK_MOVEMENT_FIELDS, {}, 'stock_movements'),
+        ):
+            rows = model.objects.filter(shop=shop, created_at__lt=cutoff)
+            total = rows.count()
+            for ids in _batches(rows, batch_size):
+                moved = _archive_ledger(model, archived_model, fields, rows, ids, **names)
+                setattr(run, counter, getattr(run, counter) + moved)
+                progress(counter, getattr(run, counter), total)
+    except Exception as e:
+        run.status = 'failed'
+        run.error = str(e)
+        run.finished_at = timezone.now()
+        run.save()
+        raise
+
+    run.status = 'completed'
+    run.finished_at = timezone.now()
+    run.save()
+    return run
@@ -0,0 +1,30 @@
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+from django.views.decorators.csrf import csrf_exempt
+from django.utils.decorators import method_decorator
+from .models import ShopConfiguration
+from .cost_layers import layer_valuation
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class CostLayerValuationView(APIView):
+    """
+    Inventory value by cost layer: every open layer with its remaining quantity and value,
+    plus totals per product and for the shop.
+    """
+    def get(self, request):
+        shop = ShopConfiguration.objects.get()
+
+        product_ids = []
+        for value in request.query_params.getlist('product_id'):
+            try:
+                product_ids.append(int(value))
+            except ValueError:
+                return Response({"error": f"Invalid product_id: {value}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        valuation = layer_valuation(shop, product_ids)
+        return Response({
+            'costing_method': shop.costing_method,
+            **valuation
+        }, status=status.HTTP_200_OK)
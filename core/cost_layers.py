@@ -0,0 +1,288 @@
+"""
+Cost layers: what the stock on hand actually cost.
+
+Stock coming in opens a CostLayer at its receipt cost. FIFO shops open one layer per
+receipt. Moving-average shops fold receipts into the product's open layer, re-averaging
+its unit cost. Stock going out consumes layers oldest first, and the consumed value
+becomes the cost of that movement.
+Product.cost_price follows the remaining layers (their value / their quantity), so a new
+supplier price moves the carrying cost gradually instead of revaluing everything on hand.
+
+Invariant: a product's open layers add up to max(0, stock_quantity). Oversold stock has
+no layers; it is costed at the product's carrying cost, and receipts first fill the hole.
+
+apply_stock_costs() is called by every posting path with all of its changes at once: one
+locking read of the open layers, one bulk update, one bulk insert and one carrying-cost
+UPDATE, however many lines are posted.
+"""
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Sum, Value, When
+from django.utils import timezone
+
+from .archive import reads_archive
+from .models import ArchivedInventoryLog, ArchivedStockMovement, CostLayer, InventoryLog, Product, StockMovement
+from .quantities import ZERO, line_value, money, qty, unit_cost
+from .sync import record_changes
+
+
+def _open_layers(shop, product_ids):
+    layers = {}
+    for layer in CostLayer.objects.select_for_update().filter(
+        shop=shop, product_id__in=product_ids, remaining_quantity__gt=0
+    ).order_by('received_at', 'id'):
+        layers.setdefault(layer.product_id, []).append(layer)
+    return layers
+
+
+def _receive(shop, layers, product, quantity, cost, method, received_at, reference_number):
+    """Add `quantity` at `cost` to the product's layers; returns a layer to insert, or None"""
+    if method == 'average' and layers:
+        pool = layers[-1]
+        total = pool.remaining_quantity + quantity
+        pool.unit_cost = unit_cost(
+            (pool.remaining_quantity * pool.unit_cost + quantity * cost) / total
+        )
+        pool.original_quantity += quantity
+        pool.remaining_quantity = total
+        return None
+    layer = CostLayer(
+        shop=shop,
+        product=product,
+        received_at=received_at,
+        unit_cost=unit_cost(cost),
+        original_quantity=quantity,
+        remaining_quantity=quantity,
+        reference_number=reference_number,
+    )
+    layers.append(layer)
+    return layer
+
+
+def _consume(layers, quantity, fallback_cost):
+    """Take `quantity` out of the oldest layers; returns the value consumed"""
+    value = ZERO
+    while quantity > 0 and layers:
+        layer = layers[0]
+        taken = min(quantity, layer.remaining_quantity)
+        layer.remaining_quantity -= taken
+        value += taken * layer.unit_cost
+        quantity -= taken
+        if layer.remaining_quantity <= 0:
+            layers.pop(0)
+    # Anything beyond the layers is oversold stock
+    return value + quantity * fallback_cost
+
+
+def _layer_changes(shop, changes, products, layers, method, now):
+    """Walk `changes` in order against `layers`; returns new layers to insert"""
+    created = []
+    for change in changes:
+        product = products[change['product_id']]
+        product_layers = layers.setdefault(product.id, [])
+        previous_stock = qty(change['previous_stock'])
+        new_stock = qty(change['new_stock'])
+        on_hand_before = max(ZERO, previous_stock)
+        on_hand_after = max(ZERO, new_stock)
+
+        if not product_layers and on_hand_before > 0:
+            # Stock from before this product had layers opens at its carrying cost
+            opening = _receive(
+                shop, product_layers, product, on_hand_before, unit_cost(product.cost_price),
+                method, now, 'Opening balance'
+            )
+            created.append(opening)
+
+        if new_stock < previous_stock:
+            quantity = previous_stock - new_stock
+            value = _consume(product_layers, quantity, unit_cost(product.cost_price))
+            change['cost_price'] = money(value / quantity)
+            continue
+
+        cost = unit_cost(change.get('cost_price') or product.cost_price)
+        if on_hand_after > on_hand_before:
+            layer = _receive(
+                shop, product_layers, product, on_hand_after - on_hand_before, cost,
+                method, change.get('received_at') or now, change.get('reference_number', '')
+            )
+            if layer is not None:
+                created.append(layer)
+        if change.get('cost_price') is None:
+            change['cost_price'] = money(cost)
+    return created
+
+
+def apply_stock_costs(shop, changes, products, method=None):
+    """
+    Run stock changes through the cost layers of `shop`.
+
+    `changes` are dicts with product_id, previous_stock and new_stock, in posting order.
+    Incoming changes may carry cost_price (default: the product's carrying cost),
+    received_at and reference_number. Every change comes back with 'cost_price' set:
+    outgoing ones to the average cost of the layers they consumed, the rest to the cost
+    they came in at, which is the carrying cost when nothing moved.
+    `products` maps product_id to instances locked by the caller; their cost_price is
+    refreshed along with the database. Must run inside transaction.atomic().
+    """
+    if not changes:
+        return
+    method = method or shop.costing_method
+    product_ids = list({change['product_id'] for change in changes})
+    layers = _open_layers(shop, product_ids)
+    existing = [layer for product_layers in layers.values() for layer in product_layers]
+
+    created = _layer_changes(shop, changes, products, layers, method, timezone.now())
+
+    # Quantities stay at field precision; consumption can leave sub-cent remainders otherwise
+    for layer in existing + created:
+        layer.remaining_quantity = qty(layer.remaining_quantity)
+        layer.original_quantity = qty(layer.original_quantity)
+    CostLayer.objects.bulk_update(existing, ['unit_cost', 'original_quantity', 'remaining_quantity'], batch_size=500)
+    CostLayer.objects.bulk_create(created, batch_size=500)
+    _refresh_carrying_costs(shop, products, layers)
+
+
+def _refresh_carrying_costs(shop, products, layers):
+    """Set cost_price of products with stock in layers to the layers' average cost, in one UPDATE"""
+    costs = {}
+    for product_id, product_layers in layers.items():
+        quantity = sum((layer.remaining_quantity for layer in product_layers), ZERO)
+        if quantity <= 0:
+            continue
+        value = sum((layer.remaining_quantity * layer.unit_cost for layer in product_layers), ZERO)
+        cost = money(value / quantity)
+        if cost != products[product_id].cost_price:
+            costs[product_id] = cost
+    if not costs:
+        return
+
+    cost_field = Product._meta.get_field('cost_price')
+    Product.objects.filter(shop=shop, id__in=list(costs)).update(
+        cost_price=Case(
+            *[When(id=product_id, then=Value(cost)) for product_id, cost in costs.items()],
+            default=F('cost_price'),
+            output_field=DecimalField(max_digits=cost_field.max_digits, decimal_places=cost_field.decimal_places),
+        ),
+        updated_at=timezone.now(),
+    )
+    for product_id, cost in costs.items():
+        products[product_id].cost_price = cost
+    record_changes(shop, 'product', list(costs))
+
+
+def recost_inventory(shop, method=None, product_ids=None):
+    """
+    Rebuild the cost layers of `shop` from its stock ledger and refresh carrying costs.
+
+    Ledger rows are read with two queries and replayed in memory in one pass. Stock the
+    ledger does not explain (from before it existed) opens the history as a layer at the
+    current cost price.
+    Returns the number of layers written.
+    """
+    from .stock_ledger import MIRRORED_LOG_REASONS
+
+    method = method or shop.costing_method
+    products = Product.objects.filter(shop=shop)
+    if product_ids is not None:
+        products = products.filter(id__in=product_ids)
+
+    with transaction.atomic():
+        products = {product.id: product for product in products.select_for_update()}
+        filters = {'shop': shop, 'product_id__in': list(products)}
+        fields = ('id', 'product_id', 'quantity_change', 'cost_price', 'created_at', 'reference_number')
+        logs = list(InventoryLog.objects.filter(**filters).exclude(reason_code__in=MIRRORED_LOG_REASONS).values(*fields))
+        movements = list(StockMovement.objects.filter(**filters).values(*fields))
+        rows = logs + movements
+        if reads_archive(shop):
+            # A row an interrupted archive run left in both tables is replayed once, from the hot table
+            archived = {'shop_id': shop.id, 'product_id__in': list(products)}
+            hot_logs = {row['id'] for row in logs}
+            hot_movements = {row['id'] for row in movements}
+            rows += [row for row in ArchivedInventoryLog.objects.filter(**archived).exclude(
+                reason_code__in=MIRRORED_LOG_REASONS
+            ).values(*fields) if row['id'] not in hot_logs]
+            rows += [row for row in ArchivedStockMovement.objects.filter(**archived).values(*fields) if row['id'] not in hot_movements]
+        rows.sort(key=lambda row: row['created_at'])
+
+        # Stock the ledger does not explain predates it and becomes the opening layer
+        running = {product_id: qty(product.stock_quantity) for product_id, product in products.items()}
+        for row in rows:
+            running[row['product_id']] -= row['quantity_change']
+
+        now = timezone.now()
+        if rows:
+            now = min(now, rows[0]['created_at'])
+        changes = [{
+            'product_id': product_id,
+            'previous_stock': ZERO,
+            'new_stock': opening_stock,
+            'cost_price': products[product_id].cost_price,
+            'received_at': now,
+            'reference_number': 'Opening balance',
+        } for product_id, opening_stock in running.items() if opening_stock > 0]
+        for row in rows:
+            previous_stock = running[row['product_id']]
+            running[row['product_id']] = previous_stock + row['quantity_change']
+            changes.append({
+                'product_id': row['product_id'],
+                'previous_stock': previous_stock,
+                'new_stock': running[row['product_id']],
+                'cost_price': row['cost_price'],
+                'received_at': row['created_at'],
+                'reference_number': row['reference_number'],
+            })
+
+        layers = {}
+        created = _layer_changes(shop, changes, products, layers, method, now)
+        for layer in created:
+            layer.remaining_quantity = qty(layer.remaining_quantity)
+            layer.original_quantity = qty(layer.original_quantity)
+
+        CostLayer.objects.filter(shop=shop, product_id__in=list(products)).delete()
+        CostLayer.objects.bulk_create(
+            [layer for layer in created if layer.remaining_quantity > 0], batch_size=500
+        )
+        _refresh_carrying_costs(shop, products, layers)
+    return sum(1 for layer in created if layer.remaining_quantity > 0)
+
+
+def layer_valuation(shop, product_ids=None):
+    """
+    Open layers with their value, plus per-product and overall totals.
+    Returns {'layers': [...], 'products': [...], 'total_quantity', 'total_value'}.
+    """
+    layers = CostLayer.objects.filter(shop=shop, remaining_quantity__gt=0)
+    if product_ids:
+        layers = layers.filter(product_id__in=product_ids)
+
+    rows = list(layers.order_by('product_id', 'received_at', 'id').values(
+        'id', 'product_id', 'product__name', 'received_at', 'unit_cost',
+        'original_quantity', 'remaining_quantity', 'reference_number'
+    ))
+    per_product = layers.values('product_id', 'product__name').annotate(
+        quantity=Sum('remaining_quantity'),
+        value=Sum(F('remaining_quantity') * F('unit_cost')),
+    ).order_by('product__name')
+
+    products = [{
+        'product_id': row['product_id'],
+        'product_name': row['product__name'],
+        'quantity': float(row['quantity']),
+        'value': float(money(row['value'])),
+        'average_cost': float(money(row['value'] / row['quantity'])),
+    } for row in per_product]
+    return {
+        'layers': [{
+            'id': row['id'],
+            'product_id': row['product_id'],
+            'product_name': row['product__name'],
+            'received_at': row['received_at'],
+            'reference_number': row['reference_number'],
+            'unit_cost': float(row['unit_cost']),
+            'original_quantity': float(row['original_quantity']),
+            'remaining_quantity': float(row['remaining_quantity']),
+            'value': float(line_value(row['remaining_quantity'], row['unit_cost'])),
+        } for row in rows],
+        'products': products,
+        'total_quantity': sum(product['quantity'] for product in products),
+        'total_value': float(sum(money(row['value']) for row in per_product)),
+    }
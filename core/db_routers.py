@@ -0,0 +1,37 @@
+"""
+Database router for the archive tables.
+
+Add 'core.db_routers.ArchiveRouter' to DATABASE_ROUTERS and an 'archive' entry to
+DATABASES to keep archived sales and ledger rows in their own database file. Without the
+'archive' alias the archive tables live next to everything else in 'default'. Migrate
+both databases: `manage.py migrate` and `manage.py migrate --database archive`.
+"""
+from django.conf import settings
+
+ARCHIVE_DATABASE = 'archive'
+ARCHIVE_MODELS = {'archivedsale', 'archivedsaleitem', 'archivedinventorylog', 'archivedstockmovement'}
+
+
+def archive_database_configured():
+    return ARCHIVE_DATABASE in settings.DATABASES
+
+
+class ArchiveRouter:
+    def _route(self, model):
+        if model._meta.app_label == 'core' and model._meta.model_name in ARCHIVE_MODELS and archive_database_configured():
+            return ARCHIVE_DATABASE
+        return None
+
+    def db_for_read(self, model, **hints):
+        return self._route(model)
+
+    def db_for_write(self, model, **hints):
+        return self._route(model)
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if not archive_database_configured():
+            return None
+        archived = app_label == 'core' and model_name in ARCHIVE_MODELS
+        if db == ARCHIVE_DATABASE:
+            return archived
+        return False if archived else None
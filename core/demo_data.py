@@ -0,0 +1,319 @@
+"""
+Synthetic shop data for load tests and benchmarks.
+
+generate_demo_data() fills a shop with a catalogue and a trading history that look like a
+real shop's. The catalogue has EAN-13 barcodes, some additional barcodes and a few
+products sold by weight. The history covers every business day up to yesterday: sales
+during opening hours, with more on Fridays and Saturdays and a few best sellers, restock
+receipts, waste, and weekly and monthly stock takes. Every stock change goes through the
+ledger (InventoryLog, or StockMovement for waste), so stock_as_of(), the cost layers and
+the valuation all add up.
+
+Rows are written a day at a time with copy_insert() (COPY on PostgreSQL), with ids
+assigned here, so memory stays flat whatever the scale. The cost layers are then rebuilt
+from the ledger with recost_inventory(), and the waste rollup with rebuild_rollup().
+The same seed always gives the same data.
+"""
+import random
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import Max
+
+from .bulk_load import copy_insert, historical_timestamps, reset_sequences
+from .cost_layers import recost_inventory
+from .models import (
+    Cashier, InventoryLog, Product, ProductBarcode, Sale, SaleItem, ShopConfiguration, StockMovement, StockTake,
+    StockTakeItem, Waste,
+)
+from .quantities import line_value
+from .time_windows import day_start, local_today
+from .waste_analytics import rebuild_rollup
+
+SCALES = {
+    'tiny': {'products': 40, 'cashiers': 2, 'days': 14, 'sales_per_day': 20, 'waste_per_day': 1},
+    'small': {'products': 300, 'cashiers': 4, 'days': 60, 'sales_per_day': 80, 'waste_per_day': 3},
+    'medium': {'products': 3000, 'cashiers': 10, 'days': 180, 'sales_per_day': 400, 'waste_per_day': 10},
+    'large': {'products': 15000, 'cashiers': 25, 'days': 365, 'sales_per_day': 2000, 'waste_per_day': 30},
+}
+
+DEMO_PASSWORD = 'demo1234'
+
+CATEGORIES = {
+    'Bakery': ['Bread', 'Rolls', 'Buns', 'Scones', 'Muffins'],
+    'Dairy': ['Milk', 'Yoghurt', 'Butter', 'Cheese', 'Cream'],
+    'Groceries': ['Rice', 'Maize Meal', 'Sugar', 'Flour', 'Cooking Oil', 'Salt', 'Pasta'],
+    'Beverages': ['Cola', 'Orange Juice', 'Water', 'Tea', 'Coffee', 'Energy Drink'],
+    'Household': ['Soap', 'Washing Powder', 'Bleach', 'Candles', 'Matches'],
+    'Produce': ['Tomatoes', 'Onions', 'Potatoes', 'Bananas', 'Apples', 'Cabbage'],
+    'Butchery': ['Beef Mince', 'Chicken Pieces', 'Pork Chops', 'Sausages'],
+    'Toiletries': ['Toothpaste', 'Lotion', 'Shampoo', 'Tissue Paper'],
+}
+# Sold by weight; everything else by the unit
+WEIGHED_CATEGORIES = ('Produce', 'Butchery')
+BRANDS = ['Lumina', 'Golden', 'Sunrise', 'Valley', 'Prime', 'Harvest', 'Royal', 'Classic']
+SIZES = ['250g', '500g', '1kg', '2kg', '5kg', '300ml', '500ml', '1L', '2L', 'single', 'pack of 6']
+SUPPLIERS = ['National Foods', 'Dairibord', 'Delta Beverages', 'Unilever', 'Local Farms', 'Irvines']
+
+PAYMENT_METHODS = ['cash', 'ecocash', 'card', 'transfer']
+PAYMENT_WEIGHTS = [55, 25, 15, 5]
+WASTE_REASONS = ['EXPIRED', 'DAMAGED', 'SPOILED', 'STALE', 'OTHER']
+
+OPENING_HOUR = 8
+CLOSING_HOUR = 20
+# Sales per hour of the day relative to the quietest hours: lunch and after-work peaks
+HOURLY_WEIGHTS = [2, 3, 3, 4, 6, 5, 4, 4, 5, 6, 6, 3]
+# Monday..Sunday
+WEEKDAY_WEIGHTS = [0.9, 0.85, 0.9, 1.0, 1.3, 1.4, 0.7]
+STOCK_TAKE_ITEMS = 50
+
+
+def ean13(number):
+    """EAN-13 barcode for a 12-digit number, check digit included"""
+    digits = f'{number:012d}'
+    total = sum(int(digit) * (3 if position % 2 else 1) for position, digit in enumerate(digits))
+    return digits + str((10 - total % 10) % 10)
+
+
+class _Generator:
+    def __init__(self, shop, rng, options):
+        self.shop = shop
+        self.rng = rng
+        self.options = options
+        self.next_ids = {}
+        self.stock = {}
+        self.pending = {}
+        self.counts = {}
+
+    def allocate_id(self, model):
+        if model not in self.next_ids:
+            self.next_ids[model] = (model.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+        allocated = self.next_ids[model]
+        self.next_ids[model] += 1
+        return allocated
+
+    def add(self, obj):
+        obj.id = self.allocate_id(type(obj))
+        self.pending.setdefault(type(obj), []).append(obj)
+        return obj
+
+    def flush(self):
+        # Insertion order follows the foreign keys: sales before items, stock takes before theirs
+        for model in (Product, ProductBarcode, Cashier, Sale, SaleItem, InventoryLog, StockMovement, Waste, StockTake, StockTakeItem):
+            objects = self.pending.pop(model, [])
+            if objects:
+                copy_insert(model, objects)
+                table = model._meta.verbose_name_plural.capitalize()
+                self.counts[table] = self.counts.get(table, 0) + len(objects)
+
+    def log(self, product, change, at, reason_code, reference_number='', performed_by=None, notes=''):
+        previous = self.stock[product.id]
+        self.stock[product.id] = previous + change
+        self.add(InventoryLog(
+            shop=self.shop, product=product, reason_code=reason_code, quantity_change=change,
+            previous_quantity=previous, new_quantity=self.stock[product.id], reference_number=reference_number,
+            notes=notes, performed_by=performed_by, cost_price=product.cost_price, created_at=at,
+        ))
+
+    def catalogue(self, count, opened_at):
+        rng = self.rng
+        products = []
+        for number in range(count):
+            category = rng.choice(list(CATEGORIES))
+            cost = Decimal(rng.randint(30, 2500)) / 100
+            product = self.add(Product(
+                shop=self.shop,
+                name=f'{rng.choice(BRANDS)} {rng.choice(CATEGORIES[category])} {rng.choice(SIZES)} #{number + 1}',
+                price=(cost * Decimal(rng.uniform(1.15, 1.6))).quantize(Decimal('0.01')),
+                cost_price=cost,
+                category=category,
+                price_type='kg' if category in WEIGHED_CATEGORIES else 'unit',
+                barcode=ean13(600000000000 + self.shop.id * 1000000 + number),
+                line_code=f'{self.shop.id:03d}{number:05d}',
+                min_stock_level=Decimal(rng.choice([5, 10, 20])),
+                supplier=rng.choice(SUPPLIERS),
+                created_at=opened_at,
+            ))
+            # One product in five also carries a supplier barcode or an old packaging code
+            if rng.random() < 0.2:
+                product.additional_barcodes = [ean13(700000000000 + self.shop.id * 1000000 + number)]
+                self.add(ProductBarcode(shop=self.shop, product=product, barcode=product.additional_barcodes[0]))
+            self.stock[product.id] = Decimal('0')
+            products.append(product)
+        return products
+
+    def staff(self, count, hired_at):
+        password = make_password(DEMO_PASSWORD)
+        return [
+            self.add(Cashier(
+                shop=self.shop, name=f'Cashier {number + 1}', phone=f'0770{self.shop.id:03d}{number:03d}',
+                email=f'cashier{number + 1}.{self.shop.register_id}@example.com', password=password, status='active',
+                preferred_shift=self.rng.choice(['morning', 'afternoon']), created_at=hired_at,
+            ))
+            for number in range(count)
+        ]
+
+    def restock(self, products, at, opening=False):
+        for product in products:
+            if opening or self.stock[product.id] < product.min_stock_level * 2:
+                quantity = Decimal(self.rng.randint(4, 12) * 10)
+                self.log(product, quantity, at, 'RECEIPT', f'GRN-{at:%Y%m%d}-{product.id}',
+                         notes=f'Delivery from {product.supplier}')
+
+    def sales(self, day, products, cum_weights, cashiers):
+        rng = self.rng
+        opening = day_start(day) + timedelta(hours=OPENING_HOUR)
+        count = round(self.options['sales_per_day'] * WEEKDAY_WEIGHTS[day.weekday()] * rng.uniform(0.85, 1.15))
+        hours = rng.choices(range(CLOSING_HOUR - OPENING_HOUR), weights=HOURLY_WEIGHTS, k=count)
+        for at in sorted(opening + timedelta(hours=hour, seconds=rng.randint(0, 3599)) for hour in hours):
+            cashier = rng.choice(cashiers)
+            lines = {product.id: product for product in rng.choices(products, cum_weights=cum_weights, k=rng.randint(1, 6))}
+            sale = self.add(Sale(
+                shop=self.shop, cashier=cashier, total_amount=Decimal('0'),
+                payment_method=rng.choices(PAYMENT_METHODS, weights=PAYMENT_WEIGHTS)[0], status='completed', created_at=at,
+            ))
+            for product in lines.values():
+                if product.price_type == 'unit':
+                    quantity = Decimal(rng.choices([1, 2, 3, 4], weights=[70, 20, 7, 3])[0])
+                else:
+                    quantity = (Decimal(rng.randint(25, 300)) / 100)
+                total = line_value(quantity, product.price)
+                sale.total_amount += total
+                self.add(SaleItem(
+                    sale=sale, product=product, quantity=quantity, unit_price=product.price,
+                    unit_cost=product.cost_price, total_price=total,
+                ))
+                self.log(product, -quantity, at, 'SALE', f'Sale #{sale.id}', performed_by=cashier,
+                         notes=f'Sold {quantity} x {product.name} to customer')
+
+    def waste(self, day, products, cashiers):
+        rng = self.rng
+        for _ in range(self.options['waste_per_day']):
+            product = rng.choice(products)
+            quantity = Decimal(rng.randint(1, 3))
+            at = day_start(day) + timedelta(hours=CLOSING_HOUR, minutes=rng.randint(0, 59))
+            reason = rng.choice(WASTE_REASONS)
+            recorded_by = rng.choice(cashiers)
+            previous = self.stock[product.id]
+            self.stock[product.id] = previous - quantity
+            waste = self.add(Waste(
+                shop=self.shop, product=product, quantity=quantity, reason=reason, line_code=product.line_code,
+                barcode=product.barcode, cost_price=product.cost_price, waste_value=line_value(quantity, product.cost_price),
+                recorded_by=recorded_by, created_at=at,
+            ))
+            self.add(StockMovement(
+                shop=self.shop, product=product, movement_type='DAMAGE', previous_stock=previous,
+                quantity_change=-quantity, new_stock=self.stock[product.id], cost_price=product.cost_price,
+                total_cost_value=waste.waste_value, inventory_value_change=-waste.waste_value,
+                notes=f'Waste recorded: {waste.get_reason_display()} - No details', performed_by=recorded_by, created_at=at,
+            ))
+
+    def stock_take(self, day, products, cashiers, monthly):
+        rng = self.rng
+        started_at = day_start(day) + timedelta(hours=CLOSING_HOUR, minutes=30)
+        completed_at = started_at + timedelta(minutes=rng.randint(40, 180))
+        counted = products if monthly else rng.sample(products, min(STOCK_TAKE_ITEMS, len(products)))
+        cashier = rng.choice(cashiers)
+        stock_take = self.add(StockTake(
+            shop=self.shop, name=f"{'Monthly' if monthly else 'Weekly'} stock take {day}",
+            stock_take_type='monthly' if monthly else 'weekly', started_by=cashier, completed_by=cashier,
+            started_at=started_at, completed_at=completed_at, created_at=started_at, total_products_counted=len(counted),
+        ))
+        for product in counted:
+            system_quantity = self.stock[product.id]
+            # Most counts match; the rest are out by a unit or two either way
+            discrepancy = Decimal(rng.choice([-2, -1, 1, 2])) if rng.random() < 0.01 else Decimal('0')
+            discrepancy_value = discrepancy * product.cost_price
+            self.add(StockTakeItem(
+                stock_take=stock_take, product=product, system_quantity=system_quantity,
+                counted_quantity=system_quantity + discrepancy, discrepancy=discrepancy,
+                discrepancy_value=discrepancy_value, counted_at=completed_at,
+            ))
+            stock_take.total_discrepancy_value += discrepancy_value
+            if discrepancy > 0:
+                stock_take.overstock_count += 1
+            elif discrepancy < 0:
+                stock_take.understock_count += 1
+            else:
+                stock_take.exact_match_count += 1
+
+        # Same outcome rules as StockTake.complete_stock_take()
+        if stock_take.overstock_count == 0 and stock_take.understock_count == 0:
+            stock_take.balance_status, stock_take.status = 'balanced', 'completed'
+        elif monthly:
+            stock_take.balance_status, stock_take.status = 'unbalanced', 'completed'
+            stock_take.failure_reason = (
+                f'Monthly reconciliation completed with {stock_take.overstock_count} overstock, '
+                f'{stock_take.understock_count} understock items requiring investigation.'
+            )
+        else:
+            stock_take.balance_status, stock_take.status = 'unbalanced', 'failed'
+            stock_take.failure_reason = (
+                f'Stock take failed balancing check: {stock_take.overstock_count} overstock, '
+                f'{stock_take.understock_count} understock items found. Weekly stock takes must have zero discrepancies to complete.'
+            )
+
+
+def create_demo_shop(rng):
+    register_id = f'{rng.randint(0, 99999):05d}'
+    while ShopConfiguration.objects.filter(register_id=register_id).exists():
+        register_id = f'{rng.randint(0, 99999):05d}'
+    shop = ShopConfiguration(
+        register_id=register_id, name=f'Demo Shop {register_id}', address='1 Demo Street, Harare',
+        business_type='Retail', industry='Grocery', email=f'demo{register_id}@example.com', phone='0242000000',
+        shop_owner_master_password=DEMO_PASSWORD, shop_id=uuid.UUID(int=rng.getrandbits(128)),
+    )
+    shop.set_password(DEMO_PASSWORD)
+    shop.save()
+    return shop
+
+
+def generate_demo_data(shop=None, scale='small', seed=0, progress=None, **overrides):
+    """
+    Generate a catalogue and `days` of history ending yesterday for `shop` (default: a new
+    demo shop). `overrides` replace the settings of `scale`. `progress(day, days)` is called
+    after each day. Returns (shop, {table: rows written}).
+    """
+    options = {**SCALES[scale], **{key: value for key, value in overrides.items() if value is not None}}
+    rng = random.Random(seed)
+    progress = progress or (lambda day, days: None)
+
+    today = local_today()
+    first_day = today - timedelta(days=options['days'])
+    models = (Product, ProductBarcode, Cashier, Sale, SaleItem, InventoryLog, StockMovement, Waste, StockTake, StockTakeItem)
+
+    with historical_timestamps(*models):
+        shop = shop or create_demo_shop(rng)
+        generator = _Generator(shop, rng, options)
+        opened_at = day_start(first_day) + timedelta(hours=7)
+        products = generator.catalogue(options['products'], opened_at)
+        cashiers = generator.staff(options['cashiers'], opened_at)
+        generator.restock(products, opened_at, opening=True)
+        generator.flush()
+
+        # A few products sell far more than the rest
+        popularity = sorted(products, key=lambda product: rng.random())
+        cum_weights = list(accumulate(1 / (rank + 1) ** 0.9 for rank in range(len(popularity))))
+        for number in range(options['days']):
+            day = first_day + timedelta(days=number)
+            with transaction.atomic():
+                if number:
+                    generator.restock(products, day_start(day) + timedelta(hours=7))
+                generator.sales(day, popularity, cum_weights, cashiers)
+                generator.waste(day, products, cashiers)
+                if day.weekday() == 6:
+                    generator.stock_take(day, products, cashiers, monthly=(day + timedelta(days=7)).month != day.month)
+                generator.flush()
+            progress(number + 1, options['days'])
+
+    reset_sequences(*models)
+    for product in products:
+        product.stock_quantity = generator.stock[product.id]
+    Product.objects.bulk_update(products, ['stock_quantity'], batch_size=1000)
+    recost_inventory(shop)
+    rebuild_rollup(shop)
+    return shop, generator.counts
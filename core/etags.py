@@ -0,0 +1,49 @@
+"""
+Conditional GET for catalog and reference endpoints.
+
+Tills poll products, discounts and cashiers far more often than they change. Every write
+to those tables already appends to the SyncChange log (see core/sync.py), so the newest
+sync position for (shop, resource) is a change counter. Changes are numbered first, so a
+late commit moves it like any other; then one index-only MAX() yields it, and it goes
+into a strong ETag. The views are wrapped in django.views.decorators.http.condition:
+when If-None-Match matches, the answer is 304 before the view queries or serializes
+anything.
+"""
+import hashlib
+
+from django.db.models import Max
+from django.views.decorators.http import condition
+
+from .models import ShopConfiguration, SyncChange
+from .sync import sequence_changes
+
+
+def resource_version(shop, resource):
+    """Position of the newest change to `resource` in `shop`, 0 if none was logged yet"""
+    sequence_changes(shop)
+    return SyncChange.objects.filter(shop=shop, resource=resource).aggregate(version=Max('position'))['version'] or 0
+
+
+def catalog_etag(resource):
+    """etag_func for condition(): changes whenever any `resource` row of the shop changes"""
+    def etag(request, *args, **kwargs):
+        shop = ShopConfiguration.objects.filter().first()
+        if shop is None:
+            return None
+        return f'{resource}-{shop.id}-{resource_version(shop, resource)}'
+    return etag
+
+
+def shop_status_etag(request, *args, **kwargs):
+    """etag_func for ShopStatusView: a digest of the fields it returns"""
+    shop = ShopConfiguration.objects.filter().values_list(
+        'id', 'name', 'email', 'address', 'phone', 'register_id', 'shop_id', 'business_type', 'industry'
+    ).first()
+    if shop is None:
+        return 'unregistered'
+    return hashlib.sha256(repr(shop).encode()).hexdigest()[:32]
+
+
+def conditional_catalog(resource):
+    """View decorator answering If-None-Match with 304 while `resource` is unchanged"""
+    return condition(etag_func=catalog_etag(resource))
@@ -0,0 +1,60 @@
+"""
+Expense recording.
+
+Expense.save() only stores the row. record_expense() is the single place that applies
+the side effects of a new expense, once, inside one transaction:
+- a staff lunch eaten from stock takes the quantity out of the product's stock and
+  writes a STAFF_LUNCH row to the stock ledger
+- an expense tied to a product writes an EXPENSE audit row to the inventory log
+  (InventoryLog.product is required, so other expenses have no audit row)
+"""
+from django.db import transaction
+
+from .models import InventoryLog, Product
+from .quantities import ZERO, qty
+from .reports import invalidate_pnl
+from .stock_ledger import post_stock_changes
+
+
+def record_expense(expense):
+    """
+    Save a new Expense and apply its stock and audit side effects exactly once.
+    Set shop, recorded_by and product on the instance before calling; returns the expense.
+    """
+    if expense.pk is not None:
+        raise ValueError("record_expense() only records new expenses")
+
+    with transaction.atomic():
+        product = None
+        if expense.product_id:
+            product = Product.objects.select_for_update().get(id=expense.product_id)
+            expense.product = product
+        expense.save()
+
+        quantity_change = ZERO
+        if expense.deducts_stock:
+            quantity_change = -qty(expense.quantity)
+            post_stock_changes(expense.shop, [{
+                'product_id': product.id,
+                'quantity_change': quantity_change,
+                'cost_price': expense.product_cost_price,
+                'reference_number': f'Staff Lunch Expense #{expense.id}',
+                'notes': f'Staff lunch: {expense.quantity} units consumed',
+            }], 'STAFF_LUNCH', performed_by=expense.recorded_by, products={product.id: product})
+
+        # Audit trail entry for product expenses; mirrors the STAFF_LUNCH movement, so the stock ledger skips it
+        if product:
+            InventoryLog.objects.create(
+                shop=expense.shop,
+                product=product,
+                reason_code='EXPENSE',
+                quantity_change=quantity_change,
+                previous_quantity=product.stock_quantity - quantity_change,
+                new_quantity=product.stock_quantity,
+                reference_number=f'Expense #{expense.id}',
+                notes=f'Expense recorded: {expense.category} - {expense.description} - {expense.staff_lunch_type}',
+                performed_by=expense.recorded_by,
+                cost_price=expense.product_cost_price
+            )
+        invalidate_pnl(expense.shop_id, expense.expense_date)
+    return expense
@@ -0,0 +1,52 @@
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+from django.http import StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.utils.decorators import method_decorator
+from django.utils.dateparse import parse_date
+from .models import ShopConfiguration
+from .exports import FORMATS, ExportError, export_filename, export_stream
+from .time_windows import local_today
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class ExportView(APIView):
+    """
+    Download one dataset (sales, sale_items, inventory_logs, stock_movements, expenses,
+    wastes) for a range of business days. The file is streamed as it is read, so large
+    ranges do not build up in memory. export_format is csv (default), jsonl (gzipped),
+    arrow or parquet; the last two need pyarrow on the server. ?format= is not used
+    because DRF reserves it for its own renderers.
+    """
+    def get(self, request, dataset):
+        shop = ShopConfiguration.objects.get()
+
+        end_date = local_today()
+        start_date = end_date.replace(day=1)
+        for name in ('start_date', 'end_date'):
+            value = request.query_params.get(name)
+            if value:
+                try:
+                    day = parse_date(value)
+                except ValueError:
+                    day = None
+                if day is None:
+                    return Response({"error": f"Invalid {name}: {value}"}, status=status.HTTP_400_BAD_REQUEST)
+                if name == 'start_date':
+                    start_date = day
+                else:
+                    end_date = day
+
+        if start_date > end_date:
+            return Response({"error": "start_date must not be after end_date"}, status=status.HTTP_400_BAD_REQUEST)
+
+        file_format = request.query_params.get('export_format', 'csv')
+        try:
+            stream = export_stream(shop, dataset, start_date, end_date, file_format)
+        except ExportError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(stream, content_type=FORMATS[file_format][0])
+        response['Content-Disposition'] = f'attachment; filename="{export_filename(dataset, start_date, end_date, file_format)}"'
+        return response
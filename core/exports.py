@@ -0,0 +1,288 @@
+"""
+Bulk data exports for accountants.
+
+export_stream() yields one dataset for a range of business days as bytes, ready for a
+StreamingHttpResponse or a file. Rows are read with values_list().iterator(chunk_size=...),
+which is a server-side cursor on PostgreSQL and chunked fetches on SQLite, and every
+chunk is encoded and handed on before the next is read. Memory stays flat however many
+rows the range holds. Ranges reaching back before the archive cutoff merge in the archived
+rows (core/archive.py), still in date order.
+
+Formats:
+  csv      header row, then one line per row
+  jsonl    one JSON object per line, gzip-compressed as it streams
+  arrow    Apache Arrow IPC stream, one record batch per chunk (needs pyarrow)
+  parquet  Parquet file, one row group per chunk (needs pyarrow)
+"""
+import csv
+import heapq
+import io
+import json
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+from uuid import UUID
+
+from django.db import models
+
+from .archive import reads_archive
+from .models import (
+    ArchivedInventoryLog, ArchivedSale, ArchivedSaleItem, ArchivedStockMovement, Expense, InventoryLog, Sale, SaleItem,
+    StockMovement, Waste,
+)
+from .time_windows import days_window
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+CHUNK_SIZE = 2000
+
+# dataset: (model, shop lookup, date lookup, [(column, lookup), ...])
+DATASETS = {
+    'sales': (Sale, 'shop', 'created_at', [
+        ('id', 'id'), ('created_at', 'created_at'), ('cashier_id', 'cashier_id'), ('cashier_name', 'cashier__name'),
+        ('total_amount', 'total_amount'), ('currency', 'currency'), ('payment_method', 'payment_method'),
+        ('status', 'status'), ('refund_amount', 'refund_amount'), ('refunded_at', 'refunded_at'),
+        ('customer_name', 'customer_name'), ('customer_phone', 'customer_phone'),
+        ('client_uuid', 'client_uuid'), ('synced_at', 'synced_at'),
+    ]),
+    'sale_items': (SaleItem, 'sale__shop', 'sale__created_at', [
+        ('id', 'id'), ('sale_id', 'sale_id'), ('sold_at', 'sale__created_at'), ('sale_status', 'sale__status'),
+        ('product_id', 'product_id'), ('product_name', 'product__name'), ('quantity', 'quantity'),
+        ('unit_price', 'unit_price'), ('unit_cost', 'unit_cost'), ('total_price', 'total_price'),
+        ('refund_quantity', 'refund_quantity'), ('refund_amount', 'refund_amount'), ('refunded_at', 'refunded_at'),
+    ]),
+    'inventory_logs': (InventoryLog, 'shop', 'created_at', [
+        ('id', 'id'), ('created_at', 'created_at'), ('product_id', 'product_id'), ('product_name', 'product__name'),
+        ('reason_code', 'reason_code'), ('quantity_change', 'quantity_change'),
+        ('previous_quantity', 'previous_quantity'), ('new_quantity', 'new_quantity'), ('cost_price', 'cost_price'),
+        ('reference_number', 'reference_number'), ('performed_by_id', 'performed_by_id'), ('notes', 'notes'),
+    ]),
+    'stock_movements': (StockMovement, 'shop', 'created_at', [
+        ('id', 'id'), ('created_at', 'created_at'), ('product_id', 'product_id'), ('product_name', 'product__name'),
+        ('movement_type', 'movement_type'), ('previous_stock', 'previous_stock'), ('quantity_change', 'quantity_change'),
+        ('new_stock', 'new_stock'), ('cost_price', 'cost_price'), ('total_cost_value', 'total_cost_value'),
+        ('reference_number', 'reference_number'), ('supplier_name', 'supplier_name'),
+        ('performed_by_id', 'performed_by_id'), ('notes', 'notes'),
+    ]),
+    'expenses': (Expense, 'shop', 'expense_date', [
+        ('id', 'id'), ('expense_date', 'expense_date'), ('category', 'category'), ('description', 'description'),
+        ('amount', 'amount'), ('currency', 'currency'), ('payment_method', 'payment_method'), ('vendor', 'vendor'),
+        ('receipt_number', 'receipt_number'), ('product_id', 'product_id'), ('product_name', 'product_name'),
+        ('quantity', 'quantity'), ('recorded_by_id', 'recorded_by_id'), ('created_at', 'created_at'),
+    ]),
+    'wastes': (Waste, 'shop', 'created_at', [
+        ('id', 'id'), ('created_at', 'created_at'), ('product_id', 'product_id'), ('product_name', 'product__name'),
+        ('quantity', 'quantity'), ('reason', 'reason'), ('cost_price', 'cost_price'), ('waste_value', 'waste_value'),
+        ('batch_id', 'shop_batch_id'), ('recorded_by_id', 'recorded_by_id'), ('reason_details', 'reason_details'),
+    ]),
+}
+
+# dataset: (archive model, shop lookup, {lookup in DATASETS: lookup on the archive model})
+ARCHIVED_DATASETS = {
+    'sales': (ArchivedSale, 'shop_id', {'cashier__name': 'cashier_name'}),
+    'sale_items': (ArchivedSaleItem, 'sale__shop_id', {'product__name': 'product_name'}),
+    'inventory_logs': (ArchivedInventoryLog, 'shop_id', {'product__name': 'product_name'}),
+    'stock_movements': (ArchivedStockMovement, 'shop_id', {'product__name': 'product_name'}),
+}
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'jsonl': ('application/gzip', 'jsonl.gz'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrow'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+ARROW_FORMATS = ('arrow', 'parquet')
+
+
+class ExportError(Exception):
+    """Unknown dataset or format, or a format whose optional dependency is missing"""
+
+
+def _model_field(model, lookup):
+    """Model field a values_list() lookup such as 'product__name' or 'cashier_id' ends on"""
+    field = None
+    for part in lookup.split('__'):
+        field = next(f for f in model._meta.concrete_fields if part in (f.name, f.attname))
+        if field.is_relation and part == field.name and part != lookup.split('__')[-1]:
+            model = field.related_model
+        elif field.is_relation:
+            field = field.target_field
+    return field
+
+
+def _rows(shop, dataset, start_day, end_day, chunk_size):
+    model, shop_lookup, date_lookup, columns = DATASETS[dataset]
+    lookups = [lookup for _, lookup in columns]
+    if isinstance(_model_field(model, date_lookup), models.DateTimeField):
+        start, end = days_window(start_day, end_day)
+        window = {f'{date_lookup}__gte': start, f'{date_lookup}__lt': end}
+    else:
+        start = None
+        window = {f'{date_lookup}__gte': start_day, f'{date_lookup}__lte': end_day}
+    rows = model.objects.filter(**{shop_lookup: shop}, **window).order_by(date_lookup, 'id').values_list(
+        *lookups
+    ).iterator(chunk_size=chunk_size)
+
+    if dataset not in ARCHIVED_DATASETS or not reads_archive(shop, start):
+        return rows
+    archived_model, archived_shop_lookup, renamed = ARCHIVED_DATASETS[dataset]
+    archived_rows = archived_model.objects.filter(**{archived_shop_lookup: shop.id}, **window).order_by(
+        date_lookup, 'id'
+    ).values_list(*[renamed.get(lookup, lookup) for lookup in lookups]).iterator(chunk_size=chunk_size)
+    # Both streams are in (date, id) order; ids are the first column of every dataset
+    position = lookups.index(date_lookup)
+    return _unique(heapq.merge(rows, archived_rows, key=lambda row: (row[position], row[0])), position)
+
+
+def _unique(rows, position):
+    """
+    Drop a row whose (date, id) repeats the one before. A row that an archive run copied
+    but failed to delete is in both streams; the merge puts its hot copy first.
+    """
+    previous = None
+    for row in rows:
+        key = (row[position], row[0])
+        if key != previous:
+            yield row
+        previous = key
+
+
+def _chunks(rows, chunk_size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (Decimal, UUID)):
+        return str(value)
+    raise TypeError(f"Cannot export {type(value).__name__}")
+
+
+def _csv(columns, chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for chunk in chunks:
+        writer.writerows([_text(value) for value in row] for row in chunk)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def _jsonl_gzip(columns, chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        lines = ''.join(json.dumps(dict(zip(columns, row)), default=_json_default) + '\n' for row in chunk)
+        data = compressor.compress(lines.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _arrow_type(field):
+    if isinstance(field, models.DecimalField):
+        return pyarrow.decimal128(field.max_digits, field.decimal_places)
+    if isinstance(field, models.DateTimeField):
+        return pyarrow.timestamp('us', tz='UTC')
+    if isinstance(field, models.DateField):
+        return pyarrow.date32()
+    if isinstance(field, models.BooleanField):
+        return pyarrow.bool_()
+    if isinstance(field, (models.IntegerField, models.AutoField)):
+        return pyarrow.int64()
+    return pyarrow.string()
+
+
+class _Sink(io.RawIOBase):
+    """Write-only file that hands out what was written so far, keeping absolute offsets for Parquet"""
+
+    def __init__(self):
+        self.pending = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.pending.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b''.join(self.pending)
+        self.pending = []
+        return data
+
+
+def _arrow(model, columns, chunks, file_format):
+    schema = pyarrow.schema([
+        pyarrow.field(column, _arrow_type(_model_field(model, lookup))) for column, lookup in columns
+    ])
+    string_columns = [index for index, field in enumerate(schema) if pyarrow.types.is_string(field.type)]
+    sink = _Sink()
+    if file_format == 'parquet':
+        writer = pyarrow.parquet.ParquetWriter(sink, schema, compression='snappy')
+        write = writer.write_table
+        to_table = pyarrow.Table.from_arrays
+    else:
+        writer = pyarrow.ipc.new_stream(sink, schema)
+        write = writer.write_batch
+        to_table = pyarrow.RecordBatch.from_arrays
+
+    for chunk in chunks:
+        values = [list(column) for column in zip(*chunk)]
+        for index in string_columns:
+            # UUIDs and other non-str values go out as text
+            values[index] = [None if value is None else str(value) for value in values[index]]
+        write(to_table([pyarrow.array(column, type=field.type) for column, field in zip(values, schema)], schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def export_stream(shop, dataset, start_day, end_day, file_format='csv', chunk_size=CHUNK_SIZE):
+    """Bytes of `dataset` for business days start_day..end_day inclusive, in `file_format`"""
+    if dataset not in DATASETS:
+        raise ExportError(f"Unknown dataset: {dataset}. Choose from {', '.join(DATASETS)}")
+    if file_format not in FORMATS:
+        raise ExportError(f"Unknown format: {file_format}. Choose from {', '.join(FORMATS)}")
+    if file_format in ARROW_FORMATS and pyarrow is None:
+        raise ExportError(f"The {file_format} format needs pyarrow, which is not installed")
+
+    model, _, _, columns = DATASETS[dataset]
+    chunks = _chunks(_rows(shop, dataset, start_day, end_day, chunk_size), chunk_size)
+    names = [column for column, _ in columns]
+    if file_format == 'csv':
+        return _csv(names, chunks)
+    if file_format == 'jsonl':
+        return _jsonl_gzip(names, chunks)
+    return _arrow(model, columns, chunks, file_format)
+
+
+def export_filename(dataset, start_day, end_day, file_format):
+    return f'{dataset}_{start_day.isoformat()}_{end_day.isoformat()}.{FORMATS[file_format][1]}'
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from core.archive import BATCH_SIZE, RETENTION_DAYS, ArchiveError, archive_history
+from core.models import ShopConfiguration
+
+
+class Command(BaseCommand):
+    help = "Move closed sales and stock ledger rows to the archive tables after rolling them up"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--through', help=f"Last business day to archive (YYYY-MM-DD). Defaults to {RETENTION_DAYS} days ago.")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Rows moved per transaction")
+        parser.add_argument('--shop-id', help="Only archive this shop (shop_id UUID)")
+
+    def handle(self, *args, **options):
+        archived_through = None
+        if options['through']:
+            archived_through = parse_date(options['through'])
+            if archived_through is None:
+                raise CommandError(f"Invalid date: {options['through']}")
+
+        shops = ShopConfiguration.objects.all()
+        if options['shop_id']:
+            shops = shops.filter(shop_id=options['shop_id'])
+
+        def progress(table, done, total):
+            self.stdout.write(f"  {table}: {done}/{total} ({done * 100 // max(total, 1)}%)")
+
+        for shop in shops:
+            self.stdout.write(f"{shop.name}:")
+            try:
+                run = archive_history(shop, archived_through, options['batch_size'], progress)
+            except ArchiveError as e:
+                raise CommandError(str(e))
+            self.stdout.write(self.style.SUCCESS(
+                f"{shop.name}: archived through {run.archived_through}: {run.sales} sales, {run.sale_items} sale items, "
+                f"{run.inventory_logs} inventory logs, {run.stock_movements} stock movements"
+            ))
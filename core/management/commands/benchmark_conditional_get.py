@@ -0,0 +1,60 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from core.models import Product, ShopConfiguration
+from core.views import BulkProductView, CashierListView, DiscountListView, ProductListView, ShopStatusView
+
+
+def endpoints(shop):
+    category = Product.objects.filter(shop=shop).values_list('category', flat=True).first() or 'General'
+    return [
+        ('shop status', ShopStatusView, '/status/', {}),
+        ('products', ProductListView, '/products/', {}),
+        ('products by category', BulkProductView, '/products/bulk/', {'category': category}),
+        ('discounts', DiscountListView, '/discounts/', {}),
+        ('cashiers', CashierListView, '/cashiers/', {}),
+    ]
+
+
+class Command(BaseCommand):
+    help = "Compare a full GET of the catalog endpoints with a conditional GET of an unchanged resource"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=20, help="Timed requests per endpoint and mode")
+
+    def request(self, view, path, params, headers=None):
+        request = RequestFactory().get(path, params, headers=headers or {})
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = view.as_view()(request)
+            if hasattr(response, 'render'):
+                response.render()
+            elapsed = time.perf_counter() - started
+        return response, elapsed, len(queries.captured_queries)
+
+    def handle(self, *args, **options):
+        shop = ShopConfiguration.objects.first()
+        if shop is None:
+            raise CommandError("No shop registered")
+        runs = options['runs']
+
+        self.stdout.write(f"{'endpoint':<22} {'mode':<12} {'status':>6} {'queries':>7} {'bytes':>9} {'avg ms':>8}")
+        for name, view, path, params in endpoints(shop):
+            response, _, _ = self.request(view, path, params)
+            etag = response.get('ETag')
+            if not etag:
+                raise CommandError(f"{name}: no ETag on the response")
+
+            for mode, headers in (('full', None), ('unchanged', {'If-None-Match': etag})):
+                total = 0
+                for _ in range(runs):
+                    response, elapsed, query_count = self.request(view, path, params, headers)
+                    total += elapsed
+                self.stdout.write(
+                    f"{name:<22} {mode:<12} {response.status_code:>6} {query_count:>7} "
+                    f"{len(response.content):>9} {total * 1000 / runs:>8.2f}"
+                )
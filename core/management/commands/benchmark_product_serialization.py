@@ -0,0 +1,55 @@
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Product, ShopConfiguration
+from core.product_fragments import serialized_products
+from core.serializers import ProductSerializer
+
+
+class Command(BaseCommand):
+    help = ("Time product list serialization: plain ProductSerializer vs cached fragments (cold, warm, one row changed). "
+            "The last mode re-saves one product to bump its updated_at.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help="Timed runs per mode")
+
+    def timed(self, runs, func, before=None):
+        total = 0
+        for _ in range(runs):
+            if before:
+                before()
+            started = time.perf_counter()
+            result = func()
+            total += time.perf_counter() - started
+        return result, total * 1000 / runs
+
+    def handle(self, *args, **options):
+        shop = ShopConfiguration.objects.first()
+        if shop is None:
+            raise CommandError("No shop registered")
+        products = Product.objects.filter(shop=shop)
+        runs = options['runs']
+
+        def touch_one():
+            product = products.first()
+            if product is not None:
+                product.save(update_fields=['updated_at'])
+
+        plain, plain_ms = self.timed(runs, lambda: ProductSerializer(products, many=True).data)
+        _, cold_ms = self.timed(runs, lambda: serialized_products(products, ProductSerializer), before=cache.clear)
+        warm, warm_ms = self.timed(runs, lambda: serialized_products(products, ProductSerializer))
+        _, changed_ms = self.timed(runs, lambda: serialized_products(products, ProductSerializer), before=touch_one)
+
+        if [dict(row) for row in plain] != warm:
+            raise CommandError("Cached fragments differ from ProductSerializer output")
+
+        self.stdout.write(f"{len(warm)} products, average of {runs} runs")
+        for label, elapsed in (
+            ('ProductSerializer(many=True)', plain_ms),
+            ('fragments, cold cache', cold_ms),
+            ('fragments, warm cache', warm_ms),
+            ('fragments, one row changed', changed_ms),
+        ):
+            self.stdout.write(f"  {label:<30} {elapsed:>9.2f} ms")
@@ -0,0 +1,64 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+
+from core.models import InventoryLog, Sale, ShopConfiguration, StockTake, StockTakeItem
+from core.read_serializers import inventory_log_rows, sale_rows, stock_take_item_rows, stock_take_rows
+from core.serializers import InventoryLogSerializer, SaleSerializer, StockTakeItemSerializer, StockTakeSerializer
+
+
+def lists(shop):
+    """(name, queryset, DRF serializer, lean serializer) for each list endpoint; ids break ties so both read the same rows"""
+    return [
+        ('sales', Sale.objects.filter(shop=shop).order_by('-created_at', '-id'), SaleSerializer, sale_rows),
+        ('inventory logs', InventoryLog.objects.filter(shop=shop).order_by('-created_at', '-id'), InventoryLogSerializer, inventory_log_rows),
+        ('stock takes', StockTake.objects.filter(shop=shop).order_by('-started_at', '-id'), StockTakeSerializer, stock_take_rows),
+        ('stock take items', StockTakeItem.objects.filter(stock_take__shop=shop).order_by('id'), StockTakeItemSerializer, stock_take_item_rows),
+    ]
+
+
+class Command(BaseCommand):
+    help = "Compare DRF list serializers with the lean .values() read serializers across list sizes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10,100,1000', help="Comma-separated list sizes")
+        parser.add_argument('--runs', type=int, default=3, help="Timed runs per size and serializer")
+
+    def timed(self, runs, func):
+        total = 0
+        for _ in range(runs):
+            # The query log is capped; start each run with room in it
+            connection.queries_log.clear()
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                # Render, so lazy serializer work and JSON encoding are both counted
+                body = JSONRenderer().render(func())
+                total += time.perf_counter() - started
+        return body, total * 1000 / runs, len(queries.captured_queries)
+
+    def handle(self, *args, **options):
+        shop = ShopConfiguration.objects.first()
+        if shop is None:
+            raise CommandError("No shop registered")
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        runs = options['runs']
+
+        self.stdout.write(f"{'list':<18} {'rows':>6} {'DRF ms':>9} {'queries':>8} {'lean ms':>9} {'queries':>8} {'speedup':>8}")
+        for name, queryset, serializer_class, lean in lists(shop):
+            for size in sizes:
+                rows = queryset[:size].count()
+                # A fresh slice per run, so no run reuses another's result cache
+                full_body, full_ms, full_queries = self.timed(runs, lambda: serializer_class(queryset[:size], many=True).data)
+                lean_body, lean_ms, lean_queries = self.timed(runs, lambda: lean(queryset[:size]))
+                if json.loads(full_body) != json.loads(lean_body):
+                    raise CommandError(f"{name}: lean output differs from {serializer_class.__name__}")
+                self.stdout.write(
+                    f"{name:<18} {rows:>6} {full_ms:>9.2f} {full_queries:>8} {lean_ms:>9.2f} {lean_queries:>8} "
+                    f"{full_ms / lean_ms if lean_ms else 0:>7.1f}x"
+                )
+                if rows < size:
+                    break
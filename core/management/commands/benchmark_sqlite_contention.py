@@ -0,0 +1,186 @@
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections, transaction
+from django.db.models import Count, F, Sum
+
+from core.models import Cashier, InventoryLog, Product, Sale, SaleItem, ShopConfiguration
+from core.sqlite_profile import sqlite_database
+
+MODELS = [ShopConfiguration, Cashier, Product, Sale, SaleItem, InventoryLog]
+
+
+def database_settings(mode, path):
+    if mode == 'default':
+        # Django's defaults: rollback journal, deferred transactions, no PRAGMAs
+        return {'ENGINE': 'django.db.backends.sqlite3', 'NAME': path, 'SQLITE_PRAGMAS': {}}
+    return sqlite_database(path, conn_max_age=None)
+
+
+def percentile(values, p):
+    if len(values) < 2:
+        return values[0] if values else 0
+    return statistics.quantiles(values, n=100)[p - 1]
+
+
+class Command(BaseCommand):
+    help = "Post sales from many tills at once against a scratch SQLite file, with default and production settings"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tills', type=int, default=8, help="Concurrent tills posting sales")
+        parser.add_argument('--sales', type=int, default=50, help="Sales posted by each till")
+        parser.add_argument('--items', type=int, default=3, help="Lines per sale")
+        parser.add_argument('--readers', type=int, default=2, help="Concurrent dashboard readers")
+        parser.add_argument('--products', type=int, default=200)
+        parser.add_argument('--modes', default='default,tuned', help="Comma-separated: default, tuned")
+
+    def handle(self, *args, **options):
+        modes = options['modes'].split(',')
+        if set(modes) - {'default', 'tuned'}:
+            raise CommandError("--modes takes default and/or tuned")
+
+        self.stdout.write(
+            f"{options['tills']} tills x {options['sales']} sales x {options['items']} lines, {options['readers']} readers"
+        )
+        self.stdout.write(
+            f"{'mode':<8} {'posted':>7} {'locked':>7} {'sales/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+            f"{'reads':>6} {'connect ms':>10}"
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            for mode in modes:
+                result = self.run_mode(mode, os.path.join(directory, f'{mode}.sqlite3'), options)
+                self.stdout.write(
+                    f"{mode:<8} {result['posted']:>7} {result['locked']:>7} {result['throughput']:>8.1f} "
+                    f"{result['p50']:>8.1f} {result['p95']:>8.1f} {result['p99']:>8.1f} {result['reads']:>6} "
+                    f"{result['connect_ms']:>10.2f}"
+                )
+
+    def run_mode(self, mode, path, options):
+        alias = f'contention_{mode}'
+        connections.settings[alias] = connections.configure_settings({'default': {}, alias: database_settings(mode, path)})[alias]
+        try:
+            product_ids = self.seed(alias, options)
+            connect_ms = self.connect_cost(alias)
+            return {**self.contend(alias, product_ids, options), 'connect_ms': connect_ms}
+        finally:
+            connections[alias].close()
+            del connections.settings[alias]
+
+    def seed(self, alias, options):
+        with connections[alias].schema_editor() as editor:
+            for model in MODELS:
+                editor.create_model(model)
+        shop = ShopConfiguration.objects.using(alias).bulk_create([ShopConfiguration(
+            register_id='BENCH', name='Contention benchmark', address='-', email='bench@example.com', phone='-',
+            password='-', shop_owner_master_password='-',
+        )])[0]
+        Cashier.objects.using(alias).bulk_create([
+            Cashier(shop=shop, name=f'Till {till}', phone=f'{till}', password='-', status='active')
+            for till in range(options['tills'])
+        ])
+        Product.objects.using(alias).bulk_create([
+            Product(shop=shop, name=f'Product {number}', price=Decimal('2.50'), cost_price=Decimal('1.20'),
+                    stock_quantity=Decimal('100000'), category='General')
+            for number in range(options['products'])
+        ])
+        return list(Product.objects.using(alias).values_list('id', flat=True))
+
+    def connect_cost(self, alias, samples=20):
+        """Average ms to open a connection and run a first query, the cost CONN_MAX_AGE saves per request"""
+        connection = connections[alias]
+        started = time.perf_counter()
+        for _ in range(samples):
+            connection.close()
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        return (time.perf_counter() - started) * 1000 / samples
+
+    def post_sale(self, alias, shop_id, cashier_id, product_ids, lines):
+        # Same shape as checkout: read the products, then write sale, lines, stock and ledger
+        with transaction.atomic(using=alias):
+            products = Product.objects.using(alias).in_bulk(random.sample(product_ids, lines))
+            sale = Sale.objects.using(alias).create(
+                shop_id=shop_id, cashier_id=cashier_id, payment_method='cash',
+                total_amount=sum((product.price for product in products.values()), Decimal('0')),
+            )
+            SaleItem.objects.using(alias).bulk_create([
+                SaleItem(sale=sale, product=product, quantity=1, unit_price=product.price, unit_cost=product.cost_price,
+                         total_price=product.price)
+                for product in products.values()
+            ])
+            Product.objects.using(alias).filter(id__in=list(products)).update(stock_quantity=F('stock_quantity') - 1)
+            InventoryLog.objects.using(alias).bulk_create([
+                InventoryLog(shop_id=shop_id, product=product, reason_code='SALE', quantity_change=-1,
+                             previous_quantity=product.stock_quantity, new_quantity=product.stock_quantity - 1,
+                             reference_number=f'Sale #{sale.id}', performed_by_id=cashier_id, cost_price=product.cost_price)
+                for product in products.values()
+            ])
+
+    def contend(self, alias, product_ids, options):
+        shop_id = ShopConfiguration.objects.using(alias).values_list('id', flat=True).get()
+        cashier_ids = list(Cashier.objects.using(alias).values_list('id', flat=True))
+        latencies, locked, reads = [], [0], [0]
+        lock = threading.Lock()
+        tills_done = threading.Event()
+        start = threading.Barrier(len(cashier_ids) + options['readers'])
+
+        def till(cashier_id):
+            start.wait()
+            try:
+                for _ in range(options['sales']):
+                    began = time.perf_counter()
+                    try:
+                        self.post_sale(alias, shop_id, cashier_id, product_ids, options['items'])
+                    except OperationalError as e:
+                        if 'locked' not in str(e):
+                            raise
+                        with lock:
+                            locked[0] += 1
+                        continue
+                    with lock:
+                        latencies.append((time.perf_counter() - began) * 1000)
+            finally:
+                connections[alias].close()
+
+        def reader():
+            start.wait()
+            try:
+                while not tills_done.is_set():
+                    try:
+                        Sale.objects.using(alias).filter(shop_id=shop_id).aggregate(total=Sum('total_amount'), count=Count('id'))
+                    except OperationalError as e:
+                        if 'locked' not in str(e):
+                            raise
+                        continue
+                    with lock:
+                        reads[0] += 1
+            finally:
+                connections[alias].close()
+
+        tills = [threading.Thread(target=till, args=(cashier_id,)) for cashier_id in cashier_ids]
+        readers = [threading.Thread(target=reader) for _ in range(options['readers'])]
+        began = time.perf_counter()
+        for thread in tills + readers:
+            thread.start()
+        for thread in tills:
+            thread.join()
+        elapsed = time.perf_counter() - began
+        tills_done.set()
+        for thread in readers:
+            thread.join()
+
+        return {
+            'posted': len(latencies),
+            'locked': locked[0],
+            'throughput': len(latencies) / elapsed,
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'reads': reads[0],
+        }
@@ -0,0 +1,98 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.archive import archive_history
+from core.bulk_load import copy_insert, uses_copy
+from core.exports import export_stream
+from core.models import ArchivedSale, Cashier, Product, ProductBarcode, Sale, SaleItem, ShopConfiguration
+from core.product_lookup import resolve_identifiers
+from core.time_windows import local_today
+
+
+class RolledBack(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the backend-specific query paths (barcode lookups, COPY loads, SKIP LOCKED archiving, "
+        "streamed exports) against the configured database, inside a transaction that is rolled back"
+    )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{connection.vendor} {connection.display_name}, "
+            f"COPY loads: {'yes (experimental)' if uses_copy(connection) else 'no (bulk_create)'}"
+        )
+        self.failures = []
+        try:
+            # The archive tables may live in a database of their own
+            with transaction.atomic(), transaction.atomic(using=ArchivedSale.objects.db):
+                run_checks(self.check)
+                raise RolledBack
+        except RolledBack:
+            pass
+        if self.failures:
+            raise CommandError(f"{len(self.failures)} check(s) failed: {', '.join(self.failures)}")
+        self.stdout.write(self.style.SUCCESS("All checks passed; nothing was written"))
+
+    def check(self, name, ok):
+        self.stdout.write(f"  {'ok  ' if ok else 'FAIL'} {name}")
+        if not ok:
+            self.failures.append(name)
+
+
+def run_checks(check):
+    """
+    Exercise the backend-specific paths on fresh rows, calling check(name, ok) for each
+    result. Run it inside a transaction that is rolled back; tests/test_database.py runs it
+    under pytest against the database DATABASE_URL selects.
+    """
+    shop = ShopConfiguration.objects.create(
+        register_id='CHECKDB', name='Database check', address='-', email='check@example.com', phone='-',
+        password='-', shop_owner_master_password='-',
+    )
+    cashier = Cashier.objects.create(shop=shop, name='Check', phone='-', password='-', status='active')
+    product = Product.objects.create(
+        shop=shop, name='Check product', price=Decimal('2.50'), cost_price=Decimal('1.20'), category='General',
+        stock_quantity=Decimal('10'), barcode='1000', additional_barcodes=['5012345678900', ' 5012345678917 ', ''],
+    )
+
+    check("additional barcodes synced", set(
+        ProductBarcode.objects.filter(product=product).values_list('barcode', flat=True)
+    ) == {'5012345678900', '5012345678917'})
+    found, _ = resolve_identifiers(shop, ['5012345678917', '50123456789'])
+    check("exact additional barcode lookup", found == {'5012345678917': product})
+    product.additional_barcodes = ['5012345678924']
+    product.save()
+    found, _ = resolve_identifiers(shop, ['5012345678900', '5012345678924'])
+    check("barcode edits replace old entries", found == {'5012345678924': product})
+
+    sold_at = timezone.now() - timedelta(days=3)
+    loaded = copy_insert(Sale, [
+        Sale(shop=shop, cashier=cashier, total_amount=Decimal('2.50'), payment_method='cash', status='completed',
+             created_at=sold_at)
+        for _ in range(25)
+    ])
+    sales = Sale.objects.filter(shop=shop)
+    check("bulk load of 25 sales", loaded == 25 and sales.count() == 25)
+    SaleItem.objects.bulk_create([
+        SaleItem(sale=sale, product=product, quantity=1, unit_price=Decimal('2.50'), unit_cost=Decimal('1.20'),
+                 total_price=Decimal('2.50'))
+        for sale in sales
+    ])
+
+    rows = b''.join(export_stream(shop, 'sale_items', local_today() - timedelta(days=7), local_today()))
+    check("streamed export", rows.count(b'\n') == 26)
+
+    run = archive_history(shop, archived_through=local_today() - timedelta(days=1), batch_size=10)
+    check("archive with SKIP LOCKED batches", run.sales == 25 and run.sale_items == 25 and not Sale.objects.filter(shop=shop).exists())
+    check("archived sales readable", ArchivedSale.objects.filter(shop_id=shop.id).count() == 25)
+    again = archive_history(shop, archived_through=local_today() - timedelta(days=1), batch_size=10)
+    check("archive re-run moves nothing", again.sales == 0)
+    rows_after = b''.join(export_stream(shop, 'sale_items', local_today() - timedelta(days=7), local_today()))
+    check("export reads through the archive", rows_after == rows)
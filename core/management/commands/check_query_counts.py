@@ -0,0 +1,80 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+
+from core.query_counts import BASELINE, DATASET, load_baseline, measure, regressions, seed_fixtures
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a fixed dataset in a throwaway test database, request every route in the URLconf and fail if an "
+        "endpoint runs more queries, or takes much longer, than recorded in the checked-in baseline. "
+        "tests/test_query_counts.py runs the same gate under pytest; use --update here to re-record it"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--baseline', default=str(BASELINE), help="Baseline JSON file (default: core/query_baseline.json)")
+        parser.add_argument('--update', action='store_true', help="Write the measured counts and times as the new baseline")
+        parser.add_argument('--query-tolerance', type=float, default=0.1,
+                            help="Fraction of extra queries allowed before an endpoint fails (default 0.1, rounded down)")
+        parser.add_argument('--time-tolerance', type=float, default=3.0,
+                            help="Multiple of the baseline time allowed (default 3.0); timings vary between machines")
+        parser.add_argument('--time-floor', type=float, default=25.0,
+                            help="Milliseconds an endpoint may always add over its baseline, to ride out timer noise")
+        parser.add_argument('--no-timing', action='store_true', help="Only gate query counts")
+        parser.add_argument('--repeat', type=int, default=3, help="Requests per endpoint; the fastest is kept")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        databases = setup_databases(verbosity=0, interactive=False)
+        try:
+            measured = measure(seed_fixtures(), options['repeat'])
+        finally:
+            teardown_databases(databases, verbosity=0)
+            teardown_test_environment()
+
+        if options['update']:
+            Path(options['baseline']).write_text(json.dumps({'dataset': DATASET, 'endpoints': measured}, indent=2) + '\n')
+            self.stdout.write(self.style.SUCCESS(f"{len(measured)} endpoints written to {options['baseline']}"))
+            return
+
+        try:
+            baseline = load_baseline(options['baseline'])
+        except FileNotFoundError:
+            raise CommandError(f"No baseline at {options['baseline']}; record one with --update")
+        regressed = self.compare(measured, baseline, options)
+        if regressed:
+            raise CommandError(
+                f"{len(regressed)} endpoint(s) regressed: {', '.join(regressed)}. If the change is intended, "
+                f"re-record the baseline with --update and commit it"
+            )
+        self.stdout.write(self.style.SUCCESS(f"{len(measured)} endpoints within budget"))
+
+    def compare(self, measured, baseline, options):
+        regressed = []
+        self.stdout.write(f"{'endpoint':<32} {'status':>6} {'queries':>12} {'ms':>16}  result")
+        for name, result in measured.items():
+            expected = baseline.get(name)
+            if expected is None:
+                self.stdout.write(f"{name:<32} {result['status']:>6} {result['queries']:>12} {result['ms']:>16.1f}  new, not in baseline")
+                continue
+
+            failures = regressions(
+                result, expected, options['query_tolerance'],
+                None if options['no_timing'] else options['time_tolerance'], options['time_floor'],
+            )
+            verdict = 'ok'
+            if failures:
+                verdict = 'REGRESSED: ' + ', '.join(failures)
+                regressed.append(name)
+            elif result['queries'] < expected['queries']:
+                verdict = 'ok, fewer queries than the baseline'
+            self.stdout.write(
+                f"{name:<32} {result['status']:>6} {result['queries']:>5} ({expected['queries']:>4}) "
+                f"{result['ms']:>7.1f} ({expected['ms']:>6.1f})  {verdict}"
+            )
+        for name in baseline.keys() - measured.keys():
+            self.stdout.write(f"{name:<32} {'':>6} {'':>12} {'':>16}  in baseline, no longer routed")
+        return regressed
@@ -0,0 +1,128 @@
+import re
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from core.models import InventoryLog, Product, ProductBarcode, Sale, SaleItem, StockMovement, Waste
+from core.time_windows import day_start, day_window, local_today
+
+
+def hot_queries(shop_id):
+    """Query shapes used by the dashboards, audit trail, valuation and lookups in core/views.py"""
+    now = timezone.now()
+    month_ago = now - timedelta(days=30)
+    return [
+        ('sales: dashboard revenue window',
+         Sale.objects.filter(shop_id=shop_id, status='completed', created_at__gte=month_ago, created_at__lt=now).values('total_amount')),
+        ('sales: recent completed',
+         Sale.objects.filter(shop_id=shop_id, status='completed').order_by('-created_at')[:10]),
+        ('sales: list',
+         Sale.objects.filter(shop_id=shop_id).order_by('-created_at')),
+        ('sale items: valuation by product',
+         SaleItem.objects.filter(product_id=1)),
+        ('sale items: top products window',
+         SaleItem.objects.filter(sale__shop_id=shop_id, sale__status='completed', sale__created_at__gte=month_ago).values('product_id')),
+        ('inventory logs: audit trail',
+         InventoryLog.objects.filter(shop_id=shop_id).order_by('-created_at')),
+        ('inventory logs: audit trail by product',
+         InventoryLog.objects.filter(shop_id=shop_id, product_id=1).order_by('-created_at')),
+        ('inventory logs: audit trail by reason',
+         InventoryLog.objects.filter(shop_id=shop_id, reason_code='SALE').order_by('-created_at')),
+        ('inventory logs: audit trail date range',
+         InventoryLog.objects.filter(shop_id=shop_id, created_at__gte=month_ago, created_at__lt=now)),
+        ('wastes: summary window',
+         Waste.objects.filter(shop_id=shop_id, created_at__gte=month_ago, created_at__lt=now)),
+        ('stock movements: ledger window',
+         StockMovement.objects.filter(shop_id=shop_id, created_at__gte=month_ago, created_at__lt=now)),
+        ('products: by category',
+         Product.objects.filter(shop_id=shop_id, category='Bakery')),
+        ('products: active catalog',
+         Product.objects.filter(shop_id=shop_id, is_active=True)),
+        ('products: identifier lookup',
+         Product.objects.filter(Q(line_code='00000000') | Q(barcode='00000000'), shop_id=shop_id)),
+        ('products: additional barcode lookup',
+         ProductBarcode.objects.filter(shop_id=shop_id, barcode='00000000').values('product_id')),
+    ]
+
+
+def full_scans(plan, vendor):
+    """Tables read without an index, for SQLite and PostgreSQL plans"""
+    if vendor == 'sqlite':
+        return [
+            match.group(1) for match in re.finditer(r'SCAN (?:TABLE )?(\w+)\b(?! USING)', plan)
+            if match.group(1).startswith('core_')
+        ]
+    if vendor == 'postgresql':
+        return re.findall(r'Seq Scan on (\w+)', plan)
+    raise CommandError(f"Unsupported database backend: {vendor}")
+
+
+def date_filter_comparisons(shop_id):
+    """Legacy `created_at__date` lookups next to the equivalent half-open window filters"""
+    today = local_today()
+    today_start, tomorrow_start = day_window(today)
+    month_ago = today - timedelta(days=30)
+    return [
+        ('sales today',
+         Sale.objects.filter(shop_id=shop_id, status='completed', created_at__date=today),
+         Sale.objects.filter(shop_id=shop_id, status='completed', created_at__gte=today_start, created_at__lt=tomorrow_start)),
+        ('sales last 30 days',
+         Sale.objects.filter(shop_id=shop_id, status='completed', created_at__date__gte=month_ago),
+         Sale.objects.filter(shop_id=shop_id, status='completed', created_at__gte=day_start(month_ago))),
+        ('audit trail date range',
+         InventoryLog.objects.filter(shop_id=shop_id, created_at__date__gte=month_ago, created_at__date__lte=today),
+         InventoryLog.objects.filter(shop_id=shop_id, created_at__gte=day_start(month_ago), created_at__lt=tomorrow_start)),
+    ]
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN the hot dashboard/audit/valuation queries and fail if any falls back to a full table scan"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true', help="Print every query plan")
+        parser.add_argument('--compare-date-filters', action='store_true',
+                            help="Benchmark legacy created_at__date lookups against window filters on the current data")
+        parser.add_argument('--shop', type=int, default=1, help="Shop primary key to run the queries for")
+        parser.add_argument('--runs', type=int, default=20, help="Timed runs per query for --compare-date-filters")
+
+    def handle(self, *args, **options):
+        failures = []
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # Small test tables make sequential scans cheaper; only report what cannot use an index
+                cursor.execute('SET enable_seqscan = off')
+
+            for name, queryset in hot_queries(shop_id=options['shop']):
+                plan = queryset.explain()
+                scans = full_scans(plan, connection.vendor)
+                if options['verbose_plans']:
+                    self.stdout.write(f"{name}:\n{plan}\n")
+                if scans:
+                    failures.append(f"{name}: full scan of {', '.join(scans)}")
+                    self.stdout.write(self.style.ERROR(f"FULL SCAN  {name}"))
+                else:
+                    self.stdout.write(self.style.SUCCESS(f"indexed    {name}"))
+
+            if connection.vendor == 'postgresql':
+                cursor.execute('RESET enable_seqscan')
+
+        if options['compare_date_filters']:
+            self.compare_date_filters(options['shop'], options['runs'])
+
+        if failures:
+            raise CommandError("Hot queries fell back to full scans:\n" + "\n".join(failures))
+
+    def compare_date_filters(self, shop_id, runs):
+        self.stdout.write("\nLegacy __date lookups vs [start, end) windows:")
+        for name, legacy, windowed in date_filter_comparisons(shop_id):
+            for label, queryset in (('__date', legacy), ('window', windowed)):
+                started = time.perf_counter()
+                for _ in range(runs):
+                    count = queryset.count()
+                elapsed_ms = (time.perf_counter() - started) * 1000 / runs
+                self.stdout.write(f"  {name} [{label}] rows={count} avg={elapsed_ms:.2f}ms")
+                self.stdout.write(f"    {queryset.explain()}")
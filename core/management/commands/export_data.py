@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from core.exports import CHUNK_SIZE, DATASETS, FORMATS, ExportError, export_filename, export_stream
+from core.models import ShopConfiguration
+from core.time_windows import local_today
+
+
+class Command(BaseCommand):
+    help = "Stream one dataset for a range of business days to a CSV, gzipped JSONL, Arrow or Parquet file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=list(DATASETS))
+        parser.add_argument('--start', help="First business day, YYYY-MM-DD (default: first of this month)")
+        parser.add_argument('--end', help="Last business day, YYYY-MM-DD (default: today)")
+        parser.add_argument('--format', dest='file_format', choices=list(FORMATS), default='csv')
+        parser.add_argument('--output', help="File to write (default: <dataset>_<start>_<end>.<ext> in the current directory)")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Rows fetched and encoded at a time")
+        parser.add_argument('--shop-id', help="Export this shop (shop_id UUID) instead of the only one")
+
+    def handle(self, *args, **options):
+        shops = ShopConfiguration.objects.all()
+        if options['shop_id']:
+            shops = shops.filter(shop_id=options['shop_id'])
+        shop = shops.first()
+        if shop is None:
+            raise CommandError("No shop registered")
+
+        end_date = local_today()
+        start_date = end_date.replace(day=1)
+        if options['start']:
+            start_date = parse_date(options['start'])
+        if options['end']:
+            end_date = parse_date(options['end'])
+        if start_date is None or end_date is None or start_date > end_date:
+            raise CommandError("--start and --end must be YYYY-MM-DD with start not after end")
+
+        dataset, file_format = options['dataset'], options['file_format']
+        output = options['output'] or export_filename(dataset, start_date, end_date, file_format)
+        try:
+            stream = export_stream(shop, dataset, start_date, end_date, file_format, chunk_size=options['chunk_size'])
+        except ExportError as e:
+            raise CommandError(str(e))
+
+        size = 0
+        with open(output, 'wb') as f:
+            for data in stream:
+                f.write(data)
+                size += len(data)
+        self.stdout.write(self.style.SUCCESS(f"{dataset} {start_date}..{end_date}: {size} bytes written to {output}"))
@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core.bulk_load import uses_copy
+from core.demo_data import DEMO_PASSWORD, SCALES, generate_demo_data
+from core.models import ShopConfiguration
+
+
+class Command(BaseCommand):
+    help = "Fill a shop with a synthetic catalogue, staff and months of sales, waste and stock takes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=list(SCALES), default='small',
+                            help=", ".join(f"{name}: {scale['products']} products, {scale['days']} days x "
+                                           f"{scale['sales_per_day']} sales" for name, scale in SCALES.items()))
+        parser.add_argument('--products', type=int, help="Override the scale's product count")
+        parser.add_argument('--cashiers', type=int, help="Override the scale's cashier count")
+        parser.add_argument('--days', type=int, help="Override the scale's days of history")
+        parser.add_argument('--sales-per-day', type=int, help="Override the scale's average sales per day")
+        parser.add_argument('--waste-per-day', type=int, help="Override the scale's waste records per day")
+        parser.add_argument('--seed', type=int, default=0, help="Same seed, same data")
+        parser.add_argument('--shop-id', help="Add the data to this shop (shop_id UUID) instead of the only one")
+
+    def handle(self, *args, **options):
+        # The API serves the one shop of its database, so data goes to that shop when there is one
+        shops = ShopConfiguration.objects.all()
+        if options['shop_id']:
+            shops = shops.filter(shop_id=options['shop_id'])
+            if not shops.exists():
+                raise CommandError(f"No shop with shop_id {options['shop_id']}")
+        elif shops.count() > 1:
+            raise CommandError("Several shops are registered; pick one with --shop-id")
+        shop = shops.first()
+
+        self.stdout.write(
+            f"Generating {options['scale']} data on {connection.vendor} "
+            f"({'COPY' if uses_copy(connection) else 'bulk INSERT'}), seed {options['seed']}"
+        )
+        started = time.perf_counter()
+
+        def progress(day, days):
+            if day % 10 == 0 or day == days:
+                self.stdout.write(f"  day {day}/{days} ({time.perf_counter() - started:.1f}s)")
+
+        shop, counts = generate_demo_data(
+            shop, options['scale'], seed=options['seed'], progress=progress,
+            products=options['products'], cashiers=options['cashiers'], days=options['days'],
+            sales_per_day=options['sales_per_day'], waste_per_day=options['waste_per_day'],
+        )
+        elapsed = time.perf_counter() - started
+        for table, rows in counts.items():
+            self.stdout.write(f"  {table:<20} {rows:>10}")
+        total = sum(counts.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"{shop.name} ({shop.shop_id}): {total} rows in {elapsed:.1f}s ({total / elapsed:.0f} rows/s). "
+            f"Shop, master and cashier passwords: {DEMO_PASSWORD}"
+        ))
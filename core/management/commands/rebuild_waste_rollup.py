@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from core.models import ShopConfiguration
+from core.waste_analytics import rebuild_rollup
+
+
+class Command(BaseCommand):
+    help = "Rebuild the WasteRollup analytics table from Waste records"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start-date', help="First business day to rebuild (YYYY-MM-DD). Defaults to the first waste record.")
+        parser.add_argument('--end-date', help="Last business day to rebuild (YYYY-MM-DD). Defaults to the latest waste record.")
+        parser.add_argument('--shop-id', help="Only rebuild this shop (shop_id UUID)")
+
+    def handle(self, *args, **options):
+        days = {}
+        for option in ('start_date', 'end_date'):
+            days[option] = None
+            if options[option]:
+                days[option] = parse_date(options[option])
+                if days[option] is None:
+                    raise CommandError(f"Invalid date: {options[option]}")
+
+        shops = ShopConfiguration.objects.all()
+        if options['shop_id']:
+            shops = shops.filter(shop_id=options['shop_id'])
+
+        for shop in shops:
+            count = rebuild_rollup(shop, days['start_date'], days['end_date'])
+            self.stdout.write(self.style.SUCCESS(f"{shop.name}: {count} waste rollup rows written"))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from core.cost_layers import recost_inventory
+from core.models import ShopConfiguration
+
+
+class Command(BaseCommand):
+    help = "Rebuild cost layers from the stock ledger and refresh product carrying costs"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shop-id', help="Only recost this shop (shop_id UUID)")
+        parser.add_argument('--method', choices=['average', 'fifo'], help="Costing method to switch the shop to before rebuilding")
+        parser.add_argument('--product-id', type=int, action='append', dest='product_ids', help="Only recost this product; repeat for several")
+
+    def handle(self, *args, **options):
+        shops = ShopConfiguration.objects.all()
+        if options['shop_id']:
+            shops = shops.filter(shop_id=options['shop_id'])
+
+        for shop in shops:
+            if options['method'] and options['method'] != shop.costing_method:
+                shop.costing_method = options['method']
+                shop.save(update_fields=['costing_method'])
+            count = recost_inventory(shop, product_ids=options['product_ids'])
+            self.stdout.write(self.style.SUCCESS(
+                f"{shop.name}: {count} cost layers written ({shop.get_costing_method_display()})"
+            ))
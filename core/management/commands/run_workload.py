@@ -0,0 +1,212 @@
+import json
+import random
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.models import Cashier, Product, ProductBarcode, ShopConfiguration
+
+# A till-heavy day: scans and checkouts, with the owner's screens refreshing now and then
+DEFAULT_MIX = 'scan=40,checkout=35,top_products=8,products=5,dashboard=5,audit=4,valuation=3'
+
+
+def percentile(values, p):
+    if len(values) < 2:
+        return values[0] if values else 0
+    return statistics.quantiles(values, n=100)[p - 1]
+
+
+def client_host():
+    """A Host header ALLOWED_HOSTS accepts, for the test client outside the test runner"""
+    hosts = [host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*']
+    return hosts[0] if hosts else 'localhost'
+
+
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        if name not in OPERATIONS or not weight.isdigit():
+            raise CommandError(f"Bad --mix entry {part!r}; operations are {', '.join(OPERATIONS)}")
+        weights[name] = int(weight)
+    return weights
+
+
+class Catalogue:
+    """What the workload picks from: sellable products, their barcodes and the active cashiers"""
+
+    def __init__(self, shop):
+        self.products = list(Product.objects.filter(shop=shop, is_active=True, price__gt=0).values_list('id', 'price_type'))
+        self.barcodes = list(Product.objects.filter(shop=shop, is_active=True).exclude(barcode='').values_list('barcode', flat=True))
+        self.barcodes += list(ProductBarcode.objects.filter(shop=shop).values_list('barcode', flat=True))
+        self.cashiers = list(Cashier.objects.filter(shop=shop, status='active').values_list('id', flat=True))
+        if not self.products or not self.cashiers:
+            raise CommandError("The shop needs sellable products and an active cashier; run generate_demo_data first")
+
+
+def scan(rng, catalogue):
+    return 'GET', reverse('barcode-lookup'), {'barcode': rng.choice(catalogue.barcodes)}
+
+
+def checkout(rng, catalogue):
+    items = []
+    for product_id, price_type in rng.sample(catalogue.products, min(rng.randint(1, 6), len(catalogue.products))):
+        quantity = rng.choice(['1', '1', '1', '2', '3']) if price_type == 'unit' else f'{rng.randint(25, 300) / 100:.2f}'
+        items.append({'product_id': str(product_id), 'quantity': quantity})
+    return 'POST', reverse('sale-list'), {
+        'cashier_id': rng.choice(catalogue.cashiers),
+        'items': items,
+        'payment_method': rng.choice(['cash', 'cash', 'ecocash', 'card']),
+    }
+
+
+def audit(rng, catalogue):
+    return 'GET', reverse('inventory-audit-trail'), {'product_id': rng.choice(catalogue.products)[0]}
+
+
+OPERATIONS = {
+    'scan': scan,
+    'checkout': checkout,
+    'top_products': lambda rng, catalogue: ('GET', reverse('cashier-top-products'), None),
+    'products': lambda rng, catalogue: ('GET', reverse('product-list'), None),
+    'dashboard': lambda rng, catalogue: ('GET', reverse('owner-dashboard'), None),
+    'audit': audit,
+    'valuation': lambda rng, catalogue: ('GET', reverse('stock-valuation'), None),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay a checkout-heavy request mix through the test client or against a running server, and report "
+        "throughput, p50/p95/p99 latency and queries per endpoint"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help="Requests to send after the warm-up")
+        parser.add_argument('--concurrency', type=int, default=1, help="Clients sending requests at once")
+        parser.add_argument('--mix', default=DEFAULT_MIX, help=f"operation=weight list (default: {DEFAULT_MIX})")
+        parser.add_argument('--warmup', type=int, default=20, help="Requests sent first and left out of the report")
+        parser.add_argument('--server', help="Origin of a running server on the same database, e.g. http://127.0.0.1:8000; "
+                                             "default: Django's test client in this process, which also counts queries")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        weights = parse_mix(options['mix'])
+        shop = ShopConfiguration.objects.get()
+        catalogue = Catalogue(shop)
+        if not options['server'] and options['concurrency'] > 1 and connection.is_in_memory_db():
+            raise CommandError("An in-memory SQLite database cannot be shared between clients; use --concurrency 1")
+
+        rng = random.Random(options['seed'])
+        names = rng.choices(list(weights), weights=list(weights.values()), k=options['warmup'] + options['requests'])
+        plan = [(name, *OPERATIONS[name](rng, catalogue)) for name in names]
+        warmup, plan = plan[:options['warmup']], plan[options['warmup']:]
+
+        send = self.send_http(options['server']) if options['server'] else self.send_in_process
+        self.run(send, warmup, 1)
+        results, elapsed = self.run(send, plan, options['concurrency'])
+        self.report(results, elapsed, options, counts_queries=not options['server'])
+
+    def send_in_process(self, client, method, path, data):
+        # Only this request's queries; the log is capped and warns once full
+        connection.queries_log.clear()
+        with CaptureQueriesContext(connection) as queries:
+            if method == 'POST':
+                response = client.post(path, json.dumps(data), content_type='application/json')
+            else:
+                response = client.get(path, data)
+        return response.status_code, len(queries)
+
+    def send_http(self, origin):
+        origin = origin.rstrip('/')
+
+        def send(client, method, path, data):
+            body = None
+            if method == 'POST':
+                body = json.dumps(data).encode()
+            elif data:
+                path = f'{path}?{urlencode(data)}'
+            request = urllib.request.Request(origin + path, data=body, method=method,
+                                             headers={'Content-Type': 'application/json'})
+            try:
+                with urllib.request.urlopen(request) as response:
+                    response.read()
+                    return response.status, None
+            except urllib.error.HTTPError as e:
+                return e.code, None
+        return send
+
+    def run(self, send, plan, concurrency):
+        """Send `plan` from `concurrency` clients; returns ([(operation, status, ms, queries)], seconds)"""
+        results = []
+        lock = threading.Lock()
+        position = iter(plan)
+
+        def worker(close=True):
+            # Server errors count as failed requests instead of stopping the client
+            client = Client(HTTP_HOST=client_host(), raise_request_exception=False)
+            try:
+                while True:
+                    with lock:
+                        step = next(position, None)
+                    if step is None:
+                        return
+                    name, method, path, data = step
+                    began = time.perf_counter()
+                    status, queries = send(client, method, path, data)
+                    with lock:
+                        results.append((name, status, (time.perf_counter() - began) * 1000, queries))
+            finally:
+                if close:
+                    connections.close_all()
+
+        if concurrency == 1:
+            # Stays on this thread's connection, so an in-memory database survives the warm-up
+            began = time.perf_counter()
+            worker(close=False)
+            return results, time.perf_counter() - began
+
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        began = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, time.perf_counter() - began
+
+    def report(self, results, elapsed, options, counts_queries):
+        target = options['server'] or 'test client'
+        self.stdout.write(
+            f"{len(results)} requests from {options['concurrency']} client(s) against {target} in {elapsed:.2f}s: "
+            f"{len(results) / elapsed:.1f} req/s"
+        )
+        self.stdout.write(
+            f"{'operation':<14} {'count':>6} {'errors':>6} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+            f"{'queries':>8} {'max q':>6}"
+        )
+        for name in OPERATIONS:
+            rows = [row for row in results if row[0] == name]
+            if not rows:
+                continue
+            latencies = [ms for _, _, ms, _ in rows]
+            errors = sum(1 for _, status, _, _ in rows if status >= 400)
+            queries = [count for _, _, _, count in rows]
+            mean_queries = f'{statistics.mean(queries):.1f}' if counts_queries else '-'
+            max_queries = f'{max(queries)}' if counts_queries else '-'
+            self.stdout.write(
+                f"{name:<14} {len(rows):>6} {errors:>6} {len(rows) / elapsed:>7.1f} {percentile(latencies, 50):>8.1f} "
+                f"{percentile(latencies, 95):>8.1f} {percentile(latencies, 99):>8.1f} {mean_queries:>8} {max_queries:>6}"
+            )
+        errors = sum(1 for _, status, _, _ in results if status >= 400)
+        if errors:
+            self.stdout.write(self.style.WARNING(f"{errors} request(s) failed"))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from core.models import ShopConfiguration
+from core.stock_ledger import take_snapshots
+
+
+class Command(BaseCommand):
+    help = "Write nightly StockSnapshot rows for every product (run after close of business)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="Business day to snapshot (YYYY-MM-DD). Defaults to today; past days are reconstructed from the ledger.")
+        parser.add_argument('--shop-id', help="Only snapshot this shop (shop_id UUID)")
+
+    def handle(self, *args, **options):
+        snapshot_date = None
+        if options['date']:
+            snapshot_date = parse_date(options['date'])
+            if snapshot_date is None:
+                raise CommandError(f"Invalid date: {options['date']}")
+
+        shops = ShopConfiguration.objects.all()
+        if options['shop_id']:
+            shops = shops.filter(shop_id=options['shop_id'])
+
+        for shop in shops:
+            count = take_snapshots(shop, snapshot_date)
+            self.stdout.write(self.style.SUCCESS(f"{shop.name}: {count} product snapshots written"))
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-19 08:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0039_add_stock_take_types_and_balancing'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('snapshot_date', models.DateField(help_text='Business day this snapshot closes')),
+                ('taken_at', models.DateTimeField(help_text='Moment the quantity was captured; ledger rows after this are not included')),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('cost_price', models.DecimalField(decimal_places=2, default=0, help_text='Cost price at time of snapshot', max_digits=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to='core.product')),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.shopconfiguration')),
+            ],
+            options={
+                'verbose_name': 'Stock Snapshot',
+                'verbose_name_plural': 'Stock Snapshots',
+                'ordering': ['-snapshot_date'],
+                'indexes': [models.Index(fields=['shop', '-snapshot_date'], name='core_stocks_shop_id_115f01_idx'), models.Index(fields=['shop', 'taken_at'], name='core_stocks_shop_id_2c0e8a_idx')],
+                'unique_together': {('product', 'snapshot_date')},
+            },
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.8 on 2026-10-19 08:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0040_stocksnapshot'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inventorylog',
+            index=models.Index(fields=['shop', '-created_at'], name='core_invent_shop_id_25deb5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventorylog',
+            index=models.Index(fields=['shop', 'product', '-created_at'], name='core_invent_shop_id_f43832_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventorylog',
+            index=models.Index(fields=['shop', 'reason_code', '-created_at'], name='core_invent_shop_id_a5c1f0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['shop', 'category'], name='core_produc_shop_id_c73fd9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['shop', 'is_active'], name='core_produc_shop_id_fa4891_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['shop', 'line_code'], name='core_produc_shop_id_cdebce_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['shop', 'barcode'], name='core_produc_shop_id_8bcf5b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['shop', 'status', 'created_at', 'total_amount'], name='core_sale_shop_id_d3e34d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['shop', '-created_at'], name='core_sale_shop_id_4102fb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='saleitem',
+            index=models.Index(fields=['product', 'sale'], name='core_saleit_product_7fbd90_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['shop', 'created_at'], name='core_stockm_shop_id_7f065e_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-19 09:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0041_add_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WasteRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(help_text="Business day in the shop's timezone")),
+                ('reason', models.CharField(choices=[('EXPIRED', 'Expired Products'), ('DAMAGED', 'Damaged Products'), ('SPOILED', 'Spoiled Products'), ('STALE', 'Stale Products'), ('CONTAMINATED', 'Contaminated Products'), ('DEFECTIVE', 'Defective Products'), ('OTHER', 'Other Reasons')], max_length=20)),
+                ('waste_count', models.IntegerField(default=0)),
+                ('total_quantity', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('total_value', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waste_rollups', to='core.product')),
+                ('recorded_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.cashier')),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.shopconfiguration')),
+            ],
+            options={
+                'verbose_name': 'Waste Rollup',
+                'verbose_name_plural': 'Waste Rollups',
+                'ordering': ['-day'],
+                'indexes': [models.Index(fields=['shop', 'day'], name='core_waster_shop_id_cfff51_idx'), models.Index(fields=['shop', 'product', 'day'], name='core_waster_shop_id_1ad3d0_idx')],
+            },
+        ),
+    ]
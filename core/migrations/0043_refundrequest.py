@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-19 09:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0042_wasterollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RefundRequest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('idempotency_key', models.CharField(max_length=255)),
+                ('response', models.JSONField(default=dict, help_text='Result returned to the first request')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('refunded_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.cashier')),
+                ('sale', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='refund_requests', to='core.sale')),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.shopconfiguration')),
+            ],
+            options={
+                'verbose_name': 'Refund Request',
+                'verbose_name_plural': 'Refund Requests',
+                'ordering': ['-created_at'],
+                'unique_together': {('shop', 'idempotency_key')},
+            },
+        ),
+    ]
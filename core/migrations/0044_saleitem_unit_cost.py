@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-19 09:10
+
+from django.db import migrations, models
+from django.db.models import CharField, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Concat
+
+
+def backfill_unit_cost(apps, schema_editor):
+    """
+    Take each sale item's cost from the SALE inventory log row written at checkout.
+    Fall back to the product's current cost when no log row exists.
+    """
+    SaleItem = apps.get_model('core', 'SaleItem')
+    InventoryLog = apps.get_model('core', 'InventoryLog')
+    Product = apps.get_model('core', 'Product')
+
+    logged_cost = InventoryLog.objects.filter(
+        reason_code='SALE',
+        product_id=OuterRef('product_id'),
+        reference_number=Concat(Value('Sale #'), Cast(OuterRef('sale_id'), CharField())),
+    ).order_by('id').values('cost_price')[:1]
+    SaleItem.objects.filter(unit_cost__isnull=True).update(unit_cost=Subquery(logged_cost))
+
+    current_cost = Product.objects.filter(id=OuterRef('product_id')).values('cost_price')[:1]
+    SaleItem.objects.filter(unit_cost__isnull=True).update(unit_cost=Subquery(current_cost))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0043_refundrequest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='saleitem',
+            name='unit_cost',
+            field=models.DecimalField(blank=True, decimal_places=2, help_text='Product cost price at the time of sale', max_digits=10, null=True),
+        ),
+        migrations.RunPython(backfill_unit_cost, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-19 09:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0044_saleitem_unit_cost'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shopconfiguration',
+            name='costing_method',
+            field=models.CharField(choices=[('average', 'Moving Average'), ('fifo', 'FIFO')], default='average', help_text='How stock leaving the shop is costed against received cost layers', max_length=10),
+        ),
+        migrations.CreateModel(
+            name='CostLayer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('received_at', models.DateTimeField(help_text='When the stock in this layer was received')),
+                ('unit_cost', models.DecimalField(decimal_places=4, max_digits=12)),
+                ('original_quantity', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('remaining_quantity', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('reference_number', models.CharField(blank=True, help_text='Receipt, transfer or return that opened the layer', max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cost_layers', to='core.product')),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.shopconfiguration')),
+            ],
+            options={
+                'verbose_name': 'Cost Layer',
+                'verbose_name_plural': 'Cost Layers',
+                'ordering': ['received_at', 'id'],
+                'indexes': [models.Index(fields=['shop', 'product', 'received_at'], name='core_costla_shop_id_85ffd5_idx'), models.Index(fields=['shop', 'remaining_quantity'], name='core_costla_shop_id_1934f3_idx')],
+            },
+        ),
+    ]
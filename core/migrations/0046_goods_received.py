@@ -0,0 +1,62 @@
+# Generated by Django 5.2.8 on 2026-10-19 09:16
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0045_cost_layers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GoodsReceivedNote',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('grn_number', models.CharField(help_text='Auto-generated goods received note number', max_length=50, unique=True)),
+                ('supplier_name', models.CharField(max_length=255)),
+                ('supplier_invoice', models.CharField(help_text='Supplier invoice number; a delivery is posted once per invoice', max_length=255)),
+                ('notes', models.TextField(blank=True)),
+                ('total_quantity', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('total_cost', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('line_count', models.PositiveIntegerField(default=0)),
+                ('received_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('received_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='goods_received', to='core.cashier')),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.shopconfiguration')),
+            ],
+            options={
+                'verbose_name': 'Goods Received Note',
+                'verbose_name_plural': 'Goods Received Notes',
+                'ordering': ['-received_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='GoodsReceivedLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('unit_cost', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('line_cost', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('previous_stock', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('new_stock', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='goods_received_lines', to='core.product')),
+                ('grn', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='core.goodsreceivednote')),
+            ],
+            options={
+                'verbose_name': 'Goods Received Line',
+                'verbose_name_plural': 'Goods Received Lines',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='goodsreceivednote',
+            index=models.Index(fields=['shop', '-received_at'], name='core_goodsr_shop_id_6d1426_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='goodsreceivednote',
+            constraint=models.UniqueConstraint(fields=('shop', 'supplier_name', 'supplier_invoice'), name='unique_supplier_invoice_per_shop'),
+        ),
+    ]
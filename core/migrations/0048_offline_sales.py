@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-19 09:22
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0047_sync_changes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sale',
+            name='client_uuid',
+            field=models.UUIDField(blank=True, help_text='Id generated by the till for sales captured offline', null=True),
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='synced_at',
+            field=models.DateTimeField(blank=True, help_text='When an offline sale reached the server', null=True),
+        ),
+        migrations.AlterField(
+            model_name='sale',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, help_text="When the sale was rung up; offline sales keep the till's time"),
+        ),
+        migrations.AddConstraint(
+            model_name='sale',
+            constraint=models.UniqueConstraint(fields=('shop', 'client_uuid'), name='unique_sale_client_uuid_per_shop'),
+        ),
+    ]
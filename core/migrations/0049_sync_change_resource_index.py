@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-19 09:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0048_offline_sales'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='syncchange',
+            index=models.Index(fields=['shop', 'resource', 'id'], name='core_syncch_shop_id_41abdb_idx'),
+        ),
+    ]
@@ -0,0 +1,167 @@
+# Generated by Django 5.2.8 on 2026-10-19 09:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0049_sync_change_resource_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedInventoryLog',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('shop_id', models.BigIntegerField()),
+                ('product_id', models.BigIntegerField()),
+                ('product_name', models.CharField(max_length=255)),
+                ('reason_code', models.CharField(max_length=20)),
+                ('quantity_change', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('previous_quantity', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('new_quantity', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('reference_number', models.CharField(blank=True, max_length=100)),
+                ('notes', models.TextField(blank=True)),
+                ('performed_by_id', models.BigIntegerField(null=True)),
+                ('performed_by_name', models.CharField(blank=True, max_length=255, null=True)),
+                ('cost_price', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('created_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Archived Inventory Log',
+                'verbose_name_plural': 'Archived Inventory Logs',
+                'indexes': [models.Index(fields=['shop_id', 'product_id', '-created_at'], name='core_archiv_shop_id_525f1c_idx'), models.Index(fields=['shop_id', '-created_at'], name='core_archiv_shop_id_c7cc9a_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedSale',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('shop_id', models.BigIntegerField()),
+                ('cashier_id', models.BigIntegerField(null=True)),
+                ('cashier_name', models.CharField(blank=True, max_length=255)),
+                ('total_amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('currency', models.CharField(max_length=3)),
+                ('payment_method', models.CharField(max_length=20)),
+                ('customer_name', models.CharField(blank=True, max_length=255)),
+                ('customer_phone', models.CharField(blank=True, max_length=20)),
+                ('status', models.CharField(max_length=20)),
+                ('refund_reason', models.TextField(blank=True)),
+                ('refund_type', models.CharField(blank=True, max_length=20)),
+                ('refund_amount', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('refunded_at', models.DateTimeField(blank=True, null=True)),
+                ('refunded_by_id', models.BigIntegerField(null=True)),
+                ('refunded_by_name', models.CharField(blank=True, max_length=255, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('client_uuid', models.UUIDField(blank=True, null=True)),
+                ('synced_at', models.DateTimeField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Archived Sale',
+                'verbose_name_plural': 'Archived Sales',
+                'indexes': [models.Index(fields=['shop_id', '-created_at'], name='core_archiv_shop_id_7d3edc_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedSaleItem',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('product_id', models.BigIntegerField()),
+                ('product_name', models.CharField(max_length=255)),
+                ('product_price', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('product_price_type', models.CharField(blank=True, max_length=20)),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('unit_cost', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('total_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('refunded', models.BooleanField(default=False)),
+                ('refund_quantity', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('refund_reason', models.TextField(blank=True)),
+                ('refund_type', models.CharField(blank=True, max_length=20)),
+                ('refund_amount', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('refunded_at', models.DateTimeField(blank=True, null=True)),
+                ('refunded_by_id', models.BigIntegerField(null=True)),
+                ('sale', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='core.archivedsale')),
+            ],
+            options={
+                'verbose_name': 'Archived Sale Item',
+                'verbose_name_plural': 'Archived Sale Items',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedStockMovement',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('shop_id', models.BigIntegerField()),
+                ('product_id', models.BigIntegerField()),
+                ('product_name', models.CharField(max_length=255)),
+                ('movement_type', models.CharField(max_length=20)),
+                ('transition_type', models.CharField(max_length=25)),
+                ('previous_stock', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('quantity_change', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('new_stock', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('cost_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('total_cost_value', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('inventory_value_change', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('reference_number', models.CharField(blank=True, max_length=100)),
+                ('supplier_name', models.CharField(blank=True, max_length=255)),
+                ('notes', models.TextField(blank=True)),
+                ('performed_by_id', models.BigIntegerField(null=True)),
+                ('created_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Archived Stock Movement',
+                'verbose_name_plural': 'Archived Stock Movements',
+                'indexes': [models.Index(fields=['shop_id', 'product_id', '-created_at'], name='core_archiv_shop_id_f32598_idx'), models.Index(fields=['shop_id', 'created_at'], name='core_archiv_shop_id_45a937_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchiveRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('archived_through', models.DateField(help_text='Last business day moved to the archive')),
+                ('cutoff', models.DateTimeField(help_text='Rows created before this moment are archived')),
+                ('status', models.CharField(choices=[('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='running', max_length=20)),
+                ('sales', models.IntegerField(default=0)),
+                ('sale_items', models.IntegerField(default=0)),
+                ('inventory_logs', models.IntegerField(default=0)),
+                ('stock_movements', models.IntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.shopconfiguration')),
+            ],
+            options={
+                'verbose_name': 'Archive Run',
+                'verbose_name_plural': 'Archive Runs',
+                'ordering': ['-started_at'],
+                'indexes': [models.Index(fields=['shop', 'cutoff'], name='core_archiv_shop_id_c0bb4b_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(help_text="Business day in the shop's timezone")),
+                ('sale_item_count', models.IntegerField(default=0)),
+                ('gross_sales', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('refunds', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('net_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('quantity_sold', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cost_of_goods_sold', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('last_sale_at', models.DateTimeField(blank=True, null=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_rollups', to='core.product')),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.shopconfiguration')),
+            ],
+            options={
+                'verbose_name': 'Sales Rollup',
+                'verbose_name_plural': 'Sales Rollups',
+                'ordering': ['-day'],
+                'indexes': [models.Index(fields=['shop', 'day'], name='core_salesr_shop_id_d7c40c_idx')],
+                'unique_together': {('shop', 'day', 'product')},
+            },
+        ),
+    ]
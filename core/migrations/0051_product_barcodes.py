@@ -0,0 +1,44 @@
+# Generated by Django 5.2.8 on 2026-10-19 09:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_barcodes(apps, schema_editor):
+    """One ProductBarcode row per entry of each product's additional_barcodes list"""
+    Product = apps.get_model('core', 'Product')
+    ProductBarcode = apps.get_model('core', 'ProductBarcode')
+
+    rows = []
+    for product_id, shop_id, barcodes in Product.objects.values_list('id', 'shop_id', 'additional_barcodes').iterator(chunk_size=2000):
+        if not isinstance(barcodes, list):
+            continue
+        cleaned = {str(barcode).strip() for barcode in barcodes if barcode is not None}
+        rows.extend(ProductBarcode(shop_id=shop_id, product_id=product_id, barcode=barcode) for barcode in cleaned if barcode)
+    ProductBarcode.objects.bulk_create(rows, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0050_archive_tables'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductBarcode',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('barcode', models.CharField(max_length=100)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='barcode_entries', to='core.product')),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.shopconfiguration')),
+            ],
+            options={
+                'verbose_name': 'Product Barcode',
+                'verbose_name_plural': 'Product Barcodes',
+                'indexes': [models.Index(fields=['shop', 'barcode'], name='core_produc_shop_id_a6a09d_idx')],
+                'unique_together': {('product', 'barcode')},
+            },
+        ),
+        migrations.RunPython(backfill_barcodes, migrations.RunPython.noop),
+    ]
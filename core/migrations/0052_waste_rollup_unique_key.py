@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-19 10:20
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def merge_duplicate_rollups(apps, schema_editor):
+    """Fold rows sharing a key into the oldest one, so the unique constraints can be added"""
+    WasteRollup = apps.get_model('core', 'WasteRollup')
+
+    key = ('shop_id', 'day', 'reason', 'product_id', 'recorded_by_id')
+    duplicated = WasteRollup.objects.values(*key).annotate(rows=Count('id')).filter(rows__gt=1)
+    for group in list(duplicated):
+        rows = list(WasteRollup.objects.filter(**{field: group[field] for field in key}).order_by('id'))
+        kept, extra = rows[0], rows[1:]
+        kept.waste_count = sum(row.waste_count for row in rows)
+        kept.total_quantity = sum(row.total_quantity for row in rows)
+        kept.total_value = sum(row.total_value for row in rows)
+        kept.save(update_fields=['waste_count', 'total_quantity', 'total_value'])
+        WasteRollup.objects.filter(id__in=[row.id for row in extra]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0051_product_barcodes'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_rollups, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='wasterollup',
+            constraint=models.UniqueConstraint(fields=('shop', 'day', 'reason', 'product', 'recorded_by'), name='unique_waste_rollup_key'),
+        ),
+        migrations.AddConstraint(
+            model_name='wasterollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('recorded_by__isnull', True)), fields=('shop', 'day', 'reason', 'product'), name='unique_waste_rollup_key_without_cashier'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.8 on 2026-10-19 10:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F, Max
+
+
+def number_existing_changes(apps, schema_editor):
+    """Existing changes keep their id as position, so cursors terminals already hold stay valid"""
+    SyncChange = apps.get_model('core', 'SyncChange')
+    SyncSequence = apps.get_model('core', 'SyncSequence')
+
+    SyncChange.objects.update(position=F('id'))
+    SyncSequence.objects.bulk_create([
+        SyncSequence(shop_id=row['shop_id'], last_position=row['last'])
+        for row in SyncChange.objects.values('shop_id').annotate(last=Max('id')).order_by()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0052_waste_rollup_unique_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='syncchange',
+            name='position',
+            field=models.BigIntegerField(blank=True, help_text="Place in the shop's sync order, set after commit", null=True),
+        ),
+        migrations.CreateModel(
+            name='SyncSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_position', models.BigIntegerField(default=0)),
+                ('shop', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='sync_sequence', to='core.shopconfiguration')),
+            ],
+            options={
+                'verbose_name': 'Sync Sequence',
+                'verbose_name_plural': 'Sync Sequences',
+            },
+        ),
+        migrations.RunPython(number_existing_changes, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='syncchange',
+            name='core_syncch_shop_id_9dd5e8_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='syncchange',
+            name='core_syncch_shop_id_41abdb_idx',
+        ),
+        migrations.AddIndex(
+            model_name='syncchange',
+            index=models.Index(fields=['shop', 'position'], name='core_syncch_shop_id_0f8660_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='syncchange',
+            index=models.Index(fields=['shop', 'resource', 'position'], name='core_syncch_shop_id_e5e990_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-19 13:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0053_sync_positions'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='inventorylog',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, help_text="When the stock moved; offline sales keep the till's time"),
+        ),
+    ]
@@ -2,12 +2,19 @@ import uuid
 from django.db import models
 from django.contrib.auth.hashers import make_password, check_password
 from django.utils import timezone
+from .quantities import ONE, ZERO, line_value, money, qty, ratio, stock_value, to_decimal
 
 # Forward declaration to avoid circular import
 from django.apps import apps
 def get_stock_movement_model():
     return apps.get_model('core', 'StockMovement')
 
+def record_sync_change(instance, resource, action='upsert'):
+    """Append one row to the delta-sync change log read by POS terminals (see core/sync.py)"""
+    apps.get_model('core', 'SyncChange').objects.create(
+        shop_id=instance.shop_id, resource=resource, object_id=instance.pk, action=action
+    )
+
 class ShopConfiguration(models.Model):
     shop_id = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
     register_id = models.CharField(max_length=5, unique=True)
@@ -32,6 +39,10 @@ class ShopConfiguration(models.Model):
     registration_time = models.DateTimeField(blank=True, null=True)
     is_active = models.BooleanField(default=True)
     last_login = models.DateTimeField(blank=True, null=True)
+    costing_method = models.CharField(max_length=10, choices=[
+        ('average', 'Moving Average'),
+        ('fifo', 'FIFO'),
+    ], default='average', help_text="How stock leaving the shop is costed against received cost layers")
 
     class Meta:
         verbose_name = "Shop Configuration"
@@ -117,10 +128,43 @@ class Product(models.Model):
     class Meta:
         verbose_name = "Product"
         verbose_name_plural = "Products"
+        indexes = [
+            models.Index(fields=['shop', 'category']),
+            models.Index(fields=['shop', 'is_active']),
+            models.Index(fields=['shop', 'line_code']),
+            models.Index(fields=['shop', 'barcode']),
+        ]
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remembered so save() only rewrites ProductBarcode rows when the list changed
+        if 'additional_barcodes' in instance.__dict__:
+            instance._saved_barcodes = instance.normalized_barcodes()
+        return instance
+
+    def normalized_barcodes(self):
+        """additional_barcodes as a list of distinct non-empty strings"""
+        if not isinstance(self.additional_barcodes, list):
+            return []
+        barcodes = [str(barcode).strip() for barcode in self.additional_barcodes if barcode is not None]
+        return list(dict.fromkeys(barcode for barcode in barcodes if barcode))
+
+    def sync_barcodes(self):
+        """Make the ProductBarcode rows match additional_barcodes"""
+        barcodes = self.normalized_barcodes()
+        if barcodes == getattr(self, '_saved_barcodes', None):
+            return
+        ProductBarcode.objects.filter(product=self).exclude(barcode__in=barcodes).delete()
+        ProductBarcode.objects.bulk_create(
+            [ProductBarcode(shop_id=self.shop_id, product=self, barcode=barcode) for barcode in barcodes],
+            ignore_conflicts=True,
+        )
+        self._saved_barcodes = barcodes
+
     @property
     def is_low_stock(self):
         return self.stock_quantity <= self.min_stock_level
@@ -176,6 +220,10 @@ class Product(models.Model):
             
         # Call super save first to get the actual instance
         super().save(*args, **kwargs)
+        record_sync_change(self, 'product')
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'additional_barcodes' in update_fields:
+            self.sync_barcodes()
         
         # Check for stock transitions and create movement records
         if previous_stock is not None and previous_stock != self.stock_quantity:
@@ -187,6 +235,10 @@ class Product(models.Model):
         if hasattr(self, '_previous_cost_price'):
             delattr(self, '_previous_cost_price')
 
+    def delete(self, *args, **kwargs):
+        record_sync_change(self, 'product', 'delete')
+        return super().delete(*args, **kwargs)
+
     def _create_stock_movement_record(self, previous_stock, new_stock, previous_cost_price):
         """Create a stock movement record when stock changes"""
         try:
@@ -308,6 +360,28 @@ class Product(models.Model):
         else:
             return None
 
+class ProductBarcode(models.Model):
+    """
+    One row per additional barcode of a product, kept in step with
+    Product.additional_barcodes by Product.save(). Scans look barcodes up here with an
+    index instead of searching inside the JSON list, on SQLite and PostgreSQL alike.
+    """
+    shop = models.ForeignKey(ShopConfiguration, on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='barcode_entries')
+    barcode = models.CharField(max_length=100)
+
+    class Meta:
+        verbose_name = "Product Barcode"
+        verbose_name_plural = "Product Barcodes"
+        unique_together = ['product', 'barcode']
+        indexes = [
+            models.Index(fields=['shop', 'barcode']),
+        ]
+
+    def __str__(self):
+        return f"{self.barcode} -> {self.product_id}"
+
+
 class Customer(models.Model):
     shop = models.ForeignKey(ShopConfiguration, on_delete=models.CASCADE)
     name = models.CharField(max_length=255)
@@ -353,6 +427,14 @@ class Discount(models.Model):
     def __str__(self):
         return f"{self.name} ({self.code})"
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        record_sync_change(self, 'discount')
+
+    def delete(self, *args, **kwargs):
+        record_sync_change(self, 'discount', 'delete')
+        return super().delete(*args, **kwargs)
+
     @property
     def is_valid(self):
         now = timezone.now()
@@ -423,11 +505,22 @@ class Sale(models.Model):
     refund_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     refunded_at = models.DateTimeField(null=True, blank=True)
     refunded_by = models.ForeignKey('Cashier', on_delete=models.SET_NULL, null=True, blank=True, related_name='refunded_sales')
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(default=timezone.now, help_text="When the sale was rung up; offline sales keep the till's time")
+    client_uuid = models.UUIDField(null=True, blank=True, help_text="Id generated by the till for sales captured offline")
+    synced_at = models.DateTimeField(null=True, blank=True, help_text="When an offline sale reached the server")
 
     class Meta:
         verbose_name = "Sale"
         verbose_name_plural = "Sales"
+        constraints = [
+            # Online sales have no client id; NULLs never collide
+            models.UniqueConstraint(fields=['shop', 'client_uuid'], name='unique_sale_client_uuid_per_shop'),
+        ]
+        indexes = [
+            # Dashboards filter by shop + status + created_at and sum total_amount
+            models.Index(fields=['shop', 'status', 'created_at', 'total_amount']),
+            models.Index(fields=['shop', '-created_at']),
+        ]
 
     def __str__(self):
         return f"Sale #{self.id}"
@@ -444,6 +537,7 @@ class SaleItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.DecimalField(max_digits=10, decimal_places=2)
     unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+    unit_cost = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, help_text="Product cost price at the time of sale")
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
     refunded = models.BooleanField(default=False)
     refund_quantity = models.DecimalField(max_digits=10, decimal_places=2, default=0)
@@ -453,9 +547,20 @@ class SaleItem(models.Model):
     refunded_at = models.DateTimeField(null=True, blank=True)
     refunded_by = models.ForeignKey('Cashier', on_delete=models.SET_NULL, null=True, blank=True, related_name='refunded_items')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'sale']),
+        ]
+
     def __str__(self):
         return f"{self.product.name} x{self.quantity}"
 
+    def save(self, *args, **kwargs):
+        # Snapshot the cost so margins on past sales survive supplier price changes
+        if self.unit_cost is None:
+            self.unit_cost = self.product.cost_price
+        super().save(*args, **kwargs)
+
     @property
     def is_refunded(self):
         return self.refunded
@@ -467,31 +572,15 @@ class SaleItem(models.Model):
 
     def refund_item(self, quantity, refund_type, reason='', refunded_by=None):
         """Refund a portion or all of this sale item"""
-        if self.refunded:
-            return False, "Item already fully refunded"
-
-        if quantity > self.remaining_quantity:
-            return False, f"Cannot refund {quantity} items, only {self.remaining_quantity} remaining"
+        from .refunds import RefundError, process_refund
 
-        refund_amount = quantity * self.unit_price
-
-        self.refund_quantity += quantity
-        self.refund_type = refund_type
-        self.refund_reason = reason
-        self.refund_amount += refund_amount
-        self.refunded_at = timezone.now()
-        self.refunded_by = refunded_by
-
-        # Mark as fully refunded if all quantity is refunded
-        if self.refund_quantity >= self.quantity:
-            self.refunded = True
-
-        self.save()
-
-        # Restore stock for refunded quantity
-        self.product.stock_quantity += quantity
-        self.product.save()
+        try:
+            process_refund(self.sale.shop, self.sale, [{'item_id': self.id, 'quantity': quantity}],
+                           refund_type, reason, refunded_by)
+        except RefundError as e:
+            return False, str(e)
 
+        self.refresh_from_db()
         return True, f"Successfully refunded {quantity} x {self.product.name}"
 
 class Cashier(models.Model):
@@ -564,6 +653,14 @@ class Cashier(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        record_sync_change(self, 'cashier')
+
+    def delete(self, *args, **kwargs):
+        record_sync_change(self, 'cashier', 'delete')
+        return super().delete(*args, **kwargs)
+
     def set_password(self, raw_password):
         self.password = make_password(raw_password)
 
@@ -643,6 +740,7 @@ class Expense(models.Model):
         return f"{self.category} - {self.amount} {self.currency}"
     
     def save(self, *args, **kwargs):
+        """Stores the expense only; use expenses.record_expense() to apply stock and audit side effects"""
         # If product is set, populate product information fields
         if self.product and not self.product_line_code:
             self.product_line_code = self.product.line_code
@@ -651,66 +749,11 @@ class Expense(models.Model):
             self.product_cost_price = self.product.cost_price
         
         super().save(*args, **kwargs)
-        
-        # Handle stock deduction for staff lunch
-        if self.category == 'Staff Lunch' and self.staff_lunch_type == 'stock' and self.product and self.quantity > 0:
-            self._deduct_product_stock()
-        
-        # Create audit trail entry
-        self._create_expense_audit_trail()
     
-    def _deduct_product_stock(self):
-        """Deduct stock when staff lunch involves eating products"""
-        try:
-            # Get StockMovement model dynamically to avoid circular import
-            StockMovement = get_stock_movement_model()
-            
-            previous_stock = float(self.product.stock_quantity or 0)
-            new_stock = previous_stock - float(self.quantity)
-            
-            # Update product stock
-            self.product.stock_quantity = new_stock
-            self.product.save()
-            
-            # Create stock movement record for staff lunch
-            StockMovement.objects.create(
-                shop=self.shop,
-                product=self.product,
-                movement_type='STAFF_LUNCH',  # New movement type
-                previous_stock=previous_stock,
-                quantity_change=-float(self.quantity),  # Negative for deduction
-                new_stock=new_stock,
-                cost_price=float(self.product_cost_price),
-                reference_number=f'Staff Lunch Expense #{self.id}',
-                notes=f'Staff lunch: {self.quantity} units consumed',
-                performed_by=self.recorded_by
-            )
-            
-            print(f"DEBUG: Deducted {self.quantity} units from {self.product.name} for staff lunch")
-        except Exception as e:
-            print(f"Warning: Could not deduct stock for staff lunch: {e}")
-    
-    def _create_expense_audit_trail(self):
-        """Create audit trail entry for expense tracking"""
-        try:
-            # Get StockMovement model dynamically to avoid circular import
-            StockMovement = get_stock_movement_model()
-            
-            # Create inventory log entry
-            InventoryLog.objects.create(
-                shop=self.shop,
-                product=self.product if self.product else None,
-                reason_code='EXPENSE',
-                quantity_change=-float(self.quantity) if self.category == 'Staff Lunch' and self.staff_lunch_type == 'stock' else 0,
-                previous_quantity=self.product.stock_quantity + float(self.quantity) if self.product else 0,
-                new_quantity=self.product.stock_quantity if self.product else 0,
-                reference_number=f'Expense #{self.id}',
-                notes=f'Expense recorded: {self.category} - {self.description} - {self.staff_lunch_type}',
-                performed_by=self.recorded_by,
-                cost_price=self.product_cost_price if self.product else 0
-            )
-        except Exception as e:
-            print(f"Warning: Could not create expense audit trail: {e}")
+    @property
+    def deducts_stock(self):
+        """Staff lunches eaten from stock take the quantity out of the product's stock"""
+        return self.category == 'Staff Lunch' and self.staff_lunch_type == 'stock' and self.product_id is not None and qty(self.quantity) > 0
 
 class Refund(models.Model):
     REFUND_TYPE_CHOICES = [
@@ -791,6 +834,28 @@ class Refund(models.Model):
         except Exception as e:
             print(f"Error processing stock returns for refund {self.id}: {e}")
 
+class RefundRequest(models.Model):
+    """
+    Idempotency record for sale refunds.
+    The first request with a given key stores its result; retries with the same key get
+    that result back instead of refunding again.
+    """
+    shop = models.ForeignKey(ShopConfiguration, on_delete=models.CASCADE)
+    idempotency_key = models.CharField(max_length=255)
+    sale = models.ForeignKey('Sale', on_delete=models.CASCADE, related_name='refund_requests')
+    response = models.JSONField(default=dict, help_text='Result returned to the first request')
+    refunded_by = models.ForeignKey(Cashier, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Refund Request"
+        verbose_name_plural = "Refund Requests"
+        ordering = ['-created_at']
+        unique_together = ['shop', 'idempotency_key']
+
+    def __str__(self):
+        return f"Refund request {self.idempotency_key} for Sale #{self.sale_id}"
+
 class StaffLunch(models.Model):
     shop = models.ForeignKey(ShopConfiguration, on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
@@ -810,19 +875,32 @@ class StaffLunch(models.Model):
         return f"Staff Lunch: {self.product.name} x{self.quantity}"
 
     def save(self, *args, **kwargs):
-        # Calculate total cost based on current cost price
-        self.unit_price = self.product.cost_price
-        self.total_cost = self.unit_price * self.quantity
-        self.currency = self.product.currency
-
-        # Reduce inventory
-        if self.product.stock_quantity >= self.quantity:
-            self.product.stock_quantity -= self.quantity
-            self.product.save()
-        else:
-            raise ValueError(f"Insufficient stock for {self.product.name}")
-
-        super().save(*args, **kwargs)
+        """A new lunch takes its quantity out of stock once, through the stock ledger and cost layers"""
+        from django.db import transaction
+        from .stock_ledger import post_stock_changes
+
+        if not self._state.adding:
+            super().save(*args, **kwargs)
+            return
+
+        with transaction.atomic():
+            self.product = Product.objects.select_for_update().get(id=self.product_id)
+            if self.product.stock_quantity < self.quantity:
+                raise ValueError(f"Insufficient stock for {self.product.name}")
+            self.currency = self.product.currency
+            self.unit_price = self.product.cost_price
+            self.total_cost = line_value(self.quantity, self.unit_price)
+            super().save(*args, **kwargs)
+
+            post_stock_changes(self.shop, [{
+                'product_id': self.product.id,
+                'quantity_change': -qty(self.quantity),
+                'reference_number': f'Staff Lunch #{self.id}',
+                'notes': f'Staff lunch: {self.quantity} units consumed',
+            }], 'STAFF_LUNCH', performed_by=self.recorded_by, products={self.product.id: self.product})
+
+        from .reports import invalidate_pnl
+        invalidate_pnl(self.shop_id, self.created_at)
 
 class StockTake(models.Model):
     STATUS_CHOICES = [
@@ -963,9 +1041,24 @@ class StockTake(models.Model):
                 # Monthly stock takes can complete with discrepancies for investigation
                 self.status = 'completed'
                 self.failure_reason = f'Monthly reconciliation completed with {overstock_count} overstock, {understock_count} understock items requiring investigation.'
-        
+
         self.save()
 
+    def backfill_system_quantities(self, as_of=None):
+        """Reset item system quantities to the stock as of `as_of` (default: when the stock take started)"""
+        from .stock_ledger import stock_as_of
+
+        items = list(self.items.all())
+        if not items:
+            return 0
+
+        stock = stock_as_of(self.shop, as_of or self.started_at, [item.product_id for item in items])
+        for item in items:
+            if item.product_id in stock:
+                item.system_quantity = stock[item.product_id]['quantity']
+        StockTakeItem.objects.bulk_update(items, ['system_quantity'], batch_size=500)
+        return len(items)
+
 class StockTakeItem(models.Model):
     stock_take = models.ForeignKey(StockTake, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
@@ -1021,12 +1114,17 @@ class InventoryLog(models.Model):
     notes = models.TextField(blank=True, help_text="Additional notes about the stock movement")
     performed_by = models.ForeignKey('Cashier', on_delete=models.SET_NULL, null=True, blank=True, help_text="Who performed this stock movement")
     cost_price = models.DecimalField(max_digits=10, decimal_places=2, default=0, help_text="Cost price at time of movement")
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(default=timezone.now, help_text="When the stock moved; offline sales keep the till's time")
 
     class Meta:
         verbose_name = "Inventory Log"
         verbose_name_plural = "Inventory Logs"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['shop', '-created_at']),
+            models.Index(fields=['shop', 'product', '-created_at']),
+            models.Index(fields=['shop', 'reason_code', '-created_at']),
+        ]
 
     def __str__(self):
         return f"{self.product.name} - {self.get_reason_code_display()} ({self.quantity_change:+.2f})"
@@ -1103,6 +1201,7 @@ class StockMovement(models.Model):
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['shop', 'product', '-created_at']),
+            models.Index(fields=['shop', 'created_at']),
             models.Index(fields=['movement_type', '-created_at']),
             models.Index(fields=['transition_type', '-created_at']),
         ]
@@ -1154,6 +1253,14 @@ class StockMovement(models.Model):
             return "OK"
 
     def save(self, *args, **kwargs):
+        self.set_derived_fields()
+        super().save(*args, **kwargs)
+
+    def set_derived_fields(self, min_stock_level=None):
+        """Fill in value and transition fields; called by save() and before bulk_create()"""
+        if min_stock_level is None:
+            min_stock_level = self.product.min_stock_level
+
         # Auto-calculate total cost value and inventory value change
         if not self.total_cost_value:
             self.total_cost_value = abs(self.quantity_change) * self.cost_price
@@ -1170,12 +1277,128 @@ class StockMovement(models.Model):
             self.transition_type = 'POSITIVE_TO_NEGATIVE'
         elif self.is_addition and self.previous_stock < 0:
             self.transition_type = 'RESTOCK'
-        elif self.is_deduction and self.previous_stock > self.product.min_stock_level and self.new_stock <= self.product.min_stock_level:
+        elif self.is_deduction and self.previous_stock > min_stock_level and self.new_stock <= min_stock_level:
             self.transition_type = 'OVERSTOCK_CORRECTION'
-        
+
+
+class StockSnapshot(models.Model):
+    """
+    Nightly stock checkpoint per product.
+    Point-in-time stock is the nearest snapshot plus the ledger delta since it was taken.
+    """
+    shop = models.ForeignKey(ShopConfiguration, on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_snapshots')
+    snapshot_date = models.DateField(help_text="Business day this snapshot closes")
+    taken_at = models.DateTimeField(help_text="Moment the quantity was captured; ledger rows after this are not included")
+    quantity = models.DecimalField(max_digits=10, decimal_places=2)
+    cost_price = models.DecimalField(max_digits=10, decimal_places=2, default=0, help_text="Cost price at time of snapshot")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Stock Snapshot"
+        verbose_name_plural = "Stock Snapshots"
+        ordering = ['-snapshot_date']
+        unique_together = ['product', 'snapshot_date']
+        indexes = [
+            models.Index(fields=['shop', '-snapshot_date']),
+            models.Index(fields=['shop', 'taken_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.product.name} @ {self.snapshot_date}: {self.quantity}"
+
+    @property
+    def stock_value(self):
+        """Stock value - never negative, same rule as Product.stock_value"""
+        return max(0, self.quantity) * self.cost_price
+
+
+class CostLayer(models.Model):
+    """
+    Stock received at one unit cost, still on hand in `remaining_quantity`.
+    FIFO shops keep one layer per receipt and consume the oldest first; moving-average
+    shops fold receipts into a single open layer per product. See core/cost_layers.py.
+    """
+    shop = models.ForeignKey(ShopConfiguration, on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='cost_layers')
+    received_at = models.DateTimeField(help_text="When the stock in this layer was received")
+    unit_cost = models.DecimalField(max_digits=12, decimal_places=4)
+    original_quantity = models.DecimalField(max_digits=10, decimal_places=2)
+    remaining_quantity = models.DecimalField(max_digits=10, decimal_places=2)
+    reference_number = models.CharField(max_length=100, blank=True, help_text="Receipt, transfer or return that opened the layer")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Cost Layer"
+        verbose_name_plural = "Cost Layers"
+        ordering = ['received_at', 'id']
+        indexes = [
+            models.Index(fields=['shop', 'product', 'received_at']),
+            models.Index(fields=['shop', 'remaining_quantity']),
+        ]
+
+    def __str__(self):
+        return f"{self.product.name}: {self.remaining_quantity} @ {self.unit_cost}"
+
+    @property
+    def remaining_value(self):
+        return line_value(self.remaining_quantity, self.unit_cost)
+
+
+class GoodsReceivedNote(models.Model):
+    """
+    A supplier delivery: one header per invoice and one line per product received.
+    Posting is done by receiving.receive_goods(), all lines in one transaction.
+    """
+    shop = models.ForeignKey(ShopConfiguration, on_delete=models.CASCADE)
+    grn_number = models.CharField(max_length=50, unique=True, help_text="Auto-generated goods received note number")
+    supplier_name = models.CharField(max_length=255)
+    supplier_invoice = models.CharField(max_length=255, help_text="Supplier invoice number; a delivery is posted once per invoice")
+    notes = models.TextField(blank=True)
+    total_quantity = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_cost = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    line_count = models.PositiveIntegerField(default=0)
+    received_by = models.ForeignKey('Cashier', on_delete=models.SET_NULL, null=True, blank=True, related_name='goods_received')
+    received_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Goods Received Note"
+        verbose_name_plural = "Goods Received Notes"
+        ordering = ['-received_at']
+        constraints = [
+            models.UniqueConstraint(fields=['shop', 'supplier_name', 'supplier_invoice'], name='unique_supplier_invoice_per_shop'),
+        ]
+        indexes = [
+            models.Index(fields=['shop', '-received_at']),
+        ]
+
+    def __str__(self):
+        return f"GRN {self.grn_number} - {self.supplier_name} #{self.supplier_invoice}"
+
+    def save(self, *args, **kwargs):
+        if not self.grn_number:
+            self.grn_number = f"GRN-{timezone.now():%Y%m%d}-{str(uuid.uuid4())[:8].upper()}"
         super().save(*args, **kwargs)
 
 
+class GoodsReceivedLine(models.Model):
+    grn = models.ForeignKey(GoodsReceivedNote, on_delete=models.CASCADE, related_name='lines')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='goods_received_lines')
+    quantity = models.DecimalField(max_digits=10, decimal_places=2)
+    unit_cost = models.DecimalField(max_digits=10, decimal_places=2)
+    line_cost = models.DecimalField(max_digits=12, decimal_places=2)
+    previous_stock = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    new_stock = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = "Goods Received Line"
+        verbose_name_plural = "Goods Received Lines"
+
+    def __str__(self):
+        return f"{self.product.name} x{self.quantity} @ {self.unit_cost}"
+
+
 class StockTransfer(models.Model):
     """
     Stock Transfer/Adjustment Model
@@ -1251,239 +1474,233 @@ class StockTransfer(models.Model):
     
     def calculate_conversion_ratio(self):
         """Calculate the conversion ratio based on quantities"""
-        if self.from_quantity > 0 and self.to_quantity > 0:
-            self.conversion_ratio = self.to_quantity / self.from_quantity
+        if to_decimal(self.from_quantity) > 0 and to_decimal(self.to_quantity) > 0:
+            self.conversion_ratio = ratio(self.to_quantity, self.from_quantity)
             return self.conversion_ratio
-        return 1.0
+        return ONE
     
     def validate_transfer(self):
         """Validate if the transfer can be processed with business impact analysis"""
         errors = []
-        warnings = []
-        print(f"🔍 DEBUG: Starting validation for transfer")
         
         # Check if from product exists
-        if not self.from_product and not (self.from_line_code or self.from_barcode):
+        if not self.from_product and not self.source_identifier:
             errors.append("Source product must be specified")
         elif not self.from_product:
-            # Try to find the from product
-            identifier = self.from_line_code or self.from_barcode
-            print(f"🔍 DEBUG: Attempting to find source product with identifier: {identifier}")
-            self.from_product = self._find_product_by_identifier(identifier)
+            self.from_product = self._find_product_by_identifier(self.source_identifier)
             if not self.from_product:
-                errors.append(f"Source product not found: {identifier}")
-            else:
-                print(f"🔍 DEBUG: Source product found: {self.from_product.name}")
+                errors.append(f"Source product not found: {self.source_identifier}")
         
         # Check if to product exists
-        if not self.to_product and not (self.to_line_code or self.to_barcode):
+        if not self.to_product and not self.destination_identifier:
             errors.append("Destination product must be specified")
         elif not self.to_product:
-            # Try to find the to product
-            identifier = self.to_line_code or self.to_barcode
-            print(f"🔍 DEBUG: Attempting to find destination product with identifier: {identifier}")
-            self.to_product = self._find_product_by_identifier(identifier)
+            self.to_product = self._find_product_by_identifier(self.destination_identifier)
             if not self.to_product:
-                errors.append(f"Destination product not found: {identifier}")
-            else:
-                print(f"🔍 DEBUG: Destination product found: {self.to_product.name}")
+                errors.append(f"Destination product not found: {self.destination_identifier}")
+        
+        check_errors, warnings = self.check_transfer()
+        return errors + check_errors + warnings  # Return both errors and warnings
+    
+    @property
+    def source_identifier(self):
+        return self.from_line_code or self.from_barcode
+    
+    @property
+    def destination_identifier(self):
+        return self.to_line_code or self.to_barcode
+    
+    def check_transfer(self, available_stock=None):
+        """
+        Business checks on resolved products: cost prices, quantities, stock and yield.
+        `available_stock` overrides the source product's stock, so a batch can check each
+        transfer against the stock left by the transfers before it.
+        Returns (errors, warnings).
+        """
+        errors = []
+        warnings = []
         
         # 🚨 MANDATORY COST VALIDATION - Critical Business Logic
-        if self.from_product and float(self.from_product.cost_price) <= 0:
+        if self.from_product and to_decimal(self.from_product.cost_price) <= 0:
             errors.append(f"CRITICAL: Source product '{self.from_product.name}' has $0.00 cost price. This will mask shrinkage losses!")
         
-        if self.to_product and float(self.to_product.cost_price) <= 0:
+        if self.to_product and to_decimal(self.to_product.cost_price) <= 0:
             errors.append(f"CRITICAL: Destination product '{self.to_product.name}' has $0.00 cost price. This will mask shrinkage losses!")
         
+        from_quantity = qty(self.from_quantity)
+        to_quantity = qty(self.to_quantity)
+        
         # Check quantities
-        if self.from_quantity <= 0:
+        if from_quantity <= 0:
             errors.append("Source quantity must be greater than 0")
         
-        if self.to_quantity <= 0:
+        if to_quantity <= 0:
             errors.append("Destination quantity must be greater than 0")
         
         # Check if we have enough stock for transfer (if applicable)
-        if self.from_product and self.from_quantity > 0:
-            current_stock = float(self.from_product.stock_quantity) if self.from_product.stock_quantity else 0
-            print(f"🔍 DEBUG: Source product stock check - Current: {current_stock}, Required: {self.from_quantity}")
-            if current_stock < float(self.from_quantity):
-                errors.append(f"Insufficient stock. Available: {current_stock}, Required: {self.from_quantity}")
+        if self.from_product and from_quantity > 0:
+            if available_stock is None:
+                available_stock = self.from_product.stock_quantity
+            current_stock = qty(available_stock)
+            if current_stock < from_quantity:
+                errors.append(f"Insufficient stock. Available: {current_stock}, Required: {from_quantity}")
         
         # 🚨 SHRINKAGE DETECTION - Expected vs Actual Yield Analysis
-        if self.from_product and self.to_product and self.from_quantity > 0 and self.to_quantity > 0:
+        if self.from_product and self.to_product and from_quantity > 0 and to_quantity > 0:
             conversion_ratio = self.calculate_conversion_ratio()
-            expected_yield = float(self.from_quantity) * float(conversion_ratio)
-            actual_yield = float(self.to_quantity)
-            
-            print(f"🔍 DEBUG: Yield Analysis - Expected: {expected_yield}, Actual: {actual_yield}")
+            expected_yield = qty(from_quantity * conversion_ratio)
+            actual_yield = to_quantity
             
             # Calculate potential shrinkage
             if actual_yield < expected_yield:
                 shrinkage_qty = expected_yield - actual_yield
-                shrinkage_value = shrinkage_qty * float(self.to_product.cost_price)
+                shrinkage_value = line_value(shrinkage_qty, self.to_product.cost_price)
                 warnings.append(f"⚠️ SHRINKAGE DETECTED: Expected {expected_yield} units but only {actual_yield} produced. Loss: {shrinkage_qty:.2f} units (${shrinkage_value:.2f})")
             elif actual_yield > expected_yield:
                 surplus_qty = actual_yield - expected_yield
-                surplus_value = surplus_qty * float(self.to_product.cost_price)
+                surplus_value = line_value(surplus_qty, self.to_product.cost_price)
                 warnings.append(f"📈 SURPLUS DETECTED: Expected {expected_yield} units but produced {actual_yield}. Gain: {surplus_qty:.2f} units (${surplus_value:.2f})")
         
-        print(f"🔍 DEBUG: Validation complete. Errors: {len(errors)}, Warnings: {len(warnings)}")
-        for error in errors:
-            print(f"❌ DEBUG: Validation error: {error}")
-        for warning in warnings:
-            print(f"⚠️ DEBUG: Validation warning: {warning}")
+        return errors, warnings
+    
+    def quantity_to_add(self):
+        """Quantity credited to the destination: SPLIT derives it from the ratio, other types use to_quantity"""
+        if self.transfer_type == 'SPLIT':
+            return qty(to_decimal(self.from_quantity) * self.calculate_conversion_ratio())
+        return qty(self.to_quantity)
+    
+    def calculate_financials(self, from_stock_before, to_stock_before):
+        """Store costs, inventory value change and shrinkage given both products' stock before the transfer"""
+        conversion_ratio = self.calculate_conversion_ratio()
+        from_cost_price = money(self.from_product.cost_price)
+        to_cost_price = money(self.to_product.cost_price)
+        from_quantity = qty(self.from_quantity)
+        quantity_to_add = self.quantity_to_add()
         
-        return errors + warnings  # Return both errors and warnings
+        from_stock_before = qty(from_stock_before)
+        to_stock_before = qty(to_stock_before)
+        from_stock_after = from_stock_before - from_quantity
+        to_stock_after = to_stock_before + quantity_to_add
+        
+        from_inventory_change = stock_value(from_stock_after, from_cost_price) - stock_value(from_stock_before, from_cost_price)
+        to_inventory_change = stock_value(to_stock_after, to_cost_price) - stock_value(to_stock_before, to_cost_price)
+        
+        expected_yield = qty(from_quantity * conversion_ratio)
+        shrinkage_qty = max(ZERO, expected_yield - quantity_to_add)
+        
+        self.from_product_cost = line_value(from_quantity, from_cost_price)
+        self.to_product_cost = line_value(quantity_to_add, to_cost_price)
+        self.net_inventory_value_change = to_inventory_change + from_inventory_change
+        self.cost_impact = self.to_product_cost - self.from_product_cost
+        self.shrinkage_quantity = shrinkage_qty
+        self.shrinkage_value = line_value(shrinkage_qty, to_cost_price)
     
     def process_transfer(self):
         """Execute the stock transfer"""
-        print(f"🔍 DEBUG: process_transfer called for transfer ID: {self.id}")
-        print(f"🔍 DEBUG: Transfer status: {self.status}")
-        print(f"🔍 DEBUG: Transfer type: {self.transfer_type}")
-        
         if self.status != 'PENDING':
-            print(f"❌ DEBUG: Transfer is not in pending status: {self.status}")
             return False, ["Transfer is not in pending status"]
         
-        # Validate transfer
-        errors = self.validate_transfer()
-        print(f"🔍 DEBUG: Validation errors: {errors}")
-        if errors:
-            print(f"❌ DEBUG: Validation failed with errors: {errors}")
-            return False, errors
-        
         try:
-            from django.db import transaction
-            
-            print(f"🔍 DEBUG: Finding products...")
-            # Find products if not already set
-            if not self.from_product and (self.from_line_code or self.from_barcode):
-                self.from_product = self._find_product_by_identifier(self.from_line_code or self.from_barcode)
-                print(f"🔍 DEBUG: Found from_product: {self.from_product.name if self.from_product else 'Not found'}")
-                if not self.from_product:
-                    return False, [f"Source product not found: {self.from_line_code or self.from_barcode}"]
-            
-            if not self.to_product and (self.to_line_code or self.to_barcode):
-                self.to_product = self._find_product_by_identifier(self.to_line_code or self.to_barcode)
-                print(f"🔍 DEBUG: Found to_product: {self.to_product.name if self.to_product else 'Not found'}")
-                if not self.to_product:
-                    return False, [f"Destination product not found: {self.to_line_code or self.to_barcode}"]
-            
-            # Final check - ensure we have both products
-            if not self.from_product:
-                return False, ["Source product is required but not found"]
-            if not self.to_product:
-                return False, ["Destination product is required but not found"]
-            
-            # Process the transfer
-            with transaction.atomic():
-                print(f"🔍 DEBUG: Processing transfer in transaction...")
-                # Deduct from source product
-                if self.from_product and self.from_quantity > 0:
-                    old_from_stock = float(self.from_product.stock_quantity) or 0
-                    new_from_stock = old_from_stock - float(self.from_quantity)
-                    print(f"🔍 DEBUG: Updating from_product stock: {old_from_stock} → {new_from_stock}")
-                    self.from_product.stock_quantity = new_from_stock
-                    self.from_product.save()
-                
-                # Calculate financial impacts before updating stock
-                from_product_cost = 0
-                to_product_cost = 0
-                net_inventory_value_change = 0
-                
-                # 🚨 CRITICAL: Use actual cost prices from database
-                if self.from_product:
-                    from_cost_price = float(self.from_product.cost_price or 0)
-                    from_product_cost = float(self.from_quantity) * from_cost_price
-                    print(f"🔍 DEBUG: Source product cost calculation:")
-                    print(f"🔍 DEBUG: Product name: {self.from_product.name}")
-                    print(f"🔍 DEBUG: Cost price from DB: ${from_cost_price}")
-                    print(f"🔍 DEBUG: Quantity: {self.from_quantity}")
-                    print(f"🔍 DEBUG: Total source cost: {self.from_quantity} × ${from_cost_price} = ${from_product_cost}")
-                else:
-                    print(f"🔍 DEBUG: No source product found for cost calculation")
-                
-                if self.to_product:
-                    to_cost_price = float(self.to_product.cost_price or 0)
-                    # Calculate quantity to add based on transfer type
-                    old_to_stock = float(self.to_product.stock_quantity) or 0
-                    
-                    if self.transfer_type == 'SPLIT':
-                        conversion_ratio = self.calculate_conversion_ratio()
-                        quantity_to_add = float(self.from_quantity) * float(conversion_ratio)
-                        new_to_stock = old_to_stock + quantity_to_add
-                        print(f"🔍 DEBUG: SPLIT operation - Adding {quantity_to_add} (from {self.from_quantity} × {conversion_ratio})")
+            success, results = StockTransfer.process_batch(self.shop, [self])
+        except Exception as e:
+            return False, [f"Error processing transfer: {str(e)}"]
+        
+        if not success:
+            return False, results[0]['errors']
+        return True, ["Transfer completed successfully"]
+    
+    @classmethod
+    def process_batch(cls, shop, transfers):
+        """
+        Validate and execute many transfers as one unit of work.
+        
+        Every product is resolved and locked with one query, identifiers matching no line
+        code or barcode falling back to a name search as in validate_transfer(). Each transfer is checked
+        against the stock left by the ones before it, and nothing is written unless all
+        of them pass. Stock then moves with a single UPDATE, TRANSFER rows go to the stock
+        ledger in one insert and the transfers are stored as COMPLETED.
+        Returns (success, results) with one {'errors': [...], 'warnings': [...]} per transfer.
+        """
+        from django.db import transaction
+        from .product_lookup import resolve_by_name, resolve_identifiers
+        from .stock_ledger import post_stock_changes
+        
+        with transaction.atomic():
+            identifiers = []
+            product_ids = []
+            for transfer in transfers:
+                for side, identifier in (('from', transfer.source_identifier), ('to', transfer.destination_identifier)):
+                    product_id = getattr(transfer, f'{side}_product_id')
+                    if product_id:
+                        product_ids.append(product_id)
                     else:
-                        quantity_to_add = float(self.to_quantity)
-                        new_to_stock = old_to_stock + quantity_to_add
-                        print(f"🔍 DEBUG: ADD operation - Adding {self.to_quantity}")
-                    
-                    to_product_cost = quantity_to_add * to_cost_price
-                    print(f"🔍 DEBUG: Destination product cost calculation:")
-                    print(f"🔍 DEBUG: Product name: {self.to_product.name}")
-                    print(f"🔍 DEBUG: Cost price from DB: ${to_cost_price}")
-                    print(f"🔍 DEBUG: Quantity to add: {quantity_to_add}")
-                    print(f"🔍 DEBUG: Total destination cost: {quantity_to_add} × ${to_cost_price} = ${to_product_cost}")
-                    
-                    # Calculate inventory value change
-                    old_inventory_value = max(0, old_to_stock) * float(self.to_product.cost_price)
-                    new_inventory_value = max(0, new_to_stock) * float(self.to_product.cost_price)
-                    to_inventory_change = new_inventory_value - old_inventory_value
-                    
-                    # Add source product inventory value change (removal)
-                    if self.from_product:
-                        from_old_stock = float(self.from_product.stock_quantity) + float(self.from_quantity)
-                        from_new_stock = float(self.from_product.stock_quantity)
-                        from_old_value = max(0, from_old_stock) * float(self.from_product.cost_price)
-                        from_new_value = max(0, from_new_stock) * float(self.from_product.cost_price)
-                        from_inventory_change = from_new_value - from_old_value
-                        net_inventory_value_change = to_inventory_change + from_inventory_change
+                        identifiers.append(identifier)
+            by_identifier, by_id = resolve_identifiers(shop, identifiers, product_ids, for_update=True)
+            for identifier in {identifier for identifier in identifiers if identifier} - by_identifier.keys():
+                product = resolve_by_name(shop, identifier, for_update=True)
+                if product:
+                    # The same row may already be locked under another identifier or id
+                    by_identifier[identifier] = by_id.setdefault(product.id, product)
+            by_id.update((product.id, product) for product in by_identifier.values())
+            
+            results = []
+            running_stock = {product_id: product.stock_quantity for product_id, product in by_id.items()}
+            for transfer in transfers:
+                errors = []
+                # Bind to the locked rows so every check sees the same stock
+                for side, identifier, label in (('from', transfer.source_identifier, 'Source'),
+                                                ('to', transfer.destination_identifier, 'Destination')):
+                    product_id = getattr(transfer, f'{side}_product_id')
+                    product = by_id.get(product_id) if product_id else by_identifier.get(identifier)
+                    if product:
+                        setattr(transfer, f'{side}_product', product)
+                    elif product_id or identifier:
+                        errors.append(f"{label} product not found: {identifier or product_id}")
                     else:
-                        net_inventory_value_change = to_inventory_change
-                    
-                    print(f"🔍 DEBUG: Inventory value change: ${net_inventory_value_change}")
-                    
-                    # Update destination product stock
-                    self.to_product.stock_quantity = new_to_stock
-                    self.to_product.save()
-                    
-                    # Calculate shrinkage detection
-                    expected_yield = float(self.from_quantity) * float(conversion_ratio)
-                    actual_yield = quantity_to_add
-                    shrinkage_qty = max(0, expected_yield - actual_yield)
-                    shrinkage_val = shrinkage_qty * float(self.to_product.cost_price)
-                    
-                    print(f"🔍 DEBUG: Shrinkage Analysis:")
-                    print(f"🔍 DEBUG: Expected yield: {expected_yield}")
-                    print(f"🔍 DEBUG: Actual yield: {actual_yield}")
-                    print(f"🔍 DEBUG: Shrinkage quantity: {shrinkage_qty}")
-                    print(f"🔍 DEBUG: Shrinkage value: ${shrinkage_val}")
-                    
-                    # Store all financial calculations including shrinkage
-                    self.from_product_cost = from_product_cost
-                    self.to_product_cost = to_product_cost
-                    self.net_inventory_value_change = net_inventory_value_change
-                    self.cost_impact = to_product_cost - from_product_cost
-                    self.shrinkage_quantity = shrinkage_qty
-                    self.shrinkage_value = shrinkage_val
+                        errors.append(f"{label} product must be specified")
                 
-                # Calculate conversion ratio
-                self.calculate_conversion_ratio()
+                available_stock = running_stock.get(transfer.from_product_id)
+                check_errors, warnings = transfer.check_transfer(available_stock)
+                errors.extend(check_errors)
+                results.append({'errors': errors, 'warnings': warnings})
+                if errors:
+                    continue
                 
-                # Mark as completed
-                self.status = 'COMPLETED'
-                self.completed_at = timezone.now()
-                self.save()
-                
-                print(f"✅ DEBUG: Transfer completed successfully!")
-                return True, ["Transfer completed successfully"]
-                
-        except Exception as e:
-            print(f"❌ DEBUG: Exception in process_transfer: {str(e)}")
-            print(f"❌ DEBUG: Exception type: {type(e)}")
-            import traceback
-            print(f"❌ DEBUG: Traceback: {traceback.format_exc()}")
-            return False, [f"Error processing transfer: {str(e)}"]
+                transfer.calculate_financials(running_stock[transfer.from_product.id], running_stock[transfer.to_product.id])
+                running_stock[transfer.from_product.id] -= qty(transfer.from_quantity)
+                running_stock[transfer.to_product.id] += transfer.quantity_to_add()
+            
+            if any(result['errors'] for result in results):
+                return False, results
+            
+            completed_at = timezone.now()
+            for transfer in transfers:
+                transfer.shop = shop
+                transfer.status = 'COMPLETED'
+                transfer.completed_at = completed_at
+                if transfer.pk:
+                    transfer.save()
+            cls.objects.bulk_create([transfer for transfer in transfers if not transfer.pk])
+            
+            changes = []
+            for transfer in transfers:
+                reference_number = f"Transfer #{transfer.id}"
+                notes = f"{transfer.get_transfer_type_display()}: {transfer.get_from_product_display()} → {transfer.get_to_product_display()}"
+                changes.append({
+                    'product_id': transfer.from_product.id,
+                    'quantity_change': -qty(transfer.from_quantity),
+                    'reference_number': reference_number,
+                    'notes': notes,
+                })
+                changes.append({
+                    'product_id': transfer.to_product.id,
+                    'quantity_change': transfer.quantity_to_add(),
+                    'reference_number': reference_number,
+                    'notes': notes,
+                })
+            post_stock_changes(shop, changes, 'TRANSFER', performed_by=transfers[0].performed_by, products=by_id)
+        
+        return True, results
     
     def get_financial_impact_summary(self):
         """Get a summary of financial impacts for business intelligence"""
@@ -1602,55 +1819,19 @@ class StockTransfer(models.Model):
             'alert_level': 'CRITICAL' if (shrinkage_value > 20 or needs_review) else 'HIGH' if shrinkage_value > 5 else 'MEDIUM' if needs_review else 'LOW'
         }
     
+    def get_identifier_resolver(self):
+        """Request-scoped resolver if one was attached, else one private to this transfer"""
+        resolver = getattr(self, 'identifier_resolver', None)
+        if resolver is None:
+            from .product_lookup import IdentifierResolver
+            resolver = self.identifier_resolver = IdentifierResolver(self.shop)
+        return resolver
+    
     def _find_product_by_identifier(self, identifier):
-        """Find product by line code or barcode with comprehensive search"""
-        print(f"🔍 DEBUG: Searching for product with identifier: '{identifier}'")
-        
-        # Get shop context - we need to filter by shop
-        shop = self.shop
-        
-        # Search by line code first
-        try:
-            product = Product.objects.get(line_code=identifier, shop=shop)
-            print(f"✅ DEBUG: Found product by line_code: {product.name}")
-            return product
-        except Product.DoesNotExist:
-            print(f"🔍 DEBUG: Product not found by line_code: {identifier}")
-        
-        # Search by primary barcode
-        try:
-            product = Product.objects.get(barcode=identifier, shop=shop)
-            print(f"✅ DEBUG: Found product by barcode: {product.name}")
-            return product
-        except Product.DoesNotExist:
-            print(f"🔍 DEBUG: Product not found by barcode: {identifier}")
-        
-        # Search in additional barcodes
-        try:
-            product = Product.objects.filter(
-                shop=shop,
-                additional_barcodes__contains=identifier
-            ).first()
-            if product:
-                print(f"✅ DEBUG: Found product by additional_barcodes: {product.name}")
-                return product
-        except Exception as e:
-            print(f"⚠️ DEBUG: Error searching additional_barcodes: {e}")
-        
-        # Search by product name (case insensitive, partial match)
-        try:
-            product = Product.objects.filter(
-                shop=shop,
-                name__icontains=identifier
-            ).first()
-            if product:
-                print(f"✅ DEBUG: Found product by name search: {product.name}")
-                return product
-        except Exception as e:
-            print(f"⚠️ DEBUG: Error searching by name: {e}")
-        
-        print(f"❌ DEBUG: Product not found with identifier: '{identifier}'")
-        return None
+        """Find product by line code, barcode or additional barcode, falling back to a name search"""
+        resolver = self.get_identifier_resolver()
+        resolver.prime([self.source_identifier, self.destination_identifier])
+        return resolver.resolve(identifier) or resolver.resolve_by_name(identifier)
 
 class WasteBatch(models.Model):
     """
@@ -1739,15 +1920,72 @@ class WasteBatch(models.Model):
         except Exception as e:
             raise ValueError(f"Failed to add waste item: {str(e)}")
     
+    def add_waste_items(self, items):
+        """
+        Add many products to this waste batch in one go.
+        
+        `items` is a list of dicts with product_id, quantity and optionally reason and
+        reason_details. Waste rows, stock decrements and DAMAGE stock movements are written
+        with bulk operations and the batch totals are refreshed once, so the cost no
+        longer grows with the square of the item count. Returns the created Waste records.
+        """
+        from django.db import transaction
+        from .stock_ledger import post_stock_changes
+        from .waste_analytics import record_wastes
+        
+        if self.status != 'DRAFT':
+            raise ValueError("Cannot add items to completed or cancelled batch")
+        if not items:
+            return []
+        
+        with transaction.atomic():
+            product_ids = {item['product_id'] for item in items}
+            products = Product.objects.select_for_update().filter(shop=self.shop, id__in=product_ids).in_bulk()
+            missing = product_ids - set(products)
+            if missing:
+                raise ValueError(f"Products not found: {', '.join(str(product_id) for product_id in sorted(missing))}")
+            
+            waste_items = []
+            for item in items:
+                waste_item = Waste(
+                    shop=self.shop,
+                    shop_batch=self,
+                    product=products[item['product_id']],
+                    quantity=item['quantity'],
+                    reason=item.get('reason') or self.reason,
+                    reason_details=item.get('reason_details') or self.reason_details,
+                    recorded_by=self.recorded_by
+                )
+                waste_item.set_derived_fields()
+                if waste_item.quantity <= 0:
+                    raise ValueError(f"Quantity must be greater than 0 for {waste_item.product.name}")
+                waste_items.append(waste_item)
+            
+            Waste.objects.bulk_create(waste_items, batch_size=500)
+            post_stock_changes(self.shop, [
+                {
+                    'product_id': waste_item.product_id,
+                    'quantity_change': -waste_item.quantity,
+                    'cost_price': waste_item.cost_price,
+                    'reference_number': self.batch_number,
+                    'notes': waste_item.movement_notes,
+                }
+                for waste_item in waste_items
+            ], 'DAMAGE', performed_by=self.recorded_by, products=products)
+            record_wastes(waste_items)
+            
+            self._update_totals()
+        return waste_items
+    
     def _update_totals(self):
         """Update batch totals based on individual waste records"""
         waste_items = Waste.objects.filter(shop_batch=self)
-        self.total_waste_value = waste_items.aggregate(
-            total=models.Sum('waste_value')
-        )['total'] or 0
-        self.total_waste_quantity = waste_items.aggregate(
-            total=models.Sum('quantity')
-        )['total'] or 0
+        totals = waste_items.aggregate(
+            total_value=models.Sum('waste_value'),
+            total_quantity=models.Sum('quantity')
+        )
+        self.total_waste_value = totals['total_value'] or 0
+        self.total_waste_quantity = totals['total_quantity'] or 0
         self.save()
     
     def complete_batch(self):
@@ -1765,8 +2003,12 @@ class WasteBatch(models.Model):
         if self.status != 'DRAFT':
             raise ValueError("Only draft batches can be cancelled")
         
+        from .waste_analytics import record_wastes
+        
         # Delete all waste records in this batch
-        Waste.objects.filter(shop_batch=self).delete()
+        waste_items = Waste.objects.filter(shop_batch=self)
+        record_wastes(list(waste_items), sign=-1)
+        waste_items.delete()
         
         self.status = 'CANCELLED'
         self.save()
@@ -1836,22 +2078,34 @@ class Waste(models.Model):
         return f"Waste: {self.product.name} - {self.quantity} units ({self.get_reason_display()})"
     
     def save(self, *args, **kwargs):
+        from .waste_analytics import record_wastes
+        
+        adding = self._state.adding
+        self.set_derived_fields()
+        super().save(*args, **kwargs)
+        
+        # Automatically reduce product stock when waste is recorded
+        self._reduce_stock()
+        if adding:
+            record_wastes([self])
+    
+    def set_derived_fields(self):
+        """Fill cost price, waste value and product identifiers; shared by save() and bulk inserts"""
         # Calculate waste value based on current cost price
         if not self.cost_price:
             self.cost_price = self.product.cost_price
-        # Ensure proper type conversion to avoid float * Decimal errors
-        self.waste_value = float(self.quantity) * float(self.cost_price)
+        self.quantity = qty(self.quantity)
+        self.waste_value = line_value(self.quantity, self.cost_price)
         
         # Store product identifiers
         if not self.line_code:
             self.line_code = self.product.line_code
         if not self.barcode:
             self.barcode = self.product.barcode
-        
-        super().save(*args, **kwargs)
-        
-        # Automatically reduce product stock when waste is recorded
-        self._reduce_stock()
+    
+    @property
+    def movement_notes(self):
+        return f'Waste recorded: {self.get_reason_display()} - {self.reason_details[:100] if self.reason_details else "No details"}'
     
     def _reduce_stock(self):
         """Reduce product stock when waste is recorded"""
@@ -1859,26 +2113,34 @@ class Waste(models.Model):
             # Get StockMovement model dynamically to avoid circular import
             StockMovement = get_stock_movement_model()
             
-            previous_stock = float(self.product.stock_quantity or 0)
-            new_stock = previous_stock - float(self.quantity)
-            
-            # Update product stock
-            self.product.stock_quantity = new_stock
-            self.product.save()
-            
-            # Create stock movement record for waste
-            StockMovement.objects.create(
-                shop=self.shop,
-                product=self.product,
-                movement_type='DAMAGE',  # Waste is treated as damage
-                previous_stock=previous_stock,
-                quantity_change=-float(self.quantity),  # Negative for waste
-                new_stock=new_stock,
-                cost_price=float(self.cost_price),  # Convert to float to avoid type issues
-                notes=f'Waste recorded: {self.get_reason_display()} - {self.reason_details[:100] if self.reason_details else "No details"}',
-                performed_by=self.recorded_by
-            )
-            
+            from django.db import transaction
+            from .cost_layers import apply_stock_costs
+
+            with transaction.atomic():
+                previous_stock = qty(self.product.stock_quantity)
+                new_stock = previous_stock - qty(self.quantity)
+
+                # Take the wasted quantity out of the product's cost layers
+                cost = {'product_id': self.product.id, 'previous_stock': previous_stock, 'new_stock': new_stock}
+                apply_stock_costs(self.shop, [cost], {self.product.id: self.product})
+
+                # Update product stock
+                self.product.stock_quantity = new_stock
+                self.product.save()
+
+                # Create stock movement record for waste
+                StockMovement.objects.create(
+                    shop=self.shop,
+                    product=self.product,
+                    movement_type='DAMAGE',  # Waste is treated as damage
+                    previous_stock=previous_stock,
+                    quantity_change=-qty(self.quantity),  # Negative for waste
+                    new_stock=new_stock,
+                    cost_price=cost.get('cost_price', money(self.cost_price)),
+                    notes=self.movement_notes,
+                    performed_by=self.recorded_by
+                )
+
         except Exception as e:
             print(f"Warning: Could not create stock movement record for waste: {e}")
     
@@ -1898,10 +2160,11 @@ class Waste(models.Model):
     
     @classmethod
     def get_waste_summary(cls, shop, start_date=None, end_date=None):
-        """Get waste summary for a shop"""
+        """Get waste summary for a shop. Dates cover whole business days; datetimes are used as given."""
         from django.db.models import Sum, Count
         from django.utils import timezone
-        from datetime import timedelta
+        from datetime import datetime, timedelta
+        from .time_windows import day_start
         
         # Default to last 30 days if no dates provided
         if not end_date:
@@ -1909,9 +2172,17 @@ class Waste(models.Model):
         if not start_date:
             start_date = end_date - timedelta(days=30)
         
+        # Half-open [start, end) window so the created_at index can be range-scanned
+        start, end = start_date, end_date
+        if not isinstance(start, datetime):
+            start = day_start(start)
+        if not isinstance(end, datetime):
+            end = day_start(end + timedelta(days=1))
+        
         waste_records = cls.objects.filter(
             shop=shop,
-            created_at__range=[start_date, end_date]
+            created_at__gte=start,
+            created_at__lt=end
         )
         
         summary = waste_records.aggregate(
@@ -1934,4 +2205,282 @@ class Waste(models.Model):
                 'start_date': start_date,
                 'end_date': end_date
             }
-        }
\ No newline at end of file
+        }
+
+
+class WasteRollup(models.Model):
+    """
+    Pre-aggregated waste per business day, reason, product and cashier.
+    Kept current as waste is recorded or a batch is cancelled; analytics read from here
+    instead of scanning Waste. Rebuild from history with `manage.py rebuild_waste_rollup`.
+    """
+    shop = models.ForeignKey(ShopConfiguration, on_delete=models.CASCADE)
+    day = models.DateField(help_text="Business day in the shop's timezone")
+    reason = models.CharField(max_length=20, choices=Waste.WASTE_REASON_CHOICES)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='waste_rollups')
+    recorded_by = models.ForeignKey('Cashier', on_delete=models.SET_NULL, null=True, blank=True)
+    waste_count = models.IntegerField(default=0)
+    total_quantity = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_value = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "Waste Rollup"
+        verbose_name_plural = "Waste Rollups"
+        ordering = ['-day']
+        indexes = [
+            models.Index(fields=['shop', 'day']),
+            models.Index(fields=['shop', 'product', 'day']),
+        ]
+        # One row per key, a missing cashier included. The partial constraint stands in for
+        # nulls_distinct=False, which SQLite and PostgreSQL before 15 do not enforce.
+        constraints = [
+            models.UniqueConstraint(fields=['shop', 'day', 'reason', 'product', 'recorded_by'], name='unique_waste_rollup_key'),
+            models.UniqueConstraint(
+                fields=['shop', 'day', 'reason', 'product'], condition=models.Q(recorded_by__isnull=True),
+                name='unique_waste_rollup_key_without_cashier',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.day} {self.product.name} ({self.reason}): {self.total_quantity}"
+
+
+class SyncChange(models.Model):
+    """
+    Append-only log of catalog changes for offline POS terminals.
+    `position` is the sync cursor: a terminal asks for rows after the last position it
+    has seen and gets only what changed since. Rows are written without one; readers
+    number them once committed (core/sync.py), so positions follow commit order, which
+    auto-increment ids do not on PostgreSQL.
+    """
+    RESOURCE_CHOICES = [
+        ('product', 'Product'),
+        ('discount', 'Discount'),
+        ('cashier', 'Cashier'),
+    ]
+    ACTION_CHOICES = [
+        ('upsert', 'Created or Updated'),
+        ('delete', 'Deleted'),
+    ]
+
+    shop = models.ForeignKey(ShopConfiguration, on_delete=models.CASCADE)
+    resource = models.CharField(max_length=20, choices=RESOURCE_CHOICES)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES, default='upsert')
+    changed_at = models.DateTimeField(auto_now_add=True)
+    position = models.BigIntegerField(null=True, blank=True, help_text="Place in the shop's sync order, set after commit")
+
+    class Meta:
+        verbose_name = "Sync Change"
+        verbose_name_plural = "Sync Changes"
+        indexes = [
+            models.Index(fields=['shop', 'position']),
+            # Newest change per resource for ETags (core/etags.py)
+            models.Index(fields=['shop', 'resource', 'position']),
+        ]
+
+    def __str__(self):
+        return f"#{self.id} {self.action} {self.resource} {self.object_id}"
+
+
+class SyncSequence(models.Model):
+    """Last sync position handed out per shop; locking its row serializes the numbering"""
+    shop = models.OneToOneField(ShopConfiguration, on_delete=models.CASCADE, related_name='sync_sequence')
+    last_position = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Sync Sequence"
+        verbose_name_plural = "Sync Sequences"
+
+    def __str__(self):
+        return f"{self.shop_id}: {self.last_position}"
+
+
+class SalesRollup(models.Model):
+    """
+    Sales totals per business day and product for periods moved to the archive.
+    Written by the archiver from exactly the sale items it moves, so reports add these
+    rows to what is still in SaleItem without counting anything twice.
+    """
+    shop = models.ForeignKey(ShopConfiguration, on_delete=models.CASCADE)
+    day = models.DateField(help_text="Business day in the shop's timezone")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='sales_rollups')
+    sale_item_count = models.IntegerField(default=0)
+    gross_sales = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    refunds = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    net_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    quantity_sold = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cost_of_goods_sold = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    last_sale_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Sales Rollup"
+        verbose_name_plural = "Sales Rollups"
+        ordering = ['-day']
+        unique_together = ['shop', 'day', 'product']
+        indexes = [
+            models.Index(fields=['shop', 'day']),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.product.name}: {self.net_revenue}"
+
+
+class ArchiveRun(models.Model):
+    """
+    One pass of `manage.py archive_history`. Rows created before `cutoff` (the close of
+    business day `archived_through`) have been moved to the archive tables once the run
+    is completed.
+    """
+    STATUS_CHOICES = [
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    shop = models.ForeignKey(ShopConfiguration, on_delete=models.CASCADE)
+    archived_through = models.DateField(help_text="Last business day moved to the archive")
+    cutoff = models.DateTimeField(help_text="Rows created before this moment are archived")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='running')
+    sales = models.IntegerField(default=0)
+    sale_items = models.IntegerField(default=0)
+    inventory_logs = models.IntegerField(default=0)
+    stock_movements = models.IntegerField(default=0)
+    error = models.TextField(blank=True)
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Archive Run"
+        verbose_name_plural = "Archive Runs"
+        ordering = ['-started_at']
+        indexes = [
+            models.Index(fields=['shop', 'cutoff']),
+        ]
+
+    def __str__(self):
+        return f"Archive through {self.archived_through} ({self.status})"
+
+
+# Archive tables keep the original ids and refer to shops, cashiers and products by plain
+# id plus the name at archive time, so core.db_routers.ArchiveRouter can place them in a
+# separate database without cross-database foreign keys.
+
+class ArchivedSale(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    shop_id = models.BigIntegerField()
+    cashier_id = models.BigIntegerField(null=True)
+    cashier_name = models.CharField(max_length=255, blank=True)
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    currency = models.CharField(max_length=3)
+    payment_method = models.CharField(max_length=20)
+    customer_name = models.CharField(max_length=255, blank=True)
+    customer_phone = models.CharField(max_length=20, blank=True)
+    status = models.CharField(max_length=20)
+    refund_reason = models.TextField(blank=True)
+    refund_type = models.CharField(max_length=20, blank=True)
+    refund_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    refunded_at = models.DateTimeField(null=True, blank=True)
+    refunded_by_id = models.BigIntegerField(null=True)
+    refunded_by_name = models.CharField(max_length=255, null=True, blank=True)
+    created_at = models.DateTimeField()
+    client_uuid = models.UUIDField(null=True, blank=True)
+    synced_at = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Archived Sale"
+        verbose_name_plural = "Archived Sales"
+        indexes = [
+            models.Index(fields=['shop_id', '-created_at']),
+        ]
+
+    def __str__(self):
+        return f"Archived sale #{self.id}"
+
+
+class ArchivedSaleItem(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    sale = models.ForeignKey(ArchivedSale, on_delete=models.CASCADE, related_name='items')
+    product_id = models.BigIntegerField()
+    product_name = models.CharField(max_length=255)
+    product_price = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+    product_price_type = models.CharField(max_length=20, blank=True)
+    quantity = models.DecimalField(max_digits=10, decimal_places=2)
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+    unit_cost = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    refunded = models.BooleanField(default=False)
+    refund_quantity = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    refund_reason = models.TextField(blank=True)
+    refund_type = models.CharField(max_length=20, blank=True)
+    refund_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    refunded_at = models.DateTimeField(null=True, blank=True)
+    refunded_by_id = models.BigIntegerField(null=True)
+
+    class Meta:
+        verbose_name = "Archived Sale Item"
+        verbose_name_plural = "Archived Sale Items"
+
+    def __str__(self):
+        return f"{self.product_name} x{self.quantity}"
+
+
+class ArchivedInventoryLog(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    shop_id = models.BigIntegerField()
+    product_id = models.BigIntegerField()
+    product_name = models.CharField(max_length=255)
+    reason_code = models.CharField(max_length=20)
+    quantity_change = models.DecimalField(max_digits=10, decimal_places=2)
+    previous_quantity = models.DecimalField(max_digits=10, decimal_places=2)
+    new_quantity = models.DecimalField(max_digits=10, decimal_places=2)
+    reference_number = models.CharField(max_length=100, blank=True)
+    notes = models.TextField(blank=True)
+    performed_by_id = models.BigIntegerField(null=True)
+    performed_by_name = models.CharField(max_length=255, null=True, blank=True)
+    cost_price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Archived Inventory Log"
+        verbose_name_plural = "Archived Inventory Logs"
+        indexes = [
+            models.Index(fields=['shop_id', 'product_id', '-created_at']),
+            models.Index(fields=['shop_id', '-created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.product_name} - {self.reason_code} ({self.quantity_change:+.2f})"
+
+
+class ArchivedStockMovement(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    shop_id = models.BigIntegerField()
+    product_id = models.BigIntegerField()
+    product_name = models.CharField(max_length=255)
+    movement_type = models.CharField(max_length=20)
+    transition_type = models.CharField(max_length=25)
+    previous_stock = models.DecimalField(max_digits=10, decimal_places=2)
+    quantity_change = models.DecimalField(max_digits=10, decimal_places=2)
+    new_stock = models.DecimalField(max_digits=10, decimal_places=2)
+    cost_price = models.DecimalField(max_digits=10, decimal_places=2)
+    total_cost_value = models.DecimalField(max_digits=12, decimal_places=2)
+    inventory_value_change = models.DecimalField(max_digits=12, decimal_places=2)
+    reference_number = models.CharField(max_length=100, blank=True)
+    supplier_name = models.CharField(max_length=255, blank=True)
+    notes = models.TextField(blank=True)
+    performed_by_id = models.BigIntegerField(null=True)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Archived Stock Movement"
+        verbose_name_plural = "Archived Stock Movements"
+        indexes = [
+            models.Index(fields=['shop_id', 'product_id', '-created_at']),
+            models.Index(fields=['shop_id', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.product_name} - {self.movement_type} ({self.quantity_change:+.2f})"
@@ -0,0 +1,32 @@
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+from django.views.decorators.csrf import csrf_exempt
+from django.utils.decorators import method_decorator
+from .models import ShopConfiguration
+from .offline_sales import MAX_BATCH_SIZE, ingest_sales
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class OfflineSaleBatchView(APIView):
+    """
+    Upload sales a till captured while offline. Each sale carries the client_uuid the
+    till generated and its captured_at time. Retrying a batch is safe: sales already
+    posted come back as duplicates with their server id.
+    """
+    def post(self, request):
+        shop = ShopConfiguration.objects.get()
+
+        sales = request.data.get('sales')
+        if not isinstance(sales, list) or not sales:
+            return Response({"error": "sales must be a non-empty list"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(sales) > MAX_BATCH_SIZE:
+            return Response({"error": f"Upload at most {MAX_BATCH_SIZE} sales per batch"}, status=status.HTTP_400_BAD_REQUEST)
+
+        results = ingest_sales(shop, sales)
+        return Response({
+            'created': sum(1 for result in results if result['status'] == 'created'),
+            'duplicates': sum(1 for result in results if result['status'] == 'duplicate'),
+            'rejected': sum(1 for result in results if result['status'] == 'rejected'),
+            'results': results,
+        }, status=status.HTTP_200_OK)
@@ -0,0 +1,265 @@
+"""
+Offline sale ingestion.
+
+A till that lost its connection keeps ringing up sales, each with a UUID it generates
+and the time it was captured. Once it is back online it uploads the queue in batches.
+ingest_sales() checks the whole batch in one pass. It reads the batch's products,
+cashiers and already-synced sales with one query each, then posts every accepted sale
+together: one bulk insert of sales, one of sale items and one stock posting through
+stock_ledger, which also costs the lines from the cost layers.
+The client UUID is unique per shop, so re-uploading a batch after a timeout reports the
+sales as duplicates instead of selling and deducting stock twice.
+"""
+import uuid
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .archive import reads_archive
+from .models import ArchivedSale, Cashier, Product, Sale, SaleItem
+from .quantities import ZERO, line_value, money, qty
+from .reports import invalidate_pnl
+from .stock_ledger import post_inventory_log_changes
+from .time_windows import SHOP_TIMEZONE
+
+MAX_BATCH_SIZE = 500
+# Tills with a clock slightly ahead of the server are not rejected outright
+CLOCK_SKEW = timedelta(minutes=5)
+# A batch that lost a race with a concurrent upload of the same sales is posted once more
+POST_ATTEMPTS = 2
+
+PAYMENT_METHODS = {choice for choice, _ in Sale.PAYMENT_METHOD_CHOICES}
+
+
+class SaleRejected(Exception):
+    """One sale of a batch cannot be accepted; the rest of the batch is unaffected"""
+
+
+def _parse_sale(data, now):
+    """Validate the shape of one uploaded sale; returns it normalized or raises SaleRejected"""
+    if not isinstance(data, dict):
+        raise SaleRejected("Sale must be an object")
+
+    captured_at = data.get('captured_at')
+    captured_at = parse_datetime(captured_at) if isinstance(captured_at, str) else None
+    if captured_at is None:
+        raise SaleRejected("captured_at must be an ISO 8601 date and time")
+    if timezone.is_naive(captured_at):
+        captured_at = timezone.make_aware(captured_at, SHOP_TIMEZONE)
+    if captured_at > now + CLOCK_SKEW:
+        raise SaleRejected("captured_at is in the future")
+
+    try:
+        cashier_id = int(data.get('cashier_id'))
+    except (TypeError, ValueError):
+        raise SaleRejected("Cashier ID required")
+
+    payment_method = data.get('payment_method')
+    if payment_method not in PAYMENT_METHODS:
+        raise SaleRejected(f"Invalid payment method: {payment_method}")
+
+    items = data.get('items')
+    if not isinstance(items, list) or not items:
+        raise SaleRejected("A sale needs at least one item")
+    lines = []
+    for item in items:
+        try:
+            line = {
+                'product_id': int(item['product_id']),
+                'quantity': qty(item['quantity']),
+                'unit_price': money(item['unit_price']) if item.get('unit_price') not in (None, '') else None,
+            }
+            # NaN gets through quantize() and would only fail when compared, as a server error
+            if not all(value.is_finite() for value in (line['quantity'], line['unit_price']) if value is not None):
+                raise SaleRejected("Item quantities and prices must be finite numbers")
+        except (ArithmeticError, KeyError, TypeError, ValueError):
+            raise SaleRejected("Items need a product_id and a numeric quantity")
+        if line['quantity'] <= 0:
+            raise SaleRejected("Item quantities must be greater than 0")
+        lines.append(line)
+
+    return {
+        'captured_at': captured_at,
+        'cashier_id': cashier_id,
+        'payment_method': payment_method,
+        'customer_name': data.get('customer_name') or '',
+        'customer_phone': data.get('customer_phone') or '',
+        'lines': lines,
+    }
+
+
+def _price_sale(sale, products, cashiers):
+    """Resolve cashier, products and prices of a parsed sale, like checkout does"""
+    if sale['cashier_id'] not in cashiers:
+        raise SaleRejected("Invalid cashier")
+
+    currency = None
+    total_amount = ZERO
+    for line in sale['lines']:
+        product = products.get(line['product_id'])
+        if product is None:
+            raise SaleRejected(f"Product {line['product_id']} not found")
+        # The till charged its cached price; fall back to the current one
+        if line['unit_price'] is None:
+            line['unit_price'] = product.price
+        if line['unit_price'] <= 0:
+            raise SaleRejected(f"Cannot sell {product.name} - price is zero")
+        if currency is None:
+            currency = product.currency
+        elif currency != product.currency:
+            raise SaleRejected("All products must be in the same currency")
+        line['product'] = product
+        line['total_price'] = line_value(line['quantity'], line['unit_price'])
+        total_amount += line['total_price']
+
+    sale['cashier'] = cashiers[sale['cashier_id']]
+    sale['currency'] = currency
+    sale['total_amount'] = total_amount
+
+
+def ingest_sales(shop, sales):
+    """
+    Post a batch of offline sales (dicts with client_uuid, captured_at, cashier_id,
+    payment_method, items and optionally customer_name/customer_phone). Items carry
+    product_id, quantity and optionally the unit_price the till charged.
+
+    Returns one outcome per uploaded sale, in upload order:
+    {'client_uuid', 'status': 'created' | 'duplicate' | 'rejected', 'sale_id', 'error'}.
+    Sales are posted in captured_at order, so stock and cost layers move in the order
+    the tills sold.
+    """
+    now = timezone.now()
+    outcomes = []
+    parsed = {}
+    errors = {}
+    for data in sales:
+        raw_uuid = data.get('client_uuid') if isinstance(data, dict) else None
+        outcome = {'client_uuid': raw_uuid, 'status': 'rejected', 'sale_id': None, 'error': None}
+        outcomes.append(outcome)
+        try:
+            client_uuid = uuid.UUID(str(raw_uuid))
+        except ValueError:
+            outcome['error'] = "client_uuid is missing or invalid"
+            continue
+        outcome['client_uuid'] = str(client_uuid)
+        if client_uuid in parsed:
+            # Repeated within the batch: answered with the first copy's outcome below
+            outcome['status'] = 'duplicate'
+            continue
+        try:
+            parsed[client_uuid] = _parse_sale(data, now)
+        except SaleRejected as e:
+            parsed[client_uuid] = None
+            errors[client_uuid] = ('rejected', None, str(e))
+
+    valid = {client_uuid: sale for client_uuid, sale in parsed.items() if sale is not None}
+    for attempt in range(POST_ATTEMPTS):
+        try:
+            results = _post_sales(shop, valid, now)
+            break
+        except IntegrityError:
+            # Another upload of the same sales committed first; they are duplicates on the
+            # next attempt. A conflict that persists is not a race, so it is raised.
+            if attempt == POST_ATTEMPTS - 1:
+                raise
+    results.update(errors)
+
+    for outcome in outcomes:
+        if outcome['error']:
+            continue
+        status, sale_id, error = results[uuid.UUID(outcome['client_uuid'])]
+        if outcome['status'] == 'duplicate' and status != 'rejected':
+            status = 'duplicate'
+        outcome.update(status=status, sale_id=sale_id, error=error)
+    return outcomes
+
+
+def _post_sales(shop, parsed, now):
+    """Post parsed sales keyed by client UUID; returns {client_uuid: (status, sale_id, error)}"""
+    results = {}
+    if not parsed:
+        return results
+
+    with transaction.atomic():
+        product_ids = {line['product_id'] for sale in parsed.values() for line in sale['lines']}
+        products = Product.objects.select_for_update().filter(shop=shop, id__in=product_ids).in_bulk()
+        # Checked under the product locks, so a concurrent upload of the same sales has committed
+        existing = dict(
+            Sale.objects.filter(shop=shop, client_uuid__in=list(parsed)).values_list('client_uuid', 'id')
+        )
+        # A till that was offline for months may retry sales that have since been archived
+        if reads_archive(shop, min(sale['captured_at'] for sale in parsed.values())):
+            existing.update(
+                ArchivedSale.objects.filter(shop_id=shop.id, client_uuid__in=list(parsed)).values_list('client_uuid', 'id')
+            )
+        cashiers = Cashier.objects.filter(shop=shop, id__in={sale['cashier_id'] for sale in parsed.values()}).in_bulk()
+
+        accepted = []
+        for client_uuid, sale in parsed.items():
+            if client_uuid in existing:
+                results[client_uuid] = ('duplicate', existing[client_uuid], None)
+                continue
+            try:
+                _price_sale(sale, products, cashiers)
+            except SaleRejected as e:
+                results[client_uuid] = ('rejected', None, str(e))
+                continue
+            accepted.append((client_uuid, sale))
+        if not accepted:
+            return results
+
+        accepted.sort(key=lambda pair: pair[1]['captured_at'])
+        created = Sale.objects.bulk_create([
+            Sale(
+                shop=shop,
+                cashier=sale['cashier'],
+                total_amount=sale['total_amount'],
+                currency=sale['currency'],
+                payment_method=sale['payment_method'],
+                customer_name=sale['customer_name'],
+                customer_phone=sale['customer_phone'],
+                created_at=sale['captured_at'],
+                client_uuid=client_uuid,
+                synced_at=now,
+            )
+            for client_uuid, sale in accepted
+        ], batch_size=500)
+
+        changes = []
+        for record, (_, sale) in zip(created, accepted):
+            for line in sale['lines']:
+                changes.append({
+                    'product_id': line['product'].id,
+                    'quantity_change': -line['quantity'],
+                    'performed_by': sale['cashier'],
+                    'created_at': sale['captured_at'],
+                    'reference_number': f'Sale #{record.id}',
+                    'notes': f'Sold {line["quantity"]} x {line["product"].name} to {sale["customer_name"] or "customer"} (offline)',
+                })
+        entries, _ = post_inventory_log_changes(shop, changes, 'SALE', products)
+
+        items = []
+        entry_iter = iter(entries)
+        for record, (client_uuid, sale) in zip(created, accepted):
+            for line in sale['lines']:
+                entry = next(entry_iter)
+                items.append(SaleItem(
+                    sale=record,
+                    product=line['product'],
+                    quantity=line['quantity'],
+                    unit_price=line['unit_price'],
+                    unit_cost=entry['cost_price'],
+                    total_price=line['total_price'],
+                ))
+            results[client_uuid] = ('created', record.id, None)
+        SaleItem.objects.bulk_create(items, batch_size=500)
+
+        months = {}
+        for record in created:
+            local = record.created_at.astimezone(SHOP_TIMEZONE)
+            months.setdefault((local.year, local.month), record.created_at)
+        for captured_at in months.values():
+            invalidate_pnl(shop.id, captured_at)
+    return results
@@ -0,0 +1,58 @@
+"""
+Serialized product fragments.
+
+DRF serializes a product field by field, and ProductSerializer adds display names,
+stock_status and stock_value on top. For a catalog of thousands of products that is most
+of the CPU time of a list request, and nearly all of it is repeated work. Every product
+write goes through Product.save() or a set-based UPDATE, and both bump updated_at, so
+(id, updated_at) identifies one version of a product.
+
+serialized_products() reads just (id, updated_at) for the list and reuses the cached
+fragment of every product whose version matches; only changed products are loaded and
+serialized. Fragments are cached in buckets of consecutive ids, so a catalog costs a
+handful of cache entries (the default local-memory cache keeps only 300) and a change
+rewrites one bucket.
+"""
+from django.core.cache import cache
+
+FRAGMENT_TIMEOUT = 60 * 60 * 24
+BUCKET_SIZE = 500
+# Bump when a cached serializer's output changes shape
+FRAGMENT_VERSION = 1
+
+
+def _bucket_key(serializer_class, bucket):
+    return f'product-fragments:{FRAGMENT_VERSION}:{serializer_class.__name__}:{bucket}'
+
+
+def serialized_products(queryset, serializer_class):
+    """`serializer_class(queryset, many=True).data` as a list of dicts, reusing cached rows"""
+    versions = list(queryset.values_list('id', 'updated_at'))
+    keys = {bucket: _bucket_key(serializer_class, bucket) for bucket in {product_id // BUCKET_SIZE for product_id, _ in versions}}
+    cached = cache.get_many(list(keys.values()))
+    buckets = {bucket: cached.get(key, {}) for bucket, key in keys.items()}
+
+    rows = {}
+    stale = []
+    for product_id, updated_at in versions:
+        fragment = buckets[product_id // BUCKET_SIZE].get(product_id)
+        if fragment is not None and fragment[0] == updated_at:
+            rows[product_id] = fragment[1]
+        else:
+            stale.append(product_id)
+
+    if stale:
+        products = list(queryset.model.objects.filter(id__in=stale))
+        changed = set()
+        for product, data in zip(products, serializer_class(products, many=True).data):
+            rows[product.id] = dict(data)
+            bucket = product.id // BUCKET_SIZE
+            # A row updated since the first read is cached under its new version
+            buckets.setdefault(bucket, {})[product.id] = (product.updated_at, rows[product.id])
+            changed.add(bucket)
+        cache.set_many(
+            {_bucket_key(serializer_class, bucket): buckets[bucket] for bucket in changed}, FRAGMENT_TIMEOUT
+        )
+
+    # Rows deleted between the two reads are left out
+    return [rows[product_id] for product_id, _ in versions if product_id in rows]
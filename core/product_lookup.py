@@ -0,0 +1,112 @@
+"""
+Product identifier resolution.
+
+An identifier is a line code, a primary barcode or one of the additional barcodes.
+Matches are ranked in that order, the same order StockTransfer has always searched.
+"""
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q
+
+from .models import Product, ProductBarcode
+
+
+MATCH_METHODS = ('line_code', 'barcode', 'additional_barcode')
+
+
+def _match_rank(product, identifier):
+    if product.line_code == identifier:
+        return 0
+    if product.barcode == identifier:
+        return 1
+    if identifier in product.normalized_barcodes():
+        return 2
+    return None
+
+
+def resolve_identifiers(shop, identifiers, product_ids=(), for_update=False):
+    """
+    Resolve many identifiers (and optionally product ids) with a single query.
+
+    Additional barcodes are matched exactly through the indexed ProductBarcode table.
+    Returns ({identifier: Product}, {product_id: Product}); unknown identifiers are omitted.
+    """
+    identifiers = {identifier for identifier in identifiers if identifier}
+    product_ids = set(product_ids)
+    if not identifiers and not product_ids:
+        return {}, {}
+
+    conditions = []
+    if identifiers:
+        conditions.append(Q(line_code__in=identifiers))
+        conditions.append(Q(barcode__in=identifiers))
+        conditions.append(Q(id__in=ProductBarcode.objects.filter(shop=shop, barcode__in=identifiers).values('product_id')))
+    if product_ids:
+        conditions.append(Q(id__in=product_ids))
+
+    queryset = Product.objects.filter(reduce(or_, conditions), shop=shop).order_by('id')
+    if for_update:
+        queryset = queryset.select_for_update()
+
+    by_identifier = {}
+    ranks = {}
+    by_id = {}
+    for product in queryset:
+        by_id[product.id] = product
+        for identifier in identifiers:
+            rank = _match_rank(product, identifier)
+            if rank is not None and rank < ranks.get(identifier, 3):
+                by_identifier[identifier] = product
+                ranks[identifier] = rank
+    return by_identifier, by_id
+
+
+def resolve_by_name(shop, identifier, for_update=False):
+    """First product (by id) whose name contains the identifier, case insensitive, or None"""
+    queryset = Product.objects.filter(shop=shop, name__icontains=identifier).order_by('id')
+    if for_update:
+        queryset = queryset.select_for_update()
+    return queryset.first()
+
+
+class IdentifierResolver:
+    """
+    Memoizing identifier lookup for the lifetime of one request.
+
+    Each identifier costs at most one query, misses included, and identifiers primed
+    together share a single query. Create one per request and hand it to every
+    StockTransfer built for that request.
+    """
+
+    def __init__(self, shop):
+        self.shop = shop
+        self._products = {}
+        self._names = {}
+
+    def prime(self, identifiers):
+        """Resolve every identifier not seen yet with one query"""
+        pending = {identifier for identifier in identifiers if identifier and identifier not in self._products}
+        if pending:
+            by_identifier, _ = resolve_identifiers(self.shop, pending)
+            for identifier in pending:
+                self._products[identifier] = by_identifier.get(identifier)
+
+    def resolve(self, identifier):
+        """Product matching line code, barcode or additional barcode, or None"""
+        if not identifier:
+            return None
+        self.prime([identifier])
+        return self._products[identifier]
+
+    def resolve_by_name(self, identifier):
+        """First product whose name contains the identifier (case insensitive), or None"""
+        if identifier not in self._names:
+            self._names[identifier] = resolve_by_name(self.shop, identifier)
+        return self._names[identifier]
+
+    @staticmethod
+    def match_method(product, identifier):
+        """Which field matched: 'line_code', 'barcode' or 'additional_barcode'"""
+        rank = _match_rank(product, identifier)
+        return MATCH_METHODS[rank] if rank is not None else None
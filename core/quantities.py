@@ -0,0 +1,76 @@
+"""
+Exact money and quantity arithmetic.
+
+Stock quantities, prices and values are stored in DecimalFields with two decimal places.
+Doing the math in float and writing the result back drifts by fractions of a cent, which
+later surfaces as phantom stock-take discrepancies. These helpers keep every value a
+Decimal quantized to the precision of the field it is written to.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+CENT = Decimal('0.01')
+RATIO_PLACES = Decimal('0.0001')
+UNIT_COST_PLACES = Decimal('0.0001')
+ZERO = Decimal('0.00')
+ONE = Decimal('1')
+
+
+def to_decimal(value):
+    """Decimal from a Decimal, int, float, numeric string or None (treated as zero)"""
+    if value is None or value == '':
+        return ZERO
+    if isinstance(value, Decimal):
+        return value
+    if isinstance(value, float):
+        # str() gives the shortest repr, so 0.1 becomes Decimal('0.1') and not its binary expansion
+        return Decimal(str(value))
+    return Decimal(str(value).strip() if isinstance(value, str) else value)
+
+
+def quantize(value, places=CENT):
+    return to_decimal(value).quantize(places, rounding=ROUND_HALF_UP)
+
+
+def qty(value):
+    """Stock quantity at DecimalField(decimal_places=2) precision"""
+    return quantize(value)
+
+
+def money(value):
+    """Money amount at DecimalField(decimal_places=2) precision"""
+    return quantize(value)
+
+
+def ratio(numerator, denominator):
+    """Conversion ratio at DecimalField(decimal_places=4) precision; 1 when either side is not positive"""
+    numerator, denominator = to_decimal(numerator), to_decimal(denominator)
+    if numerator <= 0 or denominator <= 0:
+        return ONE
+    return quantize(numerator / denominator, RATIO_PLACES)
+
+
+def unit_cost(value):
+    """Per-unit cost at DecimalField(decimal_places=4) precision, so averaged costs do not drift"""
+    return quantize(value, UNIT_COST_PLACES)
+
+
+def line_value(quantity, price):
+    """quantity × price rounded once, to the cent"""
+    return money(to_decimal(quantity) * to_decimal(price))
+
+
+def stock_value(quantity, price):
+    """Value of stock on hand - never negative, if oversold the value is $0"""
+    return line_value(max(ZERO, to_decimal(quantity)), price)
+
+
+def fits_field(value, field):
+    """
+    Whether Decimal `value` is finite and, rounded to `field`'s decimal_places, within its
+    max_digits. NaN, Infinity and 1e40 all parse as Decimals, but none can be stored.
+    """
+    if not value.is_finite():
+        return False
+    limit = Decimal(10) ** (field.max_digits - field.decimal_places)
+    # Checked before rounding too: quantizing 1e40 to cents overflows the context precision
+    return abs(value) < limit and abs(quantize(value, Decimal(1).scaleb(-field.decimal_places))) < limit
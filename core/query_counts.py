@@ -0,0 +1,185 @@
+"""
+Query-count gate.
+
+Every named route in the URLconf is requested against a fixed seeded dataset, and its
+query count and time are compared with core/query_baseline.json. Routes that answer 400
+without a query string get one from QUERY_PARAMS. The write endpoints in PAYLOADS are
+also posted a representative body, recorded under '<route> POST'.
+
+Each request runs inside a transaction that is rolled back, so every endpoint sees the
+same seeded rows and writes cannot leak into the next one. Views' own atomic blocks then
+run as savepoints, whether the gate runs under pytest (tests/test_query_counts.py) or
+through `manage.py check_query_counts`, so both measure the same counts; --update on the
+command re-records the baseline.
+"""
+import base64
+import json
+import time
+import uuid
+from decimal import Decimal
+from pathlib import Path
+
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver, get_resolver, reverse
+from django.utils import timezone
+
+from .demo_data import DEMO_PASSWORD, generate_demo_data
+from .models import Cashier, Product, ProductBarcode, Sale, SaleItem, StockTake, WasteBatch
+from .receiving import receive_goods
+from .sync import sequence_changes
+
+BASELINE = Path(__file__).resolve().parent / 'query_baseline.json'
+DATASET = {'scale': 'tiny', 'seed': 0}
+
+# Query strings for endpoints that answer 400 without one
+QUERY_PARAMS = {
+    'barcode-lookup': lambda fixtures: {'barcode': fixtures['barcode']},
+    'bulk-product': lambda fixtures: {'category': fixtures['category']},
+    'export': lambda fixtures: {'export_format': 'csv'},
+    'stock-as-of': lambda fixtures: {'at': timezone.localdate().isoformat()},
+    'stock-take-product-search': lambda fixtures: {'q': fixtures['search']},
+}
+
+
+def _line(fixtures):
+    return {'product_id': str(fixtures['product_id']), 'quantity': '1'}
+
+
+# Bodies for the write endpoints, posted in addition to the GET
+PAYLOADS = {
+    'sale-list': lambda fixtures: {
+        'cashier_id': fixtures['cashier_id'], 'items': [_line(fixtures)], 'payment_method': 'cash',
+    },
+    'offline-sale-batch': lambda fixtures: {'sales': [{
+        'client_uuid': str(uuid.UUID(int=1)), 'captured_at': timezone.now().isoformat(),
+        'cashier_id': fixtures['cashier_id'], 'payment_method': 'cash', 'items': [_line(fixtures)],
+    }]},
+    'goods-received-list': lambda fixtures: {
+        'supplier_name': 'Query gate', 'supplier_invoice': 'QG-2',
+        'lines': [{'identifier': fixtures['line_code'], 'quantity': '2', 'unit_cost': '1.00'}],
+    },
+    'stocktransfer-batch': lambda fixtures: {'transfers': [{
+        'transfer_type': 'TRANSFER', 'from_line_code': fixtures['line_code'], 'from_quantity': '1',
+        'to_line_code': fixtures['other_line_code'], 'to_quantity': '1',
+    }]},
+    'waste-batch-items-bulk': lambda fixtures: {
+        'items': [{'product_id': fixtures['product_id'], 'quantity': '1', 'reason': 'DAMAGED'}],
+    },
+}
+
+
+def endpoints(resolver=None):
+    """(name, URL parameters) of every named route in the URLconf, router format suffixes left out"""
+    resolver = resolver or get_resolver()
+    for pattern in resolver.url_patterns:
+        if isinstance(pattern, URLResolver):
+            yield from endpoints(pattern)
+            continue
+        parameters = list(pattern.pattern.regex.groupindex)
+        if pattern.name and 'format' not in parameters:
+            yield pattern.name, parameters
+
+
+def cases():
+    """(baseline key, route name, method, URL parameters) of every measured request"""
+    for name, parameters in endpoints():
+        yield name, name, 'get', parameters
+        if name in PAYLOADS:
+            yield f'{name} POST', name, 'post', parameters
+
+
+def seed_fixtures():
+    """Seed the fixed dataset; returns the ids URL parameters and bodies are filled with"""
+    shop, _ = generate_demo_data(**DATASET)
+    sale = Sale.objects.filter(shop=shop).order_by('id').first()
+    products = Product.objects.filter(shop=shop, price__gt=0, stock_quantity__gte=10).exclude(line_code='').order_by('id')
+    product, other = products[:2]
+    note, _ = receive_goods(shop, 'Query gate', 'QG-1', [
+        {'product_id': product.id, 'quantity': Decimal('5'), 'unit_cost': product.cost_price},
+    ])
+    batch = WasteBatch.objects.create(shop=shop, reason='DAMAGED')
+    # Steady state: the sync log is numbered, as after the tills' first poll
+    sequence_changes(shop)
+    return {
+        'shop': shop,
+        'product_id': product.id,
+        'line_code': product.line_code,
+        'other_line_code': other.line_code,
+        'category': product.category,
+        'search': product.name[:3],
+        'sale_id': sale.id,
+        'item_id': SaleItem.objects.filter(sale=sale).order_by('id').values_list('id', flat=True).first(),
+        'cashier_id': Cashier.objects.filter(shop=shop).order_by('id').values_list('id', flat=True).first(),
+        'stock_take_id': StockTake.objects.filter(shop=shop).order_by('id').values_list('id', flat=True).first(),
+        'barcode': ProductBarcode.objects.filter(shop=shop).order_by('id').values_list('barcode', flat=True).first(),
+        'grn_id': note.id,
+        'batch_id': batch.id,
+        'dataset': 'sales',
+    }
+
+
+def _request(client, method, path, params, payload, headers):
+    """(status, queries, ms) of one request, rolled back afterwards"""
+    with transaction.atomic():
+        # Only this request's queries; the log is capped and warns once full
+        connection.queries_log.clear()
+        with CaptureQueriesContext(connection) as queries:
+            began = time.perf_counter()
+            if method == 'post':
+                response = client.post(path, json.dumps(payload), content_type='application/json', **headers)
+            else:
+                response = client.get(path, params, **headers)
+            if hasattr(response, 'streaming_content'):
+                # Streamed bodies run their queries as they are read
+                b''.join(response.streaming_content)
+            elapsed = (time.perf_counter() - began) * 1000
+        transaction.set_rollback(True)
+    return response.status_code, len(queries), elapsed
+
+
+def measure_case(fixtures, case, repeat=3):
+    """Status, query count (the most of `repeat` runs) and time (the fastest) of one case"""
+    _, name, method, parameters = case
+    shop = fixtures['shop']
+    path = reverse(name, kwargs={parameter: fixtures.get(parameter, 1) for parameter in parameters})
+    params = QUERY_PARAMS[name](fixtures) if name in QUERY_PARAMS else {}
+    payload = PAYLOADS[name](fixtures) if method == 'post' else None
+    headers = {'HTTP_X_SHOP_ID': str(shop.shop_id), 'HTTP_X_CASHIER_ID': str(fixtures['cashier_id'])}
+    if name == 'sales-history':
+        owner = base64.b64encode(f'{shop.email}:{DEMO_PASSWORD}'.encode()).decode()
+        headers['HTTP_AUTHORIZATION'] = f'Basic {owner}'
+
+    client = Client(raise_request_exception=False)
+    runs = [_request(client, method, path, params, payload, headers) for _ in range(repeat)]
+    return {
+        'path': path,
+        'status': runs[0][0],
+        'queries': max(queries for _, queries, _ in runs),
+        'ms': round(min(ms for _, _, ms in runs), 1),
+    }
+
+
+def measure(fixtures, repeat=3):
+    return {case[0]: measure_case(fixtures, case, repeat) for case in cases()}
+
+
+def load_baseline(path=BASELINE):
+    return json.loads(Path(path).read_text())['endpoints']
+
+
+def regressions(result, expected, query_tolerance=0.1, time_tolerance=None, time_floor=25.0):
+    """
+    What got worse in `result` against its baseline entry. Up to `query_tolerance` extra
+    queries (rounded down) are allowed; time is only compared with a `time_tolerance`.
+    """
+    failures = []
+    if result['queries'] > int(expected['queries'] * (1 + query_tolerance)):
+        failures.append('queries')
+    if time_tolerance is not None:
+        if result['ms'] > max(expected['ms'] * time_tolerance, expected['ms'] + time_floor):
+            failures.append('time')
+    if result['status'] != expected['status']:
+        failures.append(f"status was {expected['status']}")
+    return failures
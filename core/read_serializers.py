@@ -0,0 +1,251 @@
+"""
+Lean read serializers for the big list endpoints.
+
+The DRF serializers of sales, inventory logs and stock takes follow product, cashier and
+item relations one instance at a time, and run every field through DRF's per-field
+machinery. These functions produce the same JSON from .values() querysets instead. The
+joined names and prices come from one query per list, and nested items from one more,
+so the query count stays flat as the list grows. Sale and inventory log lists can merge in
+rows from the archive tables (core/archive.py). The DRF serializers are still used for
+writes and single-object responses. benchmark_read_serializers checks both produce the
+same output.
+"""
+from django.db.models import F
+from django.utils import timezone
+from rest_framework import serializers
+
+from .models import ArchivedSaleItem, InventoryLog, SaleItem, StockTake, StockTakeItem
+from .serializers import format_duration
+
+_decimal = serializers.DecimalField(max_digits=None, decimal_places=2).to_representation
+_datetime = serializers.DateTimeField().to_representation
+
+
+def _format(rows, decimals=(), datetimes=()):
+    # DRF leaves None as None instead of formatting it
+    for row in rows:
+        for field in decimals:
+            if row[field] is not None:
+                row[field] = _decimal(row[field])
+        for field in datetimes:
+            if row[field] is not None:
+                row[field] = _datetime(row[field])
+    return rows
+
+
+def _drop_missing(rows, fields):
+    """DRF leaves out `source='relation.name'` fields whose relation is null"""
+    for row in rows:
+        for field in fields:
+            if row[field] is None:
+                del row[field]
+    return rows
+
+
+def _display(model, field):
+    return {value: label for value, label in model._meta.get_field(field).flatchoices}
+
+
+SALE_ITEM_FIELDS = (
+    'id', 'quantity', 'unit_price', 'total_price', 'refunded', 'refund_quantity', 'refund_reason', 'refund_type',
+    'refund_amount', 'refunded_at', 'refunded_by', 'sale_id',
+)
+SALE_ITEM_DECIMALS = ('product_price', 'quantity', 'unit_price', 'total_price', 'refund_quantity', 'refund_amount')
+
+
+def _sale_item_values(items):
+    if items.model is ArchivedSaleItem:
+        rows = list(items.values(
+            *SALE_ITEM_FIELDS[:-2], 'product_name', 'product_price', 'product_price_type', 'sale_id',
+            product=F('product_id'), refunded_by=F('refunded_by_id'),
+        ))
+    else:
+        rows = list(items.values(
+            'product', *SALE_ITEM_FIELDS,
+            product_name=F('product__name'),
+            product_price=F('product__price'),
+            product_price_type=F('product__price_type'),
+        ))
+    for row in rows:
+        row['product_id'] = row['product']
+        row['remaining_quantity'] = row['quantity'] - row['refund_quantity']
+    return rows
+
+
+def sale_item_rows(items):
+    """SaleItemSerializer output for a SaleItem (or ArchivedSaleItem) queryset"""
+    return _format(_sale_item_values(items), decimals=SALE_ITEM_DECIMALS, datetimes=('refunded_at',))
+
+
+SALE_FIELDS = (
+    'id', 'total_amount', 'currency', 'payment_method', 'customer_name', 'customer_phone', 'status',
+    'refund_reason', 'refund_type', 'refund_amount', 'refunded_at', 'created_at', 'client_uuid', 'synced_at',
+)
+
+
+def _sale_values(sales, item_model):
+    if item_model is ArchivedSaleItem:
+        rows = list(sales.values(
+            *SALE_FIELDS, 'cashier_name', 'refunded_by_name', cashier=F('cashier_id'), refunded_by=F('refunded_by_id'),
+        ))
+    else:
+        rows = list(sales.values(
+            'cashier', 'refunded_by', *SALE_FIELDS,
+            cashier_name=F('cashier__name'),
+            refunded_by_name=F('refunded_by__name'),
+        ))
+
+    items = {}
+    for item in _sale_item_values(item_model.objects.filter(sale_id__in=[row['id'] for row in rows]).order_by('id')):
+        items.setdefault(item.pop('sale_id'), []).append(item)
+    for row in rows:
+        row['items'] = items.get(row['id'], [])
+    return rows
+
+
+def sale_rows(sales, archived_sales=None):
+    """
+    SaleSerializer output for a Sale queryset: two queries, items included. Sales of an
+    ArchivedSale queryset are merged in newest first, with two more queries; a sale that
+    is in both, because an archive run failed half way, is listed once, from the hot table.
+    """
+    rows = _sale_values(sales, SaleItem)
+    if archived_sales is not None:
+        hot_ids = {row['id'] for row in rows}
+        archived = [row for row in _sale_values(archived_sales, ArchivedSaleItem) if row['id'] not in hot_ids]
+        rows = sorted(rows + archived, key=lambda row: row['created_at'], reverse=True)
+
+    for row in rows:
+        _format(row['items'], decimals=SALE_ITEM_DECIMALS, datetimes=('refunded_at',))
+        if row['client_uuid'] is not None:
+            row['client_uuid'] = str(row['client_uuid'])
+    _format(rows, decimals=('total_amount', 'refund_amount'), datetimes=('refunded_at', 'created_at', 'synced_at'))
+    return _drop_missing(rows, ('refunded_by_name',))
+
+
+INVENTORY_LOG_FIELDS = (
+    'id', 'reason_code', 'quantity_change', 'previous_quantity', 'new_quantity', 'reference_number', 'notes',
+    'cost_price', 'created_at',
+)
+
+
+def inventory_log_rows(logs, archived_logs=None):
+    """
+    InventoryLogSerializer output for an InventoryLog queryset in one query. Logs of an
+    ArchivedInventoryLog queryset are merged in newest first, with one more query; a log
+    that is in both, because an archive run failed half way, is listed once, from the hot table.
+    """
+    reasons = _display(InventoryLog, 'reason_code')
+    rows = list(logs.values(
+        'product', 'performed_by', *INVENTORY_LOG_FIELDS,
+        product_name=F('product__name'),
+        performed_by_name=F('performed_by__name'),
+    ))
+    if archived_logs is not None:
+        hot_ids = {row['id'] for row in rows}
+        archived = [row for row in archived_logs.values(
+            *INVENTORY_LOG_FIELDS, 'product_name', 'performed_by_name',
+            product=F('product_id'), performed_by=F('performed_by_id'),
+        ) if row['id'] not in hot_ids]
+        rows = sorted(rows + archived, key=lambda row: row['created_at'], reverse=True)
+
+    for row in rows:
+        row['reason_display'] = reasons.get(row['reason_code'], row['reason_code'])
+        row['movement_type'] = 'IN' if row['quantity_change'] > 0 else 'OUT'
+        row['total_value'] = abs(row['quantity_change']) * row['cost_price']
+    _drop_missing(rows, ('performed_by_name',))
+    return _format(
+        rows,
+        decimals=('quantity_change', 'previous_quantity', 'new_quantity', 'cost_price', 'total_value'),
+        datetimes=('created_at',),
+    )
+
+
+STOCK_TAKE_ITEM_DECIMALS = (
+    'system_quantity', 'counted_quantity', 'discrepancy', 'discrepancy_value', 'product_cost_price', 'product_selling_price',
+)
+
+
+def _stock_take_item_values(items):
+    rows = list(items.values(
+        'id', 'product', 'system_quantity', 'counted_quantity', 'discrepancy', 'discrepancy_value',
+        'notes', 'counted_at', 'stock_take_id',
+        product_name=F('product__name'),
+        product_line_code=F('product__line_code'),
+        product_category=F('product__category'),
+        product_cost_price=F('product__cost_price'),
+        product_selling_price=F('product__price'),
+        currency=F('product__currency'),
+    ))
+    for row in rows:
+        discrepancy = row['discrepancy']
+        row['discrepancy_status'] = 'overstock' if discrepancy > 0 else 'understock' if discrepancy < 0 else 'exact'
+    return rows
+
+
+def stock_take_item_rows(items):
+    """StockTakeItemSerializer output for a StockTakeItem queryset in one query"""
+    rows = _stock_take_item_values(items)
+    for row in rows:
+        del row['stock_take_id']
+    return _format(rows, decimals=STOCK_TAKE_ITEM_DECIMALS, datetimes=('counted_at',))
+
+
+def _stock_take_summary(row, items):
+    """StockTakeSerializer.get_summary() from already-loaded item rows"""
+    if row['status'] not in ('completed', 'failed'):
+        return None
+    total_overstock_value = sum(item['discrepancy_value'] for item in items if item['discrepancy'] > 0)
+    total_understock_value = sum(abs(item['discrepancy_value']) for item in items if item['discrepancy'] < 0)
+    return {
+        'total_products': len(items),
+        'overstock_products': row['overstock_count'],
+        'understock_products': row['understock_count'],
+        'exact_match_products': row['exact_match_count'],
+        'total_overstock_value': total_overstock_value,
+        'total_understock_value': abs(total_understock_value),
+        'needs_restocking': row['understock_count'],
+        'excess_stock_value': total_overstock_value,
+    }
+
+
+def stock_take_rows(stock_takes):
+    """StockTakeSerializer output for a StockTake queryset: two queries, items included"""
+    types = _display(StockTake, 'stock_take_type')
+    balances = _display(StockTake, 'balance_status')
+    rows = list(stock_takes.values(
+        'id', 'name', 'stock_take_type', 'status', 'balance_status', 'failure_reason', 'started_by',
+        'completed_by', 'started_at', 'completed_at', 'notes', 'total_products_counted',
+        'total_discrepancy_value', 'overstock_count', 'understock_count', 'exact_match_count',
+        'created_at', 'updated_at',
+        started_by_name=F('started_by__name'),
+        completed_by_name=F('completed_by__name'),
+    ))
+
+    items = {}
+    for item in _stock_take_item_values(StockTakeItem.objects.filter(stock_take_id__in=[row['id'] for row in rows]).order_by('id')):
+        items.setdefault(item.pop('stock_take_id'), []).append(item)
+
+    now = timezone.now()
+    for row in rows:
+        stock_take_items = items.get(row['id'], [])
+        has_discrepancies = row['overstock_count'] > 0 or row['understock_count'] > 0
+        parts = []
+        if row['overstock_count'] > 0:
+            parts.append(f"{row['overstock_count']} overstock")
+        if row['understock_count'] > 0:
+            parts.append(f"{row['understock_count']} understock")
+        row.update(
+            stock_take_type_display=types.get(row['stock_take_type'], row['stock_take_type']),
+            balance_status_display=balances.get(row['balance_status'], row['balance_status']),
+            duration_display=format_duration((row['completed_at'] or now) - row['started_at']),
+            # Summaries add up raw Decimals, so they come before the items are formatted
+            summary=_stock_take_summary(row, stock_take_items),
+            items=_format(stock_take_items, decimals=STOCK_TAKE_ITEM_DECIMALS, datetimes=('counted_at',)),
+            is_balanced=row['balance_status'] == 'balanced',
+            has_discrepancies=has_discrepancies,
+            discrepancy_summary=", ".join(parts) if has_discrepancies else "Perfect balance - no discrepancies",
+            failure_explanation=f"Stock take failed: {row['failure_reason']}" if row['status'] == 'failed' else None,
+        )
+    _drop_missing(rows, ('started_by_name', 'completed_by_name'))
+    return _format(rows, decimals=('total_discrepancy_value',), datetimes=('started_at', 'completed_at', 'created_at', 'updated_at'))
@@ -0,0 +1,117 @@
+"""
+Goods receiving.
+
+receive_goods() posts a whole supplier delivery in one transaction: one locking read of
+the products, one bulk insert of the note's lines and one stock posting. Stock moves with
+a set-based UPDATE, the ledger gets bulk-inserted RECEIPT rows, and each line opens a
+cost layer at its unit cost. A delivery is identified by supplier and invoice number, so
+posting the same invoice again returns the note that is already there.
+"""
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import GoodsReceivedLine, GoodsReceivedNote, Product
+from .quantities import ZERO, fits_field, line_value, money, qty
+from .stock_ledger import post_stock_changes
+
+STOCK_FIELD = Product._meta.get_field('stock_quantity')
+LINE_COST_FIELD = GoodsReceivedLine._meta.get_field('line_cost')
+
+
+class ReceivingError(Exception):
+    """Delivery rejected; nothing was posted"""
+
+
+def existing_delivery(shop, supplier_name, supplier_invoice):
+    return GoodsReceivedNote.objects.filter(
+        shop=shop, supplier_name=supplier_name, supplier_invoice=supplier_invoice
+    ).first()
+
+
+def receive_goods(shop, supplier_name, supplier_invoice, lines, received_by=None, notes=''):
+    """
+    Post a delivery. `lines` are dicts with product_id, quantity and optionally unit_cost
+    (default: the product's cost price).
+    Returns (note, replayed); `replayed` is True when this invoice was already posted.
+    Raises ReceivingError if any line is invalid.
+    """
+    supplier_name = (supplier_name or '').strip()
+    supplier_invoice = (supplier_invoice or '').strip()
+    if not supplier_name or not supplier_invoice:
+        raise ReceivingError("supplier_name and supplier_invoice are required")
+    if not lines:
+        raise ReceivingError("A delivery needs at least one line")
+
+    existing = existing_delivery(shop, supplier_name, supplier_invoice)
+    if existing is not None:
+        return existing, True
+
+    try:
+        with transaction.atomic():
+            product_ids = {line['product_id'] for line in lines}
+            products = Product.objects.select_for_update().filter(shop=shop, id__in=product_ids).in_bulk()
+            missing = product_ids - set(products)
+            if missing:
+                raise ReceivingError(f"Products not found: {', '.join(str(product_id) for product_id in sorted(missing))}")
+
+            note = GoodsReceivedNote.objects.create(
+                shop=shop,
+                supplier_name=supplier_name,
+                supplier_invoice=supplier_invoice,
+                notes=notes or '',
+                received_by=received_by,
+            )
+
+            running = {product_id: product.stock_quantity for product_id, product in products.items()}
+            received = []
+            changes = []
+            for index, line in enumerate(lines):
+                product = products[line['product_id']]
+                quantity = qty(line['quantity'])
+                if quantity <= 0:
+                    raise ReceivingError(f"Line {index + 1}: quantity must be greater than 0 for {product.name}")
+                unit_cost = money(product.cost_price if line.get('unit_cost') in (None, '') else line['unit_cost'])
+                if unit_cost < 0:
+                    raise ReceivingError(f"Line {index + 1}: unit cost cannot be negative for {product.name}")
+
+                previous_stock = running[product.id]
+                running[product.id] = previous_stock + quantity
+                line_cost = line_value(quantity, unit_cost)
+                if not fits_field(running[product.id], STOCK_FIELD) or not fits_field(line_cost, LINE_COST_FIELD):
+                    raise ReceivingError(f"Line {index + 1}: quantity or cost too large for {product.name}")
+                received.append(GoodsReceivedLine(
+                    grn=note,
+                    product=product,
+                    quantity=quantity,
+                    unit_cost=unit_cost,
+                    line_cost=line_cost,
+                    previous_stock=previous_stock,
+                    new_stock=running[product.id],
+                ))
+                changes.append({
+                    'product_id': product.id,
+                    'quantity_change': quantity,
+                    'cost_price': unit_cost,
+                    'reference_number': supplier_invoice,
+                    'supplier_name': supplier_name,
+                    'notes': f'Received on {note.grn_number}',
+                })
+
+            GoodsReceivedLine.objects.bulk_create(received, batch_size=500)
+            post_stock_changes(shop, changes, 'RECEIPT', performed_by=received_by, products=products)
+            receiving_fields = {'supplier': supplier_name, 'supplier_invoice': supplier_invoice}
+            if notes:
+                receiving_fields['receiving_notes'] = notes
+            Product.objects.filter(shop=shop, id__in=list(products)).update(**receiving_fields, updated_at=timezone.now())
+
+            note.line_count = len(received)
+            note.total_quantity = sum((line.quantity for line in received), ZERO)
+            note.total_cost = sum((line.line_cost for line in received), ZERO)
+            note.save(update_fields=['line_count', 'total_quantity', 'total_cost'])
+    except IntegrityError:
+        # Lost a race on the same invoice: the other request's delivery stands, ours rolled back
+        existing = existing_delivery(shop, supplier_name, supplier_invoice)
+        if existing is not None:
+            return existing, True
+        raise
+    return note, False
@@ -0,0 +1,131 @@
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+from django.views.decorators.csrf import csrf_exempt
+from django.utils.decorators import method_decorator
+from decimal import Decimal
+from .models import ShopConfiguration, Cashier, GoodsReceivedLine, GoodsReceivedNote
+from .product_lookup import IdentifierResolver
+from .quantities import fits_field
+from .receiving import ReceivingError, receive_goods
+
+QUANTITY_FIELD = GoodsReceivedLine._meta.get_field('quantity')
+UNIT_COST_FIELD = GoodsReceivedLine._meta.get_field('unit_cost')
+
+
+def serialize_note(note, lines=None):
+    data = {
+        'id': note.id,
+        'grn_number': note.grn_number,
+        'supplier_name': note.supplier_name,
+        'supplier_invoice': note.supplier_invoice,
+        'notes': note.notes,
+        'line_count': note.line_count,
+        'total_quantity': float(note.total_quantity),
+        'total_cost': float(note.total_cost),
+        'received_by': note.received_by_id,
+        'received_at': note.received_at,
+    }
+    if lines is not None:
+        data['lines'] = [
+            {
+                'id': line.id,
+                'product_id': line.product_id,
+                'product_name': line.product.name,
+                'quantity': float(line.quantity),
+                'unit_cost': float(line.unit_cost),
+                'line_cost': float(line.line_cost),
+                'previous_stock': float(line.previous_stock),
+                'new_stock': float(line.new_stock),
+            }
+            for line in lines
+        ]
+    return data
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class GoodsReceivedNoteListView(APIView):
+    """List goods received notes, or post a whole supplier delivery in one request"""
+    def get(self, request):
+        shop = ShopConfiguration.objects.get()
+        notes = GoodsReceivedNote.objects.filter(shop=shop)
+        if request.query_params.get('supplier_invoice'):
+            notes = notes.filter(supplier_invoice=request.query_params['supplier_invoice'])
+        return Response([serialize_note(note) for note in notes[:100]])
+
+    def post(self, request):
+        shop = ShopConfiguration.objects.get()
+
+        received_by = None
+        cashier_id = request.data.get('cashier_id')
+        if cashier_id:
+            try:
+                received_by = Cashier.objects.get(id=cashier_id, shop=shop)
+            except (Cashier.DoesNotExist, ValueError):
+                return Response({"error": "Invalid cashier"}, status=status.HTTP_400_BAD_REQUEST)
+
+        lines_data = request.data.get('lines')
+        if not isinstance(lines_data, list) or not lines_data:
+            return Response({"error": "lines must be a non-empty list"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Lines may name a product by id or by line code / barcode
+        resolver = IdentifierResolver(shop)
+        resolver.prime(
+            line.get('identifier') for line in lines_data if isinstance(line, dict) and isinstance(line.get('identifier'), str)
+        )
+
+        lines = []
+        for index, line_data in enumerate(lines_data):
+            if not isinstance(line_data, dict):
+                return Response({"error": f"Invalid line at index {index}"}, status=status.HTTP_400_BAD_REQUEST)
+            product_id = line_data.get('product_id')
+            if not product_id and line_data.get('identifier'):
+                if not isinstance(line_data['identifier'], str):
+                    return Response({"error": f"Invalid line at index {index}"}, status=status.HTTP_400_BAD_REQUEST)
+                product = resolver.resolve(line_data['identifier'])
+                if not product:
+                    return Response({"error": f"Product not found: {line_data['identifier']}"}, status=status.HTTP_400_BAD_REQUEST)
+                product_id = product.id
+            try:
+                unit_cost = line_data.get('unit_cost')
+                line = {
+                    'product_id': int(product_id),
+                    'quantity': Decimal(str(line_data.get('quantity', 0))),
+                    'unit_cost': None if unit_cost in (None, '') else Decimal(str(unit_cost)),
+                }
+            except (ArithmeticError, TypeError, ValueError):
+                return Response({"error": f"Invalid line at index {index}"}, status=status.HTTP_400_BAD_REQUEST)
+            # NaN, Infinity and 1e40 parse, but cannot be compared or stored
+            if not fits_field(line['quantity'], QUANTITY_FIELD) or (
+                line['unit_cost'] is not None and not fits_field(line['unit_cost'], UNIT_COST_FIELD)
+            ):
+                return Response({"error": f"Invalid line at index {index}"}, status=status.HTTP_400_BAD_REQUEST)
+            lines.append(line)
+
+        try:
+            note, replayed = receive_goods(
+                shop,
+                request.data.get('supplier_name'),
+                request.data.get('supplier_invoice'),
+                lines,
+                received_by=received_by,
+                notes=request.data.get('notes', ''),
+            )
+        except ReceivingError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            **serialize_note(note, note.lines.select_related('product')),
+            'replayed': replayed
+        }, status=status.HTTP_200_OK if replayed else status.HTTP_201_CREATED)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class GoodsReceivedNoteDetailView(APIView):
+    def get(self, request, grn_id):
+        shop = ShopConfiguration.objects.get()
+        try:
+            note = GoodsReceivedNote.objects.get(id=grn_id, shop=shop)
+        except GoodsReceivedNote.DoesNotExist:
+            return Response({"error": "Goods received note not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(serialize_note(note, note.lines.select_related('product')))
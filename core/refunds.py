@@ -0,0 +1,167 @@
+"""
+Refund engine shared by SaleDetailView, SaleItemDetailView and SaleItem.refund_item.
+
+A refund request runs in one transaction. The sale row is locked first, so concurrent
+refunds of the same sale queue up behind each other. Every item in the request is then
+locked and updated with a single bulk UPDATE. Stock comes back through
+stock_ledger.post_stock_changes, which does one F() update and bulk inserts RETURN rows
+into the stock ledger.
+An optional idempotency key records the result, so a retried request gets the stored
+answer instead of refunding twice.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .models import RefundRequest, Sale, SaleItem
+from .quantities import ZERO, line_value, qty
+from .reports import invalidate_pnl
+from .stock_ledger import post_stock_changes
+
+
+class RefundError(Exception):
+    """Refund rejected; `status_code` is the HTTP status the view should answer with"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def stored_refund(shop, sale, idempotency_key):
+    """Stored result for a key already used on this sale, or None"""
+    existing = RefundRequest.objects.filter(shop=shop, idempotency_key=idempotency_key).first()
+    if existing is None:
+        return None
+    if existing.sale_id != sale.id:
+        raise RefundError("Idempotency key was already used for a different sale", status_code=409)
+    return existing.response
+
+
+def process_refund(shop, sale, items, refund_type, reason='', refunded_by=None, idempotency_key=None):
+    """
+    Refund `items` (dicts with item_id and quantity) of `sale` all-or-nothing.
+
+    Returns (result, replayed). `result` is a JSON-ready dict with total_refund_amount,
+    refunded_items and sale_fully_refunded. `replayed` is True when it was served from an
+    earlier request with the same idempotency key.
+    Raises RefundError if any item cannot be refunded; nothing is written in that case.
+    """
+    if idempotency_key:
+        stored = stored_refund(shop, sale, idempotency_key)
+        if stored is not None:
+            return stored, True
+
+    requested = {}
+    for item_data in items:
+        try:
+            quantity = qty(item_data.get('quantity', 0))
+            item_id = int(item_data.get('item_id'))
+        except (AttributeError, ArithmeticError, TypeError, ValueError):
+            raise RefundError("Invalid refund item")
+        if quantity <= 0:
+            continue
+        requested[item_id] = requested.get(item_id, ZERO) + quantity
+    if not requested:
+        raise RefundError("No items selected for refund")
+
+    try:
+        with transaction.atomic():
+            sale = Sale.objects.select_for_update().get(id=sale.id, shop=shop)
+            if idempotency_key:
+                # A concurrent retry may have finished while we waited for the lock
+                stored = stored_refund(shop, sale, idempotency_key)
+                if stored is not None:
+                    return stored, True
+
+            sale_items = (
+                SaleItem.objects.select_for_update()
+                .select_related('product')
+                .filter(sale=sale, id__in=list(requested))
+                .in_bulk()
+            )
+            refunded_at = timezone.now()
+            refunded_items = []
+            stock_changes = []
+            total_refund_amount = ZERO
+            for item_id, quantity in requested.items():
+                sale_item = sale_items.get(item_id)
+                if sale_item is None:
+                    raise RefundError(f"Sale item {item_id} not found", status_code=404)
+                if sale_item.refunded:
+                    raise RefundError("Item already fully refunded")
+                if quantity > sale_item.remaining_quantity:
+                    raise RefundError(f"Cannot refund {quantity} items, only {sale_item.remaining_quantity} remaining")
+
+                refund_amount = line_value(quantity, sale_item.unit_price)
+                sale_item.refund_quantity += quantity
+                sale_item.refund_type = refund_type
+                sale_item.refund_reason = reason
+                sale_item.refund_amount += refund_amount
+                sale_item.refunded_at = refunded_at
+                sale_item.refunded_by = refunded_by
+                # Mark as fully refunded if all quantity is refunded
+                sale_item.refunded = sale_item.refund_quantity >= sale_item.quantity
+
+                total_refund_amount += refund_amount
+                stock_changes.append({
+                    'product_id': sale_item.product_id,
+                    'quantity_change': quantity,
+                    # Returned stock goes back at what it cost when it was sold
+                    'cost_price': sale_item.unit_cost,
+                    'reference_number': f'Sale #{sale.id}',
+                    'notes': f'Refund return: {quantity} units - {reason}' if reason else f'Refund return: {quantity} units',
+                })
+                refunded_items.append({
+                    'item_id': item_id,
+                    'product_name': sale_item.product.name,
+                    'quantity': float(quantity),
+                    'refund_amount': float(refund_amount),
+                    'remaining_quantity': float(sale_item.remaining_quantity),
+                    'fully_refunded': sale_item.refunded,
+                })
+
+            SaleItem.objects.bulk_update(
+                list(sale_items.values()),
+                ['refund_quantity', 'refund_type', 'refund_reason', 'refund_amount', 'refunded_at', 'refunded_by', 'refunded'],
+            )
+            post_stock_changes(shop, stock_changes, 'RETURN', performed_by=refunded_by)
+            invalidate_pnl(shop.id, sale.created_at)
+
+            # Update sale status if all items are refunded
+            totals = SaleItem.objects.filter(sale=sale).aggregate(
+                open_items=Count('id', filter=Q(refunded=False)),
+                refunded_amount=Sum('refund_amount'),
+            )
+            sale_fully_refunded = totals['open_items'] == 0
+            if sale_fully_refunded:
+                sale.status = 'refunded'
+                sale.refund_reason = reason
+                sale.refund_type = refund_type
+                sale.refund_amount = totals['refunded_amount'] or ZERO
+                sale.refunded_at = refunded_at
+                sale.refunded_by = refunded_by
+                sale.save(update_fields=['status', 'refund_reason', 'refund_type', 'refund_amount', 'refunded_at', 'refunded_by'])
+
+            result = {
+                'sale_id': sale.id,
+                'total_refund_amount': float(total_refund_amount),
+                'refunded_items': refunded_items,
+                'sale_fully_refunded': sale_fully_refunded,
+            }
+            if idempotency_key:
+                RefundRequest.objects.create(
+                    shop=shop, idempotency_key=idempotency_key, sale=sale, response=result, refunded_by=refunded_by
+                )
+    except IntegrityError:
+        # Lost a race on the idempotency key: the other request's refund stands, ours rolled back
+        if idempotency_key:
+            stored = stored_refund(shop, sale, idempotency_key)
+            if stored is not None:
+                return stored, True
+        raise
+    return result, False
+
+
+def idempotency_key_from(request):
+    """Idempotency-Key header, or idempotency_key in the request body"""
+    return request.META.get('HTTP_IDEMPOTENCY_KEY') or request.data.get('idempotency_key') or None
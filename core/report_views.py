@@ -0,0 +1,44 @@
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+from django.views.decorators.csrf import csrf_exempt
+from django.utils.decorators import method_decorator
+from django.utils.dateparse import parse_date
+from .models import ShopConfiguration
+from .reports import cached_profit_and_loss, profit_and_loss
+from .time_windows import local_today
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class ProfitAndLossView(APIView):
+    """
+    Profit and loss for a range of business days: revenue, refunds, COGS, waste, staff
+    lunch and expenses by category. Defaults to the current month to date.
+    """
+    def get(self, request):
+        shop = ShopConfiguration.objects.get()
+
+        end_date = local_today()
+        start_date = end_date.replace(day=1)
+        for name in ('start_date', 'end_date'):
+            value = request.query_params.get(name)
+            if value:
+                try:
+                    day = parse_date(value)
+                except ValueError:
+                    day = None
+                if day is None:
+                    return Response({"error": f"Invalid {name}: {value}"}, status=status.HTTP_400_BAD_REQUEST)
+                if name == 'start_date':
+                    start_date = day
+                else:
+                    end_date = day
+
+        if start_date > end_date:
+            return Response({"error": "start_date must not be after end_date"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if request.query_params.get('refresh') in ('1', 'true'):
+            report = profit_and_loss(shop, start_date, end_date)
+        else:
+            report = cached_profit_and_loss(shop, start_date, end_date)
+        return Response(report, status=status.HTTP_200_OK)
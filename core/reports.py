@@ -0,0 +1,203 @@
+"""
+Profit and loss reporting.
+
+profit_and_loss() answers a date range with a handful of grouped aggregates: one over
+sale items for revenue, refunds and COGS, one over the waste rollup, one over expenses
+grouped by category and one over staff lunches. Days moved to the archive are read from
+SalesRollup and added to what is left in SaleItem. cached_profit_and_loss() keeps the
+result per (shop, period). Each business month has a version stamp in the cache, and
+invalidate_pnl() replaces it when a posting lands in that month. Any cached period that
+covers the month then misses on the next read. Stamps are nanosecond timestamps, never
+reused, so a version evicted from the cache cannot come back as one an old report was
+stored under.
+"""
+import time
+from datetime import datetime
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Max, Q, Sum
+from django.db.models.functions import TruncDate
+
+from .models import Expense, SaleItem, SalesRollup, StaffLunch, WasteRollup
+from .quantities import ZERO, money
+from .time_windows import SHOP_TIMEZONE, days_window
+
+REPORTED_SALE_STATUSES = ('completed', 'refunded')
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def _sales_aggregates():
+    sold = Q(quantity__gt=F('refund_quantity'))
+    net_quantity = F('quantity') - F('refund_quantity')
+    return {
+        'gross_sales': Sum(F('quantity') * F('unit_price')),
+        'refunds': Sum('refund_amount'),
+        'net_revenue': Sum(net_quantity * F('unit_price'), filter=sold),
+        'quantity_sold': Sum(net_quantity, filter=sold),
+        # Cost captured at checkout, so past margins do not move with supplier prices
+        'cost_of_goods_sold': Sum(net_quantity * F('unit_cost'), filter=sold),
+    }
+
+
+ROLLUP_TOTALS = ('gross_sales', 'refunds', 'net_revenue', 'quantity_sold', 'cost_of_goods_sold')
+
+
+def sales_totals(sale_items, rollups=None):
+    """
+    Gross sales, refunds, net revenue, quantity sold and COGS of a SaleItem queryset in
+    one aggregate, plus the archived sales of a matching SalesRollup queryset if given
+    """
+    totals = sale_items.aggregate(**_sales_aggregates())
+    totals = {key: money(value or ZERO) for key, value in totals.items()}
+    if rollups is not None:
+        archived = rollups.aggregate(**{key: Sum(key) for key in ROLLUP_TOTALS})
+        for key in ROLLUP_TOTALS:
+            totals[key] += money(archived[key] or ZERO)
+    return totals
+
+
+def sales_totals_by_product(sale_items, rollups=None):
+    """sales_totals() per product id in one grouped query, plus the time of the last sale"""
+    rows = sale_items.values('product_id').annotate(
+        **_sales_aggregates(), last_sale_at=Max('sale__created_at')
+    ).order_by()
+    if rollups is not None:
+        rows = list(rows) + list(rollups.values('product_id').annotate(
+            **{key: Sum(key) for key in ROLLUP_TOTALS}, last_sale_at=Max('last_sale_at')
+        ).order_by())
+    totals = {}
+    for row in rows:
+        product_id = row.pop('product_id')
+        last_sale_at = row.pop('last_sale_at')
+        product_totals = totals.setdefault(product_id, {key: ZERO for key in ROLLUP_TOTALS} | {'last_sale_at': None})
+        for key, value in row.items():
+            product_totals[key] += money(value or ZERO)
+        if last_sale_at and (product_totals['last_sale_at'] is None or last_sale_at > product_totals['last_sale_at']):
+            product_totals['last_sale_at'] = last_sale_at
+    return totals
+
+
+def sales_rollup_rows(sale_items):
+    """sales_totals() per (business day, product) of a SaleItem queryset, shaped for SalesRollup"""
+    return sale_items.annotate(day=TruncDate('sale__created_at', tzinfo=SHOP_TIMEZONE)).values('day', 'product_id').annotate(
+        **_sales_aggregates(), sale_item_count=Count('id'), last_sale_at=Max('sale__created_at')
+    ).order_by()
+
+
+def expense_breakdown(expenses):
+    """Expense totals of an Expense queryset grouped by category display name"""
+    labels = dict(Expense.EXPENSE_CATEGORY_CHOICES)
+    rows = expenses.values('category').annotate(total=Sum('amount')).order_by('category')
+    return {labels.get(row['category'], row['category']): money(row['total'] or ZERO) for row in rows}
+
+
+def profit_and_loss(shop, start_day, end_day):
+    """P&L for business days start_day..end_day inclusive, as a JSON-ready dict"""
+    start, end = days_window(start_day, end_day)
+
+    sales = sales_totals(SaleItem.objects.filter(
+        sale__shop=shop,
+        sale__status__in=REPORTED_SALE_STATUSES,
+        sale__created_at__gte=start,
+        sale__created_at__lt=end,
+    ), SalesRollup.objects.filter(shop=shop, day__gte=start_day, day__lte=end_day))
+    waste = WasteRollup.objects.filter(shop=shop, day__gte=start_day, day__lte=end_day).aggregate(
+        count=Sum('waste_count'),
+        quantity=Sum('total_quantity'),
+        value=Sum('total_value'),
+    )
+    expenses = expense_breakdown(Expense.objects.filter(
+        shop=shop, expense_date__gte=start_day, expense_date__lte=end_day
+    ))
+    staff_lunch = StaffLunch.objects.filter(shop=shop, created_at__gte=start, created_at__lt=end).aggregate(
+        count=Count('id'),
+        total_cost=Sum('total_cost'),
+    )
+
+    waste_value = money(waste['value'] or ZERO)
+    staff_lunch_costs = money(staff_lunch['total_cost'] or ZERO)
+    business_expenses = sum(expenses.values(), ZERO)
+    gross_profit = sales['net_revenue'] - sales['cost_of_goods_sold']
+    operating_costs = waste_value + staff_lunch_costs + business_expenses
+    net_profit = gross_profit - operating_costs
+    net_revenue = sales['net_revenue']
+
+    def percentage(value):
+        return round(float(value / net_revenue * 100), 2) if net_revenue > 0 else 0
+
+    return {
+        'period': {
+            'start_date': start_day.isoformat(),
+            'end_date': end_day.isoformat()
+        },
+        'revenue': {
+            'gross_sales': float(sales['gross_sales']),
+            'refunds': float(sales['refunds']),
+            'net_revenue': float(net_revenue),
+            'quantity_sold': float(sales['quantity_sold'])
+        },
+        'cost_of_goods_sold': float(sales['cost_of_goods_sold']),
+        'gross_profit': float(gross_profit),
+        'gross_margin_percentage': percentage(gross_profit),
+        'waste': {
+            'waste_count': waste['count'] or 0,
+            'total_quantity': float(waste['quantity'] or 0),
+            'total_value': float(waste_value)
+        },
+        'staff_lunch': {
+            'count': staff_lunch['count'],
+            'total_cost': float(staff_lunch_costs)
+        },
+        'expenses': {
+            'total': float(business_expenses),
+            'by_category': {category: float(total) for category, total in expenses.items()}
+        },
+        'total_operating_costs': float(operating_costs),
+        'net_profit': float(net_profit),
+        'net_profit_percentage': percentage(net_profit),
+    }
+
+
+def _months(start_day, end_day):
+    year, month = start_day.year, start_day.month
+    while (year, month) <= (end_day.year, end_day.month):
+        yield year, month
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def _version_key(shop_id, year, month):
+    return f'pnl-version:{shop_id}:{year:04d}-{month:02d}'
+
+
+def cached_profit_and_loss(shop, start_day, end_day):
+    """profit_and_loss() served from the cache while no posting has landed in the period"""
+    version_keys = [_version_key(shop.id, year, month) for year, month in _months(start_day, end_day)]
+    versions = cache.get_many(version_keys)
+    for missing in set(version_keys) - versions.keys():
+        # add() keeps a stamp another request set first
+        cache.add(missing, time.time_ns(), None)
+        versions[missing] = cache.get(missing)
+    if None in versions.values():
+        # The cache would not keep the stamp; computing is always correct
+        return profit_and_loss(shop, start_day, end_day)
+    stamp = '.'.join(str(versions[key]) for key in version_keys)
+    key = f'pnl:{shop.id}:{start_day.isoformat()}:{end_day.isoformat()}:{stamp}'
+
+    report = cache.get(key)
+    if report is None:
+        report = profit_and_loss(shop, start_day, end_day)
+        cache.set(key, report, CACHE_TIMEOUT)
+    return report
+
+
+def invalidate_pnl(shop_id, day):
+    """
+    Expire cached P&L reports covering the business month of `day` (a date or aware
+    datetime) once the current transaction commits.
+    """
+    if isinstance(day, datetime):
+        day = day.astimezone(SHOP_TIMEZONE).date()
+    key = _version_key(shop_id, day.year, day.month)
+
+    transaction.on_commit(lambda: cache.set(key, time.time_ns(), None))
@@ -2,7 +2,10 @@ from rest_framework import serializers
 from django.db.models import Sum, F
 from django.utils import timezone
 from datetime import timedelta
-from .models import ShopConfiguration, Cashier, Product, Sale, SaleItem, Customer, Discount, Shift, Expense, Refund, StaffLunch, StockTake, StockTakeItem, InventoryLog, StockTransfer
+from decimal import Decimal, InvalidOperation
+from .models import ShopConfiguration, Cashier, Product, Sale, SaleItem, Customer, Discount, Shift, Expense, Refund, StaffLunch, StockTake, StockTakeItem, InventoryLog, StockTransfer, SalesRollup
+from .quantities import fits_field
+from .reports import expense_breakdown, sales_totals, sales_totals_by_product
 
 class ShopConfigurationSerializer(serializers.ModelSerializer):
     shop_owner_master_password = serializers.CharField(write_only=True, required=False)
@@ -146,8 +149,9 @@ class SaleSerializer(serializers.ModelSerializer):
         model = Sale
         fields = ['id', 'cashier', 'cashier_name', 'total_amount', 'currency', 'payment_method', 'customer_name', 'customer_phone',
                   'status', 'refund_reason', 'refund_type', 'refund_amount', 'refunded_at', 'refunded_by', 'refunded_by_name',
-                  'items', 'created_at']
-        read_only_fields = ['id', 'status', 'refund_reason', 'refund_type', 'refund_amount', 'refunded_at', 'refunded_by', 'refunded_by_name', 'created_at']
+                  'items', 'created_at', 'client_uuid', 'synced_at']
+        read_only_fields = ['id', 'status', 'refund_reason', 'refund_type', 'refund_amount', 'refunded_at', 'refunded_by', 'refunded_by_name', 'created_at',
+                            'client_uuid', 'synced_at']
 
 class CreateSaleSerializer(serializers.Serializer):
     items = serializers.ListField(
@@ -164,6 +168,20 @@ class CreateSaleSerializer(serializers.Serializer):
     customer_name = serializers.CharField(required=False, allow_blank=True)
     customer_phone = serializers.CharField(required=False, allow_blank=True)
 
+    def validate_items(self, value):
+        for item in value:
+            if not str(item.get('product_id', '')).isdigit():
+                raise serializers.ValidationError("Each item needs a product_id")
+            try:
+                quantity = Decimal(item.get('quantity', ''))
+            except InvalidOperation:
+                raise serializers.ValidationError("Each item needs a numeric quantity")
+            if not quantity.is_finite() or quantity <= 0:
+                raise serializers.ValidationError("Item quantities must be greater than zero")
+            if not fits_field(quantity, SaleItem._meta.get_field('quantity')):
+                raise serializers.ValidationError("Item quantities must fit in 10 digits with 2 decimal places")
+        return value
+
     def validate_register_id(self, value):
         if not value.isdigit() or len(value) != 5:
             raise serializers.ValidationError("Register ID must be exactly 5 digits.")
@@ -291,21 +309,17 @@ class StockValuationSerializer(serializers.Serializer):
 
     def get_products(self, obj):
         products_data = []
+        # Sales per product (excluding refunded amounts) in one grouped query,
+        # costed at each sale item's cost at the time of sale
+        sales_by_product = sales_totals_by_product(
+            SaleItem.objects.filter(product__in=obj['products']),
+            SalesRollup.objects.filter(product__in=obj['products']),
+        )
         for product in obj['products']:
-            # Calculate sales for this product (excluding refunded amounts)
-            # For each sale item, calculate the net sold quantity (original - refunded)
-            sale_items = SaleItem.objects.filter(product=product)
-            total_quantity_sold = 0
-            total_sales_amount = 0
-            total_cost_amount = 0
-
-            for item in sale_items:
-                # Use remaining quantity (not refunded) for sales calculations
-                net_quantity = item.quantity - item.refund_quantity
-                if net_quantity > 0:
-                    total_quantity_sold += net_quantity
-                    total_sales_amount += net_quantity * item.unit_price
-                    total_cost_amount += net_quantity * item.product.cost_price
+            sales = sales_by_product.get(product.id, {})
+            total_quantity_sold = sales.get('quantity_sold', 0)
+            total_sales_amount = sales.get('net_revenue', 0)
+            total_cost_amount = sales.get('cost_of_goods_sold', 0)
 
             # BUSINESS LOGIC FIX: Separate Inventory Valuation from Sales Performance
             # 
@@ -385,8 +399,7 @@ class StockValuationSerializer(serializers.Serializer):
             stock_status_color = stock_status_colors.get(stock_status, '#6b7280')  # Gray default
 
             # Calculate last sale date
-            last_sale = SaleItem.objects.filter(product=product).order_by('-sale__created_at').first()
-            last_sale_date = last_sale.sale.created_at if last_sale else None
+            last_sale_date = sales.get('last_sale_at')
             last_sale_days_ago = (timezone.now().date() - last_sale_date.date()).days if last_sale_date else None
 
             products_data.append({
@@ -448,19 +461,10 @@ class StockValuationSerializer(serializers.Serializer):
 
         # Calculate overall sales and GP (excluding refunded amounts)
         # GP is based on SALES PERFORMANCE, not current stock levels
-        total_quantity_sold = 0
-        total_sales_amount = 0
-        total_cost_amount = 0
-
-        for product in products:
-            sale_items = SaleItem.objects.filter(product=product)
-            for item in sale_items:
-                # Use remaining quantity (not refunded) for sales calculations
-                net_quantity = item.quantity - item.refund_quantity
-                if net_quantity > 0:
-                    total_quantity_sold += net_quantity
-                    total_sales_amount += net_quantity * item.unit_price
-                    total_cost_amount += net_quantity * item.product.cost_price
+        sales = sales_totals(SaleItem.objects.filter(product__in=products), SalesRollup.objects.filter(product__in=products))
+        total_quantity_sold = sales['quantity_sold']
+        total_sales_amount = sales['net_revenue']
+        total_cost_amount = sales['cost_of_goods_sold']
 
         overall_gross_profit = total_sales_amount - total_cost_amount
         if total_sales_amount > 0:
@@ -586,35 +590,21 @@ class StockValuationSerializer(serializers.Serializer):
         total_staff_lunch_costs = staff_lunches.aggregate(Sum('total_cost'))['total_cost__sum'] or 0
         total_expenses = float(total_business_expenses) + float(total_staff_lunch_costs)
 
-        # Get sales revenue from all products (excluding refunded amounts)
-        sales_revenue = 0
-        cost_of_goods_sold = 0
-
-        for product in products:
-            sale_items = SaleItem.objects.filter(product=product)
-            for item in sale_items:
-                # Use remaining quantity (not refunded) for sales calculations
-                net_quantity = item.quantity - item.refund_quantity
-                if net_quantity > 0:
-                    sales_revenue += net_quantity * item.unit_price
-                    cost_of_goods_sold += net_quantity * item.product.cost_price
+        # Sales revenue and COGS from all products (excluding refunded amounts)
+        sales = sales_totals(SaleItem.objects.filter(product__in=products), SalesRollup.objects.filter(product__in=products))
+        sales_revenue = float(sales['net_revenue'])
+        cost_of_goods_sold = float(sales['cost_of_goods_sold'])
 
         # Calculate profits
-        gross_profit = float(sales_revenue) - float(cost_of_goods_sold)
+        gross_profit = sales_revenue - cost_of_goods_sold
         net_profit = gross_profit - total_expenses
 
         # Calculate percentages
-        sales_revenue_float = float(sales_revenue)
-        gross_margin_percentage = (gross_profit / sales_revenue_float * 100) if sales_revenue_float > 0 else 0
-        net_profit_percentage = (net_profit / sales_revenue_float * 100) if sales_revenue_float > 0 else 0
-
-        # Expense breakdown by type
-        expense_breakdown = {}
-        for expense in expenses:
-            expense_type = expense.get_expense_type_display()
-            if expense_type not in expense_breakdown:
-                expense_breakdown[expense_type] = 0
-            expense_breakdown[expense_type] += float(expense.amount)
+        gross_margin_percentage = (gross_profit / sales_revenue * 100) if sales_revenue > 0 else 0
+        net_profit_percentage = (net_profit / sales_revenue * 100) if sales_revenue > 0 else 0
+
+        # Expense breakdown by category
+        expense_totals = {category: float(total) for category, total in expense_breakdown(expenses).items()}
 
         return {
             'total_business_expenses': float(total_business_expenses),
@@ -626,10 +616,23 @@ class StockValuationSerializer(serializers.Serializer):
             'gross_margin_percentage': round(gross_margin_percentage, 2),
             'net_profit': net_profit,
             'net_profit_percentage': round(net_profit_percentage, 2),
-            'expense_breakdown': expense_breakdown,
-            'expense_to_sales_ratio': round((total_expenses / sales_revenue_float * 100), 2) if sales_revenue_float > 0 else 0
+            'expense_breakdown': expense_totals,
+            'expense_to_sales_ratio': round((total_expenses / sales_revenue * 100), 2) if sales_revenue > 0 else 0
         }
 
+def format_duration(duration):
+    """Timedelta as '1h 2m 3s', '2m 3s' or '3s'"""
+    total_seconds = int(duration.total_seconds())
+    hours, remainder = divmod(total_seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+
+    if hours > 0:
+        return f"{hours}h {minutes}m {seconds}s"
+    elif minutes > 0:
+        return f"{minutes}m {seconds}s"
+    else:
+        return f"{seconds}s"
+
 class StockTakeItemSerializer(serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.name', read_only=True)
     product_line_code = serializers.CharField(source='product.line_code', read_only=True)
@@ -682,17 +685,7 @@ class StockTakeSerializer(serializers.ModelSerializer):
                            'created_at', 'updated_at', 'is_balanced', 'has_discrepancies', 'discrepancy_summary']
 
     def get_duration_display(self, obj):
-        duration = obj.duration
-        total_seconds = int(duration.total_seconds())
-        hours, remainder = divmod(total_seconds, 3600)
-        minutes, seconds = divmod(remainder, 60)
-
-        if hours > 0:
-            return f"{hours}h {minutes}m {seconds}s"
-        elif minutes > 0:
-            return f"{minutes}m {seconds}s"
-        else:
-            return f"{seconds}s"
+        return format_duration(obj.duration)
 
     def get_summary(self, obj):
         if obj.status != 'completed':
@@ -0,0 +1,79 @@
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+from django.views.decorators.csrf import csrf_exempt
+from django.utils.decorators import method_decorator
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from .models import ShopConfiguration, Product
+from .stock_ledger import end_of_day, stock_as_of
+
+
+def _parse_as_of(value):
+    """Accept an ISO datetime, or a date meaning the close of that business day; None if invalid"""
+    try:
+        day = parse_date(value)
+        moment = None if day is not None else parse_datetime(value)
+    except ValueError:
+        # Well formed but out of range, such as 2026-13-45
+        return None
+    if day is not None:
+        return end_of_day(day)
+    if moment is not None:
+        return moment if timezone.is_aware(moment) else timezone.make_aware(moment)
+    return None
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class StockAsOfView(APIView):
+    """Stock of one product, or the whole catalog, as of a point in time"""
+    def get(self, request):
+        shop = ShopConfiguration.objects.get()
+
+        at_param = request.query_params.get('at')
+        if not at_param:
+            return Response({"error": "Parameter 'at' (ISO datetime or date) is required"}, status=status.HTTP_400_BAD_REQUEST)
+        at = _parse_as_of(at_param)
+        if at is None:
+            return Response({"error": f"Invalid 'at' value: {at_param}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        product_ids = None
+        product_id = request.query_params.get('product_id')
+        if product_id:
+            try:
+                product_id = int(product_id)
+            except ValueError:
+                return Response({"error": f"Invalid 'product_id' value: {product_id}"}, status=status.HTTP_400_BAD_REQUEST)
+            if not Product.objects.filter(id=product_id, shop=shop).exists():
+                return Response({"error": "Product not found"}, status=status.HTTP_404_NOT_FOUND)
+            product_ids = [product_id]
+
+        stock = stock_as_of(shop, at, product_ids)
+        names = dict(Product.objects.filter(id__in=list(stock)).values_list('id', 'name'))
+
+        products_data = []
+        total_quantity = 0
+        total_value = 0
+        for product_id, row in sorted(stock.items()):
+            # Stock value never negative - if oversold, value is $0
+            stock_value = max(0, row['quantity']) * row['cost_price']
+            total_quantity += max(0, row['quantity'])
+            total_value += stock_value
+            products_data.append({
+                'product_id': product_id,
+                'name': names.get(product_id, ''),
+                'stock_quantity': float(row['quantity']),
+                'cost_price': float(row['cost_price']),
+                'stock_value': float(stock_value),
+                'source': row['source']
+            })
+
+        return Response({
+            'as_of': at.isoformat(),
+            'products': products_data,
+            'summary': {
+                'total_products': len(products_data),
+                'total_quantity': float(total_quantity),
+                'total_value': float(total_value)
+            }
+        }, status=status.HTTP_200_OK)
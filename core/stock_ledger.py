@@ -0,0 +1,293 @@
+"""
+Stock ledger helpers: point-in-time reconstruction and bulk stock posting.
+
+The ledger is the union of InventoryLog and StockMovement rows. Staff lunch expenses
+write both an InventoryLog (reason EXPENSE) and a StockMovement (STAFF_LUNCH) for the
+same deduction, so EXPENSE inventory logs are left out to avoid counting it twice.
+"""
+from datetime import timedelta
+
+from django.db.models import Case, DecimalField, F, Max, Sum, Value, When
+from django.utils import timezone
+
+from .archive import archived_before, hot_ids_before
+from .cost_layers import apply_stock_costs
+from .models import ArchivedInventoryLog, ArchivedStockMovement, InventoryLog, Product, StockMovement, StockSnapshot
+from .quantities import ZERO, qty
+from .sync import record_changes
+from .time_windows import day_start, local_today, window_filter
+
+
+# InventoryLog reason codes that mirror a StockMovement row and must not be counted twice
+MIRRORED_LOG_REASONS = ['EXPENSE']
+
+
+def end_of_day(day):
+    """Aware datetime at which the business day `day` closes"""
+    return day_start(day + timedelta(days=1))
+
+
+def _add_deltas(deltas, logs, movements):
+    log_rows = logs.exclude(reason_code__in=MIRRORED_LOG_REASONS).values('product_id').annotate(
+        total=Sum('quantity_change')
+    ).order_by()
+    movement_rows = movements.values('product_id').annotate(total=Sum('quantity_change')).order_by()
+    for row in list(log_rows) + list(movement_rows):
+        deltas[row['product_id']] = deltas.get(row['product_id'], ZERO) + (row['total'] or ZERO)
+
+
+def ledger_deltas(shop, start=None, end=None, product_ids=None):
+    """
+    Net quantity change per product for ledger rows with start <= created_at < end.
+    Returns {product_id: Decimal}. Two grouped aggregates, regardless of history size.
+    When the window starts before the archive cutoff, two more run over the archive, each
+    leaving out rows still hot (see archive.hot_ids_before) so none is counted twice.
+    """
+    filters = window_filter('created_at', start, end)
+    if product_ids is not None:
+        filters['product_id__in'] = product_ids
+
+    deltas = {}
+    _add_deltas(
+        deltas,
+        InventoryLog.objects.filter(shop=shop, **filters),
+        StockMovement.objects.filter(shop=shop, **filters),
+    )
+    cutoff = archived_before(shop)
+    if cutoff is not None and (start is None or start < cutoff):
+        _add_deltas(
+            deltas,
+            ArchivedInventoryLog.objects.filter(shop_id=shop.id, **filters).exclude(
+                id__in=hot_ids_before(InventoryLog, shop, cutoff, **filters)
+            ),
+            ArchivedStockMovement.objects.filter(shop_id=shop.id, **filters).exclude(
+                id__in=hot_ids_before(StockMovement, shop, cutoff, **filters)
+            ),
+        )
+    return deltas
+
+
+def stock_as_of(shop, at, product_ids=None):
+    """
+    Reconstruct stock for a shop's products as of `at`.
+
+    Products covered by the latest snapshot taken at or before `at` are rolled forward
+    from it, so only the ledger rows since that snapshot are read. Products without such
+    a snapshot are rolled backward from their live stock.
+    Returns {product_id: {'quantity', 'cost_price', 'source'}}.
+    """
+    products = Product.objects.filter(shop=shop)
+    if product_ids is not None:
+        products = products.filter(id__in=product_ids)
+    live = {
+        row['id']: row for row in products.values('id', 'stock_quantity', 'cost_price')
+    }
+
+    result = {}
+    latest_date = StockSnapshot.objects.filter(shop=shop, taken_at__lte=at).aggregate(
+        latest=Max('snapshot_date')
+    )['latest']
+
+    if latest_date is not None:
+        snapshots = StockSnapshot.objects.filter(
+            shop=shop, snapshot_date=latest_date, taken_at__lte=at, product_id__in=list(live)
+        ).values('product_id', 'quantity', 'cost_price', 'taken_at')
+
+        # A nightly run writes all rows of a day with the same taken_at, so this is
+        # normally a single ledger window
+        by_taken_at = {}
+        for snapshot in snapshots:
+            by_taken_at.setdefault(snapshot['taken_at'], []).append(snapshot)
+
+        for taken_at, group in by_taken_at.items():
+            deltas = ledger_deltas(shop, taken_at, at, [s['product_id'] for s in group])
+            for snapshot in group:
+                result[snapshot['product_id']] = {
+                    'quantity': snapshot['quantity'] + deltas.get(snapshot['product_id'], ZERO),
+                    'cost_price': snapshot['cost_price'],
+                    'source': 'snapshot',
+                }
+
+    remaining = [product_id for product_id in live if product_id not in result]
+    if remaining:
+        deltas = ledger_deltas(shop, at, None, remaining)
+        for product_id in remaining:
+            row = live[product_id]
+            result[product_id] = {
+                'quantity': row['stock_quantity'] - deltas.get(product_id, ZERO),
+                'cost_price': row['cost_price'],
+                'source': 'live',
+            }
+    return result
+
+
+def take_snapshots(shop, snapshot_date=None):
+    """
+    Write one StockSnapshot per product for `snapshot_date` (default: today) in bulk.
+    Past days are reconstructed from the ledger; today's snapshot reads live stock.
+    Re-running for the same day replaces that day's rows.
+    """
+    today = local_today()
+    snapshot_date = snapshot_date or today
+    now = timezone.now()
+
+    if snapshot_date >= today:
+        taken_at = now
+        rows = {
+            row['id']: {'quantity': row['stock_quantity'], 'cost_price': row['cost_price']}
+            for row in Product.objects.filter(shop=shop).values('id', 'stock_quantity', 'cost_price')
+        }
+    else:
+        taken_at = end_of_day(snapshot_date)
+        rows = stock_as_of(shop, taken_at)
+
+    snapshots = [
+        StockSnapshot(
+            shop=shop,
+            product_id=product_id,
+            snapshot_date=snapshot_date,
+            taken_at=taken_at,
+            quantity=row['quantity'],
+            cost_price=row['cost_price'],
+        )
+        for product_id, row in rows.items()
+    ]
+    StockSnapshot.objects.bulk_create(
+        snapshots,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['product', 'snapshot_date'],
+        update_fields=['taken_at', 'quantity', 'cost_price'],
+    )
+    return len(snapshots)
+
+
+
+def _stage_changes(shop, changes, products):
+    """
+    Lock missing products, chain previous/new stock through `changes` in order and run
+    them through the cost layers. Returns (products, entries, net, running).
+    """
+    products = dict(products or {})
+    missing = {change['product_id'] for change in changes} - set(products)
+    if missing:
+        products.update(
+            (product.id, product)
+            for product in Product.objects.select_for_update().filter(shop=shop, id__in=missing)
+        )
+
+    running = {product_id: product.stock_quantity for product_id, product in products.items()}
+    net = {}
+    entries = []
+    for change in changes:
+        product_id = change['product_id']
+        quantity_change = qty(change['quantity_change'])
+        previous_stock = running[product_id]
+        running[product_id] = previous_stock + quantity_change
+        net[product_id] = net.get(product_id, ZERO) + quantity_change
+        entries.append({**change, 'quantity_change': quantity_change, 'previous_stock': previous_stock, 'new_stock': running[product_id]})
+
+    # Outgoing stock is costed from the cost layers; incoming stock opens layers
+    apply_stock_costs(shop, entries, products)
+    return products, entries, net, running
+
+
+def _move_stock(shop, products, net, running):
+    """Apply the net change per product with one CASE UPDATE and log it for delta sync"""
+    stock_field = Product._meta.get_field('stock_quantity')
+    Product.objects.filter(shop=shop, id__in=list(net)).update(
+        stock_quantity=F('stock_quantity') + Case(
+            *[When(id=product_id, then=Value(delta)) for product_id, delta in net.items()],
+            default=Value(ZERO),
+            output_field=DecimalField(max_digits=stock_field.max_digits, decimal_places=stock_field.decimal_places),
+        ),
+        updated_at=timezone.now(),
+    )
+    record_changes(shop, 'product', list(net))
+
+    for product_id in net:
+        products[product_id].stock_quantity = running[product_id]
+    return {product_id: running[product_id] for product_id in net}
+
+
+def post_stock_changes(shop, changes, movement_type, performed_by=None, products=None):
+    """
+    Apply many stock changes with one set-based UPDATE and one bulk ledger insert.
+
+    `changes` is a list of dicts with product_id, quantity_change and optionally
+    cost_price, reference_number, supplier_name and notes. Several changes may target the
+    same product; ledger rows chain previous/new stock in list order.
+    Incoming stock opens cost layers at cost_price; outgoing stock is costed at the value
+    of the layers it consumes, whatever cost_price was passed (see cost_layers).
+    `products` maps product_id to instances already locked by the caller; missing ones
+    are locked here. Must run inside transaction.atomic().
+    Returns {product_id: new stock quantity}.
+    """
+    if not changes:
+        return {}
+
+    products, entries, net, running = _stage_changes(shop, changes, products)
+
+    movements = []
+    for change in entries:
+        product = products[change['product_id']]
+        movement = StockMovement(
+            shop=shop,
+            product=product,
+            movement_type=movement_type,
+            previous_stock=change['previous_stock'],
+            quantity_change=change['quantity_change'],
+            new_stock=change['new_stock'],
+            cost_price=change.get('cost_price', product.cost_price),
+            reference_number=change.get('reference_number', ''),
+            supplier_name=change.get('supplier_name', ''),
+            notes=change.get('notes', ''),
+            performed_by=performed_by,
+        )
+        movement.set_derived_fields(product.min_stock_level)
+        movements.append(movement)
+
+    result = _move_stock(shop, products, net, running)
+    StockMovement.objects.bulk_create(movements, batch_size=500)
+    return result
+
+
+def post_inventory_log_changes(shop, changes, reason_code, products=None):
+    """
+    post_stock_changes() for paths whose ledger is InventoryLog, like checkout (reason SALE).
+
+    Changes may also carry performed_by, so one call can post lines of many cashiers, and
+    created_at to back-date their rows, as offline sales do with the till's time. Snapshots
+    taken after a back-dated row do not include it, so they are dropped and stock_as_of()
+    rolls forward from an earlier snapshot or back from live stock instead.
+    Returns (entries, new stock per product); entries are the changes with
+    previous_stock, new_stock and, for outgoing stock, the consumed cost_price filled in.
+    """
+    if not changes:
+        return [], {}
+
+    products, entries, net, running = _stage_changes(shop, changes, products)
+    now = timezone.now()
+    backdated = [change['created_at'] for change in entries if change.get('created_at')]
+    if backdated:
+        StockSnapshot.objects.filter(shop=shop, product_id__in=list(net), taken_at__gt=min(backdated)).delete()
+
+    logs = [
+        InventoryLog(
+            shop=shop,
+            product=products[change['product_id']],
+            reason_code=reason_code,
+            quantity_change=change['quantity_change'],
+            previous_quantity=change['previous_stock'],
+            new_quantity=change['new_stock'],
+            reference_number=change.get('reference_number', ''),
+            notes=change.get('notes', ''),
+            performed_by=change.get('performed_by'),
+            cost_price=change.get('cost_price', products[change['product_id']].cost_price),
+            created_at=change.get('created_at') or now,
+        )
+        for change in entries
+    ]
+    result = _move_stock(shop, products, net, running)
+    InventoryLog.objects.bulk_create(logs, batch_size=500)
+    return entries, result
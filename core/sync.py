@@ -0,0 +1,142 @@
+"""
+Delta sync for offline POS terminals.
+
+Writes to products, discounts and cashiers append to the SyncChange log: model save() and
+delete() do it one row at a time, and set-based stock and cost updates call
+record_changes() with all their ids at once. A terminal keeps the position of the last
+change it applied as its cursor. changes_since() answers with one range read over the
+(shop, position) index plus one query per resource, and collapses repeated changes of the
+same object into its latest state. Deleted objects come back as tombstones (ids only).
+
+Positions, not ids, are the cursor. PostgreSQL hands out ids when rows are inserted, so a
+transaction that commits after a larger id was already read would be skipped for good.
+Instead, changes are logged without a position and sequence_changes() numbers the
+committed ones on the next read, under a lock on the shop's SyncSequence row. A change
+still uncommitted then is numbered after the cursor the terminal gets, and reaches it
+next time. Numbering on read keeps writers from queueing on one counter row, which
+catalog writes that lock several products would also risk deadlocking on.
+"""
+from django.db import OperationalError, transaction
+from django.db.models import F, Max, Min, Q
+
+from .models import Cashier, Discount, Product, SyncChange, SyncSequence
+
+# Compact payloads: only what a till needs to sell offline
+RESOURCES = {
+    'product': ('products', Product, (
+        'id', 'name', 'description', 'price', 'cost_price', 'currency', 'price_type', 'category',
+        'barcode', 'line_code', 'additional_barcodes', 'stock_quantity', 'min_stock_level',
+        'is_active', 'updated_at',
+    )),
+    'discount': ('discounts', Discount, (
+        'id', 'name', 'code', 'discount_type', 'value', 'min_purchase', 'max_discount',
+        'is_active', 'valid_from', 'valid_until', 'usage_limit', 'usage_count',
+    )),
+    'cashier': ('cashiers', Cashier, (
+        'id', 'name', 'email', 'phone', 'status', 'role', 'preferred_shift',
+    )),
+}
+PAGE_SIZE = 1000
+
+
+def record_changes(shop, resource, object_ids, action='upsert'):
+    """Log changes to many objects with one bulk insert"""
+    SyncChange.objects.bulk_create(
+        [SyncChange(shop=shop, resource=resource, object_id=object_id, action=action) for object_id in object_ids],
+        batch_size=500,
+    )
+
+
+def sequence_changes(shop):
+    """Number committed changes that have no position yet; returns the latest position"""
+    state = SyncChange.objects.filter(shop=shop).aggregate(
+        cursor=Max('position'), unnumbered=Min('id', filter=Q(position__isnull=True)),
+    )
+    if state['unnumbered'] is None:
+        return state['cursor'] or 0
+
+    try:
+        with transaction.atomic():
+            sequence, _ = SyncSequence.objects.select_for_update().get_or_create(shop=shop)
+            pending = SyncChange.objects.filter(shop=shop, position__isnull=True)
+            bounds = pending.aggregate(first=Min('id'), last=Max('id'))
+            if bounds['first'] is not None:
+                # Keep id order within the batch and start past every position handed out
+                offset = sequence.last_position + 1 - bounds['first']
+                pending.filter(id__gte=bounds['first'], id__lte=bounds['last']).update(position=F('id') + offset)
+                sequence.last_position = bounds['last'] + offset
+                sequence.save(update_fields=['last_position'])
+            return sequence.last_position
+    except OperationalError:
+        # SQLite refuses the write while another request numbers the same rows; they are
+        # numbered either way, and this reader serves what was numbered before
+        return state['cursor'] or 0
+
+
+def _payload(shop, upserts=None):
+    """Rows per resource: those ids in `upserts`, or every row when it is None"""
+    payload = {}
+    for resource, (key, model, fields) in RESOURCES.items():
+        queryset = model.objects.filter(shop=shop)
+        if upserts is not None:
+            if not upserts[resource]:
+                payload[key] = []
+                continue
+            queryset = queryset.filter(id__in=upserts[resource])
+        payload[key] = list(queryset.order_by('id').values(*fields))
+    return payload
+
+
+def snapshot(shop, cursor=None):
+    """Everything a terminal needs to start from scratch, with the cursor to continue from"""
+    # Read the cursor first: a change landing meanwhile is sent again next time, never lost
+    if cursor is None:
+        cursor = sequence_changes(shop)
+    return {
+        'cursor': cursor,
+        'has_more': False,
+        'reset': True,
+        **_payload(shop),
+        'deleted': {key: [] for key, _, _ in RESOURCES.values()},
+    }
+
+
+def changes_since(shop, cursor, limit=PAGE_SIZE):
+    """
+    Objects changed after `cursor`, at most `limit` log rows at a time.
+    Without a cursor, or with one the server has never issued, returns a full snapshot.
+    """
+    latest_cursor = sequence_changes(shop)
+    if cursor is None or cursor > latest_cursor:
+        return snapshot(shop, latest_cursor)
+
+    rows = list(
+        SyncChange.objects.filter(shop=shop, position__gt=cursor)
+        .order_by('position')
+        .values_list('position', 'resource', 'object_id', 'action')[:limit]
+    )
+    latest = {}
+    for _, resource, object_id, action in rows:
+        latest[(resource, object_id)] = action
+
+    upserts = {resource: [] for resource in RESOURCES}
+    deleted = {resource: set() for resource in RESOURCES}
+    for (resource, object_id), action in latest.items():
+        if action == 'delete':
+            deleted[resource].add(object_id)
+        else:
+            upserts[resource].append(object_id)
+
+    payload = _payload(shop, upserts)
+    for resource, (key, _, _) in RESOURCES.items():
+        # Updated and then removed by a bulk delete that left no tombstone
+        found = {row['id'] for row in payload[key]}
+        deleted[resource].update(object_id for object_id in upserts[resource] if object_id not in found)
+
+    return {
+        'cursor': rows[-1][0] if rows else cursor,
+        'has_more': len(rows) == limit,
+        'reset': False,
+        **payload,
+        'deleted': {key: sorted(deleted[resource]) for resource, (key, _, _) in RESOURCES.items()},
+    }
@@ -0,0 +1,31 @@
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.gzip import gzip_page
+from django.utils.decorators import method_decorator
+from .models import ShopConfiguration
+from .sync import PAGE_SIZE, changes_since
+
+
+@method_decorator(gzip_page, name='dispatch')
+@method_decorator(csrf_exempt, name='dispatch')
+class SyncView(APIView):
+    """
+    Delta sync for POS terminals. Call without a cursor for a full snapshot, then pass
+    back the returned cursor to receive only products, discounts and cashiers changed
+    since. Keep calling while has_more is true. Responses are gzip-compressed for
+    clients that send Accept-Encoding: gzip.
+    """
+    def get(self, request):
+        shop = ShopConfiguration.objects.get()
+
+        cursor = request.query_params.get('cursor')
+        limit = request.query_params.get('limit', PAGE_SIZE)
+        try:
+            cursor = int(cursor) if cursor not in (None, '') else None
+            limit = max(1, min(int(limit), PAGE_SIZE))
+        except ValueError:
+            return Response({"error": "cursor and limit must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(changes_since(shop, cursor, limit), status=status.HTTP_200_OK)
@@ -0,0 +1,43 @@
+"""
+Business-day time windows.
+
+Filtering on `created_at__date` wraps the indexed column in a date function, so the
+database cannot range-scan the index. These helpers turn business days in the shop's
+timezone into half-open [start, end) datetime ranges that compare the raw column.
+"""
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+from django.utils import timezone
+
+SHOP_TIMEZONE = ZoneInfo('Africa/Harare')
+
+
+def local_today():
+    """Current business day in the shop's timezone"""
+    return timezone.now().astimezone(SHOP_TIMEZONE).date()
+
+
+def day_start(day):
+    """Aware datetime at which the business day `day` opens"""
+    return datetime.combine(day, time.min, tzinfo=SHOP_TIMEZONE)
+
+
+def day_window(day):
+    """[start, end) covering the single business day `day`"""
+    return day_start(day), day_start(day + timedelta(days=1))
+
+
+def days_window(first_day, last_day):
+    """[start, end) covering business days first_day..last_day inclusive"""
+    return day_start(first_day), day_start(last_day + timedelta(days=1))
+
+
+def window_filter(field, start=None, end=None):
+    """Queryset filter kwargs for start <= field < end; either bound may be omitted"""
+    filters = {}
+    if start is not None:
+        filters[f'{field}__gte'] = start
+    if end is not None:
+        filters[f'{field}__lt'] = end
+    return filters
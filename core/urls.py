@@ -5,6 +5,14 @@ from .retrieve_credentials_view import RetrieveCredentialsView
 from .staff_views import PendingStaffListView, ApprovedStaffListView, ApproveStaffView, RejectStaffView, DeactivateCashierView, DeleteCashierView, InactiveStaffListView, ReactivateCashierView, CashierDetailsView, EditCashierView
 from .cashier_registration_view import CashierSelfRegistrationView
 from .waste_batch_views import WasteBatchListView, WasteBatchDetailView
+from .stock_history_views import StockAsOfView
+from .waste_analytics_views import WasteAnalyticsView
+from .report_views import ProfitAndLossView
+from .cost_layer_views import CostLayerValuationView
+from .receiving_views import GoodsReceivedNoteListView, GoodsReceivedNoteDetailView
+from .sync_views import SyncView
+from .offline_sale_views import OfflineSaleBatchView
+from .export_views import ExportView
 
 # Setup router for ViewSets
 router = DefaultRouter()
@@ -18,10 +26,15 @@ urlpatterns = [
     path('wastes/', views.WasteListView.as_view(), name='waste-list'),
     path('wastes/summary/', views.WasteSummaryView.as_view(), name='waste-summary'),
     path('wastes/product-search/', views.WasteProductSearchView.as_view(), name='waste-search'),
+    path('wastes/analytics/', WasteAnalyticsView.as_view(), name='waste-analytics'),
+    
+    # Reporting endpoints
+    path('reports/profit-and-loss/', ProfitAndLossView.as_view(), name='profit-and-loss'),
     
     # Waste batch management endpoints
     path('waste-batches/', WasteBatchListView.as_view(), name='waste-batch-list'),
     path('waste-batches/<int:batch_id>/', WasteBatchDetailView.as_view(), name='waste-batch-detail'),
+    path('waste-batches/<int:batch_id>/items/bulk/', views.BulkAddWasteBatchItemsView.as_view(), name='waste-batch-items-bulk'),
     
     path('status/', views.ShopStatusView.as_view(), name='shop-status'),
     path('register/', views.ShopRegisterView.as_view(), name='shop-register'),
@@ -55,6 +68,7 @@ urlpatterns = [
     path('audit-trail/', views.InventoryAuditTrailView.as_view(), name='inventory-audit-trail'),
     path('products/<int:product_id>/audit-history/', views.ProductAuditHistoryView.as_view(), name='product-audit-history'),
     path('sales/', views.SaleListView.as_view(), name='sale-list'),
+    path('sales/offline/', OfflineSaleBatchView.as_view(), name='offline-sale-batch'),
     path('sales-history/', views.SalesHistoryView.as_view(), name='sales-history'),
     path('sales/<int:sale_id>/', views.SaleDetailView.as_view(), name='sale-detail'),
     path('sale-items/<int:item_id>/', views.SaleItemDetailView.as_view(), name='sale-item-detail'),
@@ -63,6 +77,12 @@ urlpatterns = [
     path('shifts/', views.ShiftListView.as_view(), name='shift-list'),
     path('shifts/<int:shift_id>/end/', views.ShiftDetailView.as_view(), name='shift-detail'),
     path('stock-valuation/', views.StockValuationView.as_view(), name='stock-valuation'),
+    path('stock-as-of/', StockAsOfView.as_view(), name='stock-as-of'),
+    path('inventory/cost-layers/', CostLayerValuationView.as_view(), name='cost-layer-valuation'),
+    path('goods-received/', GoodsReceivedNoteListView.as_view(), name='goods-received-list'),
+    path('goods-received/<int:grn_id>/', GoodsReceivedNoteDetailView.as_view(), name='goods-received-detail'),
+    path('sync/', SyncView.as_view(), name='sync'),
+    path('exports/<str:dataset>/', ExportView.as_view(), name='export'),
     path('expenses/', views.ExpenseListView.as_view(), name='expense-list'),
     path('refunds/', views.RefundListView.as_view(), name='refund-list'),
     path('staff-lunches/', views.StaffLunchListView.as_view(), name='staff-lunch-list'),
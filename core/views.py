@@ -6,19 +6,34 @@ from rest_framework import viewsets
 from rest_framework.decorators import action
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from django.utils import timezone
 from django.db import models, IntegrityError
 from django.db.models import Sum, F
 from datetime import timedelta
 from decimal import Decimal
-from .models import ShopConfiguration, Cashier, Product, Sale, SaleItem, Customer, Discount, Shift, Expense, Refund, StaffLunch, StockTake, StockTakeItem, InventoryLog, StockTransfer, Waste
-from .serializers import ShopConfigurationSerializer, ShopLoginSerializer, ResetPasswordSerializer, CashierSerializer, CashierLoginSerializer, ProductSerializer, SaleSerializer, CreateSaleSerializer, ExpenseSerializer, RefundSerializer, StockValuationSerializer, StaffLunchSerializer, BulkProductSerializer, CustomerSerializer, DiscountSerializer, StockTakeSerializer, StockTakeItemSerializer, CreateStockTakeSerializer, AddStockTakeItemSerializer, BulkAddStockTakeItemsSerializer, CashierResetPasswordSerializer, InventoryLogSerializer, StockTransferSerializer
+from .models import ShopConfiguration, Cashier, Product, Sale, SaleItem, Customer, Discount, Shift, Expense, Refund, StaffLunch, StockTake, StockTakeItem, InventoryLog, StockTransfer, Waste, WasteBatch, ArchivedSale, ArchivedInventoryLog, ProductBarcode, CostLayer
+from .serializers import ShopConfigurationSerializer, ShopLoginSerializer, ResetPasswordSerializer, CashierSerializer, CashierLoginSerializer, ProductSerializer, SaleSerializer, CreateSaleSerializer, ExpenseSerializer, RefundSerializer, StockValuationSerializer, StaffLunchSerializer, BulkProductSerializer, CustomerSerializer, DiscountSerializer, StockTakeSerializer, StockTakeItemSerializer, CreateStockTakeSerializer, AddStockTakeItemSerializer, BulkAddStockTakeItemsSerializer, CashierResetPasswordSerializer, StockTransferSerializer, ShiftSerializer
 from django.db import transaction
 from django.shortcuts import get_object_or_404
+from django.utils.dateparse import parse_date
+from .time_windows import local_today, day_start, day_window, window_filter
+from .product_lookup import IdentifierResolver
+from .quantities import fits_field, money, qty
+from .refunds import RefundError, idempotency_key_from, process_refund, stored_refund
+from .expenses import record_expense
+from .reports import invalidate_pnl
+from .cost_layers import apply_stock_costs
+from .stock_ledger import post_stock_changes
+from .etags import conditional_catalog, shop_status_etag
+from .product_fragments import serialized_products
+from .read_serializers import inventory_log_rows, sale_rows, stock_take_item_rows, stock_take_rows
+from .archive import reads_archive
 
 # Import waste views
 from .waste_views import WasteListView, WasteSummaryView, WasteProductSearchView
 
+@method_decorator(condition(etag_func=shop_status_etag), name='get')
 class ShopStatusView(APIView):
     def get(self, request):
         try:
@@ -61,6 +76,7 @@ class ShopRegisterView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 @method_decorator(csrf_exempt, name='dispatch')
+@method_decorator(conditional_catalog('cashier'), name='get')
 class CashierListView(APIView):
     def get(self, request):
         shop = ShopConfiguration.objects.get()
@@ -95,25 +111,20 @@ class CashierListView(APIView):
 @method_decorator(csrf_exempt, name='dispatch')
 class CashierLoginView(APIView):
     def post(self, request):
-        print(f"🔍 DEBUG: Cashier login attempt with data: {request.data}")
         serializer = CashierLoginSerializer(data=request.data)
         if serializer.is_valid():
             name = serializer.validated_data['name']
             password = serializer.validated_data['password']
-            print(f"🔍 DEBUG: Validated data - name: {name}, password_length: {len(password)}")
             
             try:
                 shop = ShopConfiguration.objects.get()
-                print(f"🔍 DEBUG: Shop found: {shop.name}")
                 
                 # Find active cashier by name and shop
                 cashiers = Cashier.objects.filter(shop=shop, name=name, status='active')
-                print(f"🔍 DEBUG: Found {cashiers.count()} active cashiers with name '{name}'")
                 
                 if not cashiers.exists():
                     # Check if cashier exists but is not active
                     existing_cashier = Cashier.objects.filter(shop=shop, name=name).first()
-                    print(f"🔍 DEBUG: Found cashier with name '{name}': {existing_cashier is not None}, status: {existing_cashier.status if existing_cashier else 'N/A'}")
                     
                     if existing_cashier:
                         if existing_cashier.status == 'pending':
@@ -124,12 +135,9 @@ class CashierLoginView(APIView):
 
                 # Check password for each active cashier with this name
                 for cashier in cashiers:
-                    print(f"🔍 DEBUG: Checking password for cashier: {cashier.name} (id: {cashier.id})")
                     password_check = cashier.check_password(password)
-                    print(f"🔍 DEBUG: Password check result: {password_check}")
                     
                     if password_check:
-                        print(f"🔍 DEBUG: Login successful for {cashier.name}")
                         return Response({
                             "success": True,
                             "cashier_info": {
@@ -151,13 +159,9 @@ class CashierLoginView(APIView):
                             }
                         }, status=status.HTTP_200_OK)
 
-                print("🔍 DEBUG: Password check failed for all cashiers")
                 return Response({"error": "Invalid password"}, status=status.HTTP_401_UNAUTHORIZED)
             except Exception as e:
-                print(f"🔍 DEBUG: Exception during login: {str(e)}")
                 return Response({"error": "Login failed"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        else:
-            print(f"🔍 DEBUG: Serializer validation failed: {serializer.errors}")
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 @method_decorator(csrf_exempt, name='dispatch')
@@ -267,12 +271,12 @@ class CashierLogoutView(APIView):
         }, status=status.HTTP_200_OK)
 
 @method_decorator(csrf_exempt, name='dispatch')
+@method_decorator(conditional_catalog('product'), name='get')
 class ProductListView(APIView):
     def get(self, request):
         shop = ShopConfiguration.objects.get()
         products = Product.objects.filter(shop=shop)
-        serializer = ProductSerializer(products, many=True)
-        return Response(serializer.data)
+        return Response(serialized_products(products, ProductSerializer))
 
     def post(self, request):
         shop = ShopConfiguration.objects.get()
@@ -282,6 +286,45 @@ class ProductListView(APIView):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+# Product fields PATCH does not write directly: they must stay in step with the ledger and cost layers
+LEDGER_FIELDS = ('stock_quantity', 'cost_price')
+
+
+def post_product_edit(shop, product_id, data):
+    """
+    Apply a product form's stock_quantity and cost_price edits. A new cost price is taken
+    as is only while the product holds no cost layers; otherwise the layers own the carrying
+    cost and it prices incoming stock. A stock change is posted as an ADJUSTMENT, which
+    opens or consumes cost layers like any other movement. Invalid values are ignored.
+    """
+    edits = {}
+    for field in LEDGER_FIELDS:
+        if field not in data:
+            continue
+        try:
+            value = Decimal(str(data[field]))
+        except (ArithmeticError, ValueError):
+            continue
+        if fits_field(value, Product._meta.get_field(field)):
+            edits[field] = value
+
+    product = Product.objects.select_for_update().get(id=product_id, shop=shop)
+    cost_price = edits.get('cost_price')
+    if cost_price is not None and cost_price >= 0 and not CostLayer.objects.filter(product=product, remaining_quantity__gt=0).exists():
+        product.cost_price = money(cost_price)
+        product.save(update_fields=['cost_price', 'updated_at'])
+
+    stock_quantity = edits.get('stock_quantity')
+    if stock_quantity is not None and qty(stock_quantity) != product.stock_quantity:
+        post_stock_changes(shop, [{
+            'product_id': product.id,
+            'quantity_change': qty(stock_quantity) - product.stock_quantity,
+            'cost_price': cost_price,
+            'reference_number': f'Product #{product.id} edit',
+            'notes': 'Stock quantity edited on the product',
+        }], 'ADJUSTMENT', products={product.id: product})
+
+
 @method_decorator(csrf_exempt, name='dispatch')
 class ProductDetailView(APIView):
     permission_classes = [AllowAny]
@@ -300,8 +343,10 @@ class ProductDetailView(APIView):
 
         # Accept all data from frontend without validation
         try:
-            # Update product fields if they exist in request data
+            # Update product fields if they exist in request data; stock and cost go through the ledger below
             for field, value in request.data.items():
+                if field in LEDGER_FIELDS:
+                    continue
                 if hasattr(product, field):
                     try:
                         # Special handling for additional_barcodes field
@@ -322,7 +367,13 @@ class ProductDetailView(APIView):
                         print(f"Error setting field {field}: {e}")
                         # If setting field fails, continue with other fields
                         pass
-            product.save()
+            with transaction.atomic():
+                # Leave stock and cost as stored, so a sale posted meanwhile is not overwritten
+                product.save(update_fields=[
+                    field.name for field in Product._meta.concrete_fields
+                    if not field.primary_key and field.name not in LEDGER_FIELDS
+                ])
+                post_product_edit(shop, product.id, request.data)
             
             # Return success response with the updated data
             return Response({
@@ -366,6 +417,7 @@ class ProductDetailView(APIView):
             return Response({"error": "Product not found"}, status=status.HTTP_404_NOT_FOUND)
 
 @method_decorator(csrf_exempt, name='dispatch')
+@method_decorator(conditional_catalog('product'), name='get')
 class BulkProductView(APIView):
     def get(self, request):
         shop = ShopConfiguration.objects.get()
@@ -374,38 +426,34 @@ class BulkProductView(APIView):
             return Response({"error": "Category parameter is required"}, status=status.HTTP_400_BAD_REQUEST)
 
         products = Product.objects.filter(shop=shop, category__iexact=category)
-        serializer = BulkProductSerializer(products, many=True)
-        return Response(serializer.data)
+        return Response(serialized_products(products, BulkProductSerializer))
 
 @method_decorator(csrf_exempt, name='dispatch')
 class SaleListView(APIView):
     def get(self, request):
         shop = ShopConfiguration.objects.get()
         sales = Sale.objects.filter(shop=shop).order_by('-created_at')
-        serializer = SaleSerializer(sales, many=True)
-        return Response(serializer.data)
+        archived_sales = None
+        if reads_archive(shop):
+            archived_sales = ArchivedSale.objects.filter(shop_id=shop.id).order_by('-created_at')
+        return Response(sale_rows(sales, archived_sales))
 
     def post(self, request):
         # First get the cashier_id from request data before serializer validation
         cashier_id = request.data.get('cashier_id')
-        print(f"DEBUG: Sale request data: {request.data}")
-        print(f"DEBUG: Cashier ID from request: {cashier_id}")
         
         if not cashier_id:
             return Response({"error": "Cashier ID required"}, status=status.HTTP_400_BAD_REQUEST)
         
         serializer = CreateSaleSerializer(data=request.data)
         if serializer.is_valid():
-            print(f"DEBUG: Serializer validated successfully: {serializer.validated_data}")
             shop = ShopConfiguration.objects.get()
 
             try:
                 cashier = Cashier.objects.get(id=cashier_id, shop=shop)
-                print(f"DEBUG: Cashier found: {cashier.name} (ID: {cashier.id})")
             except Cashier.DoesNotExist:
                 return Response({"error": "Invalid cashier"}, status=status.HTTP_400_BAD_REQUEST)
         else:
-            print(f"DEBUG: Serializer validation failed: {serializer.errors}")
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
         items_data = serializer.validated_data['items']
@@ -423,7 +471,7 @@ class SaleListView(APIView):
                 quantity = Decimal(item_data['quantity'])
 
                 try:
-                    product = Product.objects.get(id=product_id, shop=shop)
+                    product = Product.objects.select_for_update().get(id=product_id, shop=shop)
                 except Product.DoesNotExist:
                     return Response({"error": f"Product {product_id} not found"}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -448,6 +496,9 @@ class SaleListView(APIView):
                     'total_price': total_price
                 })
 
+            if not fits_field(total_amount, Sale._meta.get_field('total_amount')):
+                return Response({"error": "Sale total is too large"}, status=status.HTTP_400_BAD_REQUEST)
+
             # Create sale
             sale = Sale.objects.create(
                 shop=shop,
@@ -459,6 +510,17 @@ class SaleListView(APIView):
                 customer_phone=customer_phone
             )
 
+            # Cost every line from the product's cost layers before its stock moves
+            running_stock = {}
+            cost_entries = []
+            for item_data in sale_items:
+                product = item_data['product']
+                previous_stock = running_stock.get(product.id, product.stock_quantity)
+                running_stock[product.id] = previous_stock - item_data['quantity']
+                item_data['cost'] = {'product_id': product.id, 'previous_stock': previous_stock, 'new_stock': running_stock[product.id]}
+                cost_entries.append(item_data['cost'])
+            apply_stock_costs(shop, cost_entries, {item_data['product'].id: item_data['product'] for item_data in sale_items})
+
             # Create sale items and update stock
             for item_data in sale_items:
                 SaleItem.objects.create(
@@ -466,6 +528,7 @@ class SaleListView(APIView):
                     product=item_data['product'],
                     quantity=item_data['quantity'],
                     unit_price=item_data['unit_price'],
+                    unit_cost=item_data['cost']['cost_price'],
                     total_price=item_data['total_price']
                 )
 
@@ -485,8 +548,9 @@ class SaleListView(APIView):
                     performed_by=cashier,
                     reference_number=f'Sale #{sale.id}',
                     notes=f'Sold {item_data["quantity"]} x {item_data["product"].name} to {customer_name or "customer"}',
-                    cost_price=item_data['product'].cost_price
+                    cost_price=item_data['cost']['cost_price']
                 )
+            invalidate_pnl(shop.id, sale.created_at)
 
             serializer = SaleSerializer(sale)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -583,6 +647,7 @@ class CustomerListView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 @method_decorator(csrf_exempt, name='dispatch')
+@method_decorator(conditional_catalog('discount'), name='get')
 class DiscountListView(APIView):
     def get(self, request):
         shop = ShopConfiguration.objects.get()
@@ -674,6 +739,9 @@ class SaleDetailView(APIView):
         try:
             sale = Sale.objects.get(id=sale_id, shop=shop)
         except Sale.DoesNotExist:
+            archived = sale_rows(Sale.objects.none(), ArchivedSale.objects.filter(id=sale_id, shop_id=shop.id))
+            if archived:
+                return Response(archived[0])
             return Response({"error": "Sale not found"}, status=status.HTTP_404_NOT_FOUND)
 
         serializer = SaleSerializer(sale)
@@ -688,6 +756,8 @@ class SaleDetailView(APIView):
         try:
             sale = Sale.objects.get(id=sale_id, shop=shop)
         except Sale.DoesNotExist:
+            if ArchivedSale.objects.filter(id=sale_id, shop_id=shop.id).exists():
+                return Response({"error": "Sale is archived and can no longer be changed"}, status=status.HTTP_400_BAD_REQUEST)
             return Response({"error": "Sale not found"}, status=status.HTTP_404_NOT_FOUND)
 
         action = request.data.get('action')
@@ -697,10 +767,18 @@ class SaleDetailView(APIView):
 
             sale.status = 'completed'
             sale.save()
+            invalidate_pnl(shop.id, sale.created_at)
             return Response({"message": "Sale confirmed successfully"})
 
         elif action == 'refund':
-            if sale.status == 'refunded':
+            # A retry of an already processed refund is answered from the stored result
+            idempotency_key = idempotency_key_from(request)
+            try:
+                is_retry = bool(idempotency_key) and stored_refund(shop, sale, idempotency_key) is not None
+            except RefundError as e:
+                return Response({"error": str(e)}, status=e.status_code)
+
+            if sale.status == 'refunded' and not is_retry:
                 return Response({"error": "Sale is already refunded"}, status=status.HTTP_400_BAD_REQUEST)
 
             # Get refund details
@@ -731,50 +809,21 @@ class SaleDetailView(APIView):
                 except Cashier.DoesNotExist:
                     pass
 
-            total_refund_amount = 0
-            refunded_items = []
-
-            # Process each item refund
-            for item_data in refund_items:
-                item_id = item_data.get('item_id')
-                quantity = item_data.get('quantity', 0)
-
-                try:
-                    sale_item = SaleItem.objects.get(id=item_id, sale=sale)
-                except SaleItem.DoesNotExist:
-                    return Response({"error": f"Sale item {item_id} not found"}, status=status.HTTP_404_NOT_FOUND)
-
-                if quantity <= 0:
-                    continue
-
-                success, message = sale_item.refund_item(quantity, refund_type, reason, refunded_by)
-                if not success:
-                    return Response({"error": message}, status=status.HTTP_400_BAD_REQUEST)
-
-                total_refund_amount += quantity * sale_item.unit_price
-                refunded_items.append({
-                    'item_id': item_id,
-                    'product_name': sale_item.product.name,
-                    'quantity': quantity,
-                    'refund_amount': quantity * sale_item.unit_price
-                })
-
-            # Update sale status if all items are refunded
-            all_items_refunded = all(item.refunded for item in sale.items.all())
-            if all_items_refunded:
-                sale.status = 'refunded'
-                sale.refund_reason = reason
-                sale.refund_type = refund_type
-                sale.refund_amount = total_refund_amount
-                sale.refunded_at = timezone.now()
-                sale.refunded_by = refunded_by
-                sale.save()
+            # All items are refunded in one transaction; retries with the same key are answered from the first result
+            try:
+                result, replayed = process_refund(
+                    shop, sale, refund_items, refund_type, reason, refunded_by,
+                    idempotency_key=idempotency_key
+                )
+            except RefundError as e:
+                return Response({"error": str(e)}, status=e.status_code)
 
             return Response({
                 "message": "Refund processed successfully",
-                "total_refund_amount": total_refund_amount,
-                "refunded_items": refunded_items,
-                "sale_fully_refunded": all_items_refunded
+                "total_refund_amount": result['total_refund_amount'],
+                "refunded_items": result['refunded_items'],
+                "sale_fully_refunded": result['sale_fully_refunded'],
+                "replayed": replayed
             })
 
         else:
@@ -789,7 +838,14 @@ class SaleItemDetailView(APIView):
         except SaleItem.DoesNotExist:
             return Response({"error": "Sale item not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        if sale_item.refunded:
+        # A retry of an already processed refund is answered from the stored result
+        idempotency_key = idempotency_key_from(request)
+        try:
+            is_retry = bool(idempotency_key) and stored_refund(sale_item.sale.shop, sale_item.sale, idempotency_key) is not None
+        except RefundError as e:
+            return Response({"error": str(e)}, status=e.status_code)
+
+        if sale_item.refunded and not is_retry:
             return Response({"error": "Item is already fully refunded"}, status=status.HTTP_400_BAD_REQUEST)
 
         # Check if sale is completed (not pending or already refunded)
@@ -809,7 +865,7 @@ class SaleItemDetailView(APIView):
         if not refund_type:
             return Response({"error": "Refund type is required"}, status=status.HTTP_400_BAD_REQUEST)
 
-        if quantity <= 0 or quantity > sale_item.remaining_quantity:
+        if not is_retry and (quantity <= 0 or quantity > sale_item.remaining_quantity):
             return Response({"error": f"Invalid quantity. Can refund up to {sale_item.remaining_quantity} items"}, status=status.HTTP_400_BAD_REQUEST)
 
         # Check if password matches shop owner
@@ -825,19 +881,23 @@ class SaleItemDetailView(APIView):
                 pass
 
         # Process the refund
-        success, message = sale_item.refund_item(quantity, refund_type, reason, refunded_by)
-        if not success:
-            return Response({"error": message}, status=status.HTTP_400_BAD_REQUEST)
-
-        refund_amount = quantity * sale_item.unit_price
+        try:
+            result, replayed = process_refund(
+                sale_item.sale.shop, sale_item.sale, [{'item_id': sale_item.id, 'quantity': quantity}],
+                refund_type, reason, refunded_by, idempotency_key=idempotency_key
+            )
+        except RefundError as e:
+            return Response({"error": str(e)}, status=e.status_code)
 
+        refunded_item = result['refunded_items'][0]
         return Response({
             "message": "Item refunded successfully",
-            "product_name": sale_item.product.name,
-            "quantity_refunded": quantity,
-            "refund_amount": refund_amount,
-            "remaining_quantity": sale_item.remaining_quantity,
-            "fully_refunded": sale_item.refunded
+            "product_name": refunded_item['product_name'],
+            "quantity_refunded": refunded_item['quantity'],
+            "refund_amount": refunded_item['refund_amount'],
+            "remaining_quantity": refunded_item['remaining_quantity'],
+            "fully_refunded": refunded_item['fully_refunded'],
+            "replayed": replayed
         })
 
 @method_decorator(csrf_exempt, name='dispatch')
@@ -845,7 +905,6 @@ class ExpenseListView(APIView):
     def get(self, request):
         shop = ShopConfiguration.objects.get()
         expenses = Expense.objects.filter(shop=shop).order_by('-created_at')
-        print(f"DEBUG: Found {expenses.count()} expenses for shop {shop.name}")
         serializer = ExpenseSerializer(expenses, many=True)
         return Response(serializer.data)
 
@@ -878,7 +937,6 @@ class ExpenseListView(APIView):
                     shop=shop
                 )
                 expense_data['product'] = product.id
-                print(f"DEBUG: Found product {product.name} for lookup code {product_lookup_code}")
             except Product.DoesNotExist:
                 return Response({
                     "error": f"Product not found with line code or barcode: {product_lookup_code}"
@@ -912,23 +970,20 @@ class ExpenseListView(APIView):
                 "error": "Product lookup code is required for Staff Lunch expenses"
             }, status=status.HTTP_400_BAD_REQUEST)
 
+        # Resolve the cashier up front so the expense is saved once, with its side effects applied once
+        recorded_by = None
+        cashier_id = request.data.get('cashier_id')
+        if cashier_id:
+            recorded_by = Cashier.objects.filter(id=cashier_id, shop=shop).first()
+
         serializer = ExpenseSerializer(data=expense_data)
         if serializer.is_valid():
-            expense = serializer.save(shop=shop)
-
-            # Set recorded_by if cashier_id provided
-            cashier_id = request.data.get('cashier_id')
-            if cashier_id:
-                try:
-                    cashier = Cashier.objects.get(id=cashier_id, shop=shop)
-                    expense.recorded_by = cashier
-                    expense.save()
-                except Cashier.DoesNotExist:
-                    pass
-
+            fields = {**serializer.validated_data, 'shop': shop}
+            if recorded_by:
+                fields['recorded_by'] = recorded_by
+            serializer.instance = record_expense(Expense(**fields))
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         else:
-            print(f"DEBUG: ExpenseSerializer errors: {serializer.errors}")
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 @method_decorator(csrf_exempt, name='dispatch')
@@ -936,7 +991,6 @@ class RefundListView(APIView):
     def get(self, request):
         shop = ShopConfiguration.objects.get()
         refunds = Refund.objects.filter(shop=shop).order_by('-created_at')
-        print(f"DEBUG: Found {refunds.count()} refunds for shop {shop.name}")
         serializer = RefundSerializer(refunds, many=True)
         return Response(serializer.data)
 
@@ -978,7 +1032,6 @@ class RefundListView(APIView):
 
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         else:
-            print(f"DEBUG: RefundSerializer errors: {serializer.errors}")
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 @method_decorator(csrf_exempt, name='dispatch')
@@ -1017,30 +1070,25 @@ class StaffLunchListView(APIView):
 
         # Calculate total cost
         total_cost = product.price * int(quantity)
-        print(f"DEBUG: Staff lunch calculation - Product: {product.name}, Price: ${product.price}, Quantity: {quantity}, Total Cost: ${total_cost}")
-
-        # Create staff lunch record
-        staff_lunch = StaffLunch.objects.create(
-            shop=shop,
-            product=product,
-            quantity=int(quantity),
-            total_cost=total_cost,
-            notes=request.data.get('notes', '')
-        )
-    
-        # Reduce product stock
-        product.stock_quantity -= int(quantity)
-        product.save()
 
         # Set recorded_by if cashier_id provided
+        cashier = None
         cashier_id = request.data.get('cashier_id')
         if cashier_id:
-            try:
-                cashier = Cashier.objects.get(id=cashier_id, shop=shop)
-                staff_lunch.recorded_by = cashier
-                staff_lunch.save()
-            except Cashier.DoesNotExist:
-                pass
+            cashier = Cashier.objects.filter(id=cashier_id, shop=shop).first()
+
+        # Create staff lunch record; saving it takes the quantity out of stock
+        try:
+            staff_lunch = StaffLunch.objects.create(
+                shop=shop,
+                product=product,
+                quantity=int(quantity),
+                total_cost=total_cost,
+                recorded_by=cashier,
+                notes=request.data.get('notes', '')
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         serializer = StaffLunchSerializer(staff_lunch)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -1050,8 +1098,7 @@ class StockTakeListView(APIView):
     def get(self, request):
         shop = ShopConfiguration.objects.get()
         stock_takes = StockTake.objects.filter(shop=shop).order_by('-started_at')
-        serializer = StockTakeSerializer(stock_takes, many=True)
-        return Response(serializer.data)
+        return Response(stock_take_rows(stock_takes))
 
     def post(self, request):
         shop = ShopConfiguration.objects.get()
@@ -1124,8 +1171,16 @@ class StockTakeDetailView(APIView):
             serializer = StockTakeSerializer(stock_take)
             return Response(serializer.data)
 
+        elif action == 'backfill_system_quantities':
+            if stock_take.status != 'in_progress':
+                return Response({"error": "Stock take is not in progress"}, status=status.HTTP_400_BAD_REQUEST)
+
+            stock_take.backfill_system_quantities()
+            serializer = StockTakeSerializer(stock_take)
+            return Response(serializer.data)
+
         else:
-            return Response({"error": "Invalid action. Use 'complete' or 'cancel'"}, status=status.HTTP_400_BAD_REQUEST)
+            return Response({"error": "Invalid action. Use 'complete', 'cancel' or 'backfill_system_quantities'"}, status=status.HTTP_400_BAD_REQUEST)
 
 @method_decorator(csrf_exempt, name='dispatch')
 class StockTakeItemListView(APIView):
@@ -1137,8 +1192,7 @@ class StockTakeItemListView(APIView):
             return Response({"error": "Stock take not found"}, status=status.HTTP_404_NOT_FOUND)
 
         items = StockTakeItem.objects.filter(stock_take=stock_take)
-        serializer = StockTakeItemSerializer(items, many=True)
-        return Response(serializer.data)
+        return Response(stock_take_item_rows(items))
 
     def post(self, request, stock_take_id):
         shop = ShopConfiguration.objects.get()
@@ -1289,17 +1343,18 @@ class OwnerDashboardView(APIView):
         except ShopConfiguration.DoesNotExist:
             return Response({"error": "Shop not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        # Calculate date ranges
-        today = timezone.now().date()
-        yesterday = today - timedelta(days=1)
-        week_ago = today - timedelta(days=7)
-        month_ago = today - timedelta(days=30)
+        # Calculate date ranges as half-open [start, end) windows in the shop's timezone
+        today = local_today()
+        today_start, tomorrow_start = day_window(today)
+        yesterday_start = day_start(today - timedelta(days=1))
+        week_ago = day_start(today - timedelta(days=7))
+        month_ago = day_start(today - timedelta(days=30))
 
         # Sales Data
-        today_sales = Sale.objects.filter(shop=shop, created_at__date=today, status='completed')
-        yesterday_sales = Sale.objects.filter(shop=shop, created_at__date=yesterday, status='completed')
-        week_sales = Sale.objects.filter(shop=shop, created_at__date__gte=week_ago, status='completed')
-        month_sales = Sale.objects.filter(shop=shop, created_at__date__gte=month_ago, status='completed')
+        today_sales = Sale.objects.filter(shop=shop, status='completed', **window_filter('created_at', today_start, tomorrow_start))
+        yesterday_sales = Sale.objects.filter(shop=shop, status='completed', **window_filter('created_at', yesterday_start, today_start))
+        week_sales = Sale.objects.filter(shop=shop, created_at__gte=week_ago, status='completed')
+        month_sales = Sale.objects.filter(shop=shop, created_at__gte=month_ago, status='completed')
 
         # Calculate sales metrics
         today_revenue = today_sales.aggregate(total=Sum('total_amount'))['total'] or 0
@@ -1315,8 +1370,8 @@ class OwnerDashboardView(APIView):
         week_orders = week_sales.count()
         prev_week_revenue = Sale.objects.filter(
             shop=shop, 
-            created_at__date__gte=week_ago - timedelta(days=7), 
-            created_at__date__lt=week_ago, 
+            created_at__gte=week_ago - timedelta(days=7), 
+            created_at__lt=week_ago, 
             status='completed'
         ).aggregate(total=Sum('total_amount'))['total'] or 0
         week_growth = ((week_revenue - prev_week_revenue) / max(prev_week_revenue, 1)) * 100 if prev_week_revenue > 0 else 0
@@ -1325,8 +1380,8 @@ class OwnerDashboardView(APIView):
         month_orders = month_sales.count()
         prev_month_revenue = Sale.objects.filter(
             shop=shop, 
-            created_at__date__gte=month_ago - timedelta(days=30), 
-            created_at__date__lt=month_ago, 
+            created_at__gte=month_ago - timedelta(days=30), 
+            created_at__lt=month_ago, 
             status='completed'
         ).aggregate(total=Sum('total_amount'))['total'] or 0
         month_growth = ((month_revenue - prev_month_revenue) / max(prev_month_revenue, 1)) * 100 if prev_month_revenue > 0 else 0
@@ -1343,15 +1398,15 @@ class OwnerDashboardView(APIView):
         total_cashiers = Cashier.objects.filter(shop=shop).count()
         active_today = Shift.objects.filter(
             shop=shop, 
-            start_time__date=today, 
-            is_active=True
+            is_active=True,
+            **window_filter('start_time', today_start, tomorrow_start)
         ).count()
 
         # Top Products (last 30 days)
         top_products_data = []
         sale_items_30_days = SaleItem.objects.filter(
             sale__shop=shop,
-            sale__created_at__date__gte=month_ago,
+            sale__created_at__gte=month_ago,
             sale__status='completed'
         ).values(
             'product_id',
@@ -1407,9 +1462,9 @@ class OwnerDashboardView(APIView):
         # High value sales alert (for large transactions)
         large_sales_today = Sale.objects.filter(
             shop=shop,
-            created_at__date=today,
             status='completed',
-            total_amount__gte=1000  # Alert for sales over $1000
+            total_amount__gte=1000,  # Alert for sales over $1000
+            **window_filter('created_at', today_start, tomorrow_start)
         ).count()
         
         if large_sales_today > 0:
@@ -1532,17 +1587,18 @@ class FounderShopDashboardView(APIView):
             return Response({"error": "Shop not found"}, status=status.HTTP_404_NOT_FOUND)
         
         # Use the existing OwnerDashboardView logic but for the specific shop
-        # Calculate date ranges
-        today = timezone.now().date()
-        yesterday = today - timedelta(days=1)
-        week_ago = today - timedelta(days=7)
-        month_ago = today - timedelta(days=30)
+        # Calculate date ranges as half-open [start, end) windows in the shop's timezone
+        today = local_today()
+        today_start, tomorrow_start = day_window(today)
+        yesterday_start = day_start(today - timedelta(days=1))
+        week_ago = day_start(today - timedelta(days=7))
+        month_ago = day_start(today - timedelta(days=30))
 
         # Sales Data
-        today_sales = Sale.objects.filter(shop=shop, created_at__date=today, status='completed')
-        yesterday_sales = Sale.objects.filter(shop=shop, created_at__date=yesterday, status='completed')
-        week_sales = Sale.objects.filter(shop=shop, created_at__date__gte=week_ago, status='completed')
-        month_sales = Sale.objects.filter(shop=shop, created_at__date__gte=month_ago, status='completed')
+        today_sales = Sale.objects.filter(shop=shop, status='completed', **window_filter('created_at', today_start, tomorrow_start))
+        yesterday_sales = Sale.objects.filter(shop=shop, status='completed', **window_filter('created_at', yesterday_start, today_start))
+        week_sales = Sale.objects.filter(shop=shop, created_at__gte=week_ago, status='completed')
+        month_sales = Sale.objects.filter(shop=shop, created_at__gte=month_ago, status='completed')
 
         # Calculate sales metrics
         today_revenue = today_sales.aggregate(total=Sum('total_amount'))['total'] or 0
@@ -1558,8 +1614,8 @@ class FounderShopDashboardView(APIView):
         week_orders = week_sales.count()
         prev_week_revenue = Sale.objects.filter(
             shop=shop, 
-            created_at__date__gte=week_ago - timedelta(days=7), 
-            created_at__date__lt=week_ago, 
+            created_at__gte=week_ago - timedelta(days=7), 
+            created_at__lt=week_ago, 
             status='completed'
         ).aggregate(total=Sum('total_amount'))['total'] or 0
         week_growth = ((week_revenue - prev_week_revenue) / max(prev_week_revenue, 1)) * 100 if prev_week_revenue > 0 else 0
@@ -1568,8 +1624,8 @@ class FounderShopDashboardView(APIView):
         month_orders = month_sales.count()
         prev_month_revenue = Sale.objects.filter(
             shop=shop, 
-            created_at__date__gte=month_ago - timedelta(days=30), 
-            created_at__date__lt=month_ago, 
+            created_at__gte=month_ago - timedelta(days=30), 
+            created_at__lt=month_ago, 
             status='completed'
         ).aggregate(total=Sum('total_amount'))['total'] or 0
         month_growth = ((month_revenue - prev_month_revenue) / max(prev_month_revenue, 1)) * 100 if prev_month_revenue > 0 else 0
@@ -1586,15 +1642,15 @@ class FounderShopDashboardView(APIView):
         total_cashiers = Cashier.objects.filter(shop=shop).count()
         active_today = Shift.objects.filter(
             shop=shop, 
-            start_time__date=today, 
-            is_active=True
+            is_active=True,
+            **window_filter('start_time', today_start, tomorrow_start)
         ).count()
 
         # Top Products (last 30 days)
         top_products_data = []
         sale_items_30_days = SaleItem.objects.filter(
             sale__shop=shop,
-            sale__created_at__date__gte=month_ago,
+            sale__created_at__gte=month_ago,
             sale__status='completed'
         ).values(
             'product_id',
@@ -1650,9 +1706,9 @@ class FounderShopDashboardView(APIView):
         # High value sales alert (for large transactions)
         large_sales_today = Sale.objects.filter(
             shop=shop,
-            created_at__date=today,
             status='completed',
-            total_amount__gte=1000  # Alert for sales over $1000
+            total_amount__gte=1000,  # Alert for sales over $1000
+            **window_filter('created_at', today_start, tomorrow_start)
         ).count()
         
         if large_sales_today > 0:
@@ -1750,27 +1806,32 @@ class InventoryAuditTrailView(APIView):
 
     def get(self, request):
         shop = ShopConfiguration.objects.get()
-        logs = InventoryLog.objects.filter(shop=shop).order_by('-created_at')
+        filters = {}
         
         # Filtering
         product_id = request.query_params.get('product_id')
         if product_id:
-            logs = logs.filter(product_id=product_id)
+            filters['product_id'] = product_id
             
         reason_code = request.query_params.get('reason_code')
         if reason_code:
-            logs = logs.filter(reason_code=reason_code)
+            filters['reason_code'] = reason_code
             
-        start_date = request.query_params.get('start_date')
+        start = None
+        start_date = parse_date(request.query_params.get('start_date') or '')
         if start_date:
-            logs = logs.filter(created_at__date__gte=start_date)
+            start = day_start(start_date)
+            filters['created_at__gte'] = start
             
-        end_date = request.query_params.get('end_date')
+        end_date = parse_date(request.query_params.get('end_date') or '')
         if end_date:
-            logs = logs.filter(created_at__date__lte=end_date)
-            
-        serializer = InventoryLogSerializer(logs, many=True)
-        return Response(serializer.data)
+            filters['created_at__lt'] = day_start(end_date + timedelta(days=1))
+
+        logs = InventoryLog.objects.filter(shop=shop, **filters).order_by('-created_at')
+        archived_logs = None
+        if reads_archive(shop, start):
+            archived_logs = ArchivedInventoryLog.objects.filter(shop_id=shop.id, **filters).order_by('-created_at')
+        return Response(inventory_log_rows(logs, archived_logs))
 
 @method_decorator(csrf_exempt, name='dispatch')
 class ProductAuditHistoryView(APIView):
@@ -1782,8 +1843,10 @@ class ProductAuditHistoryView(APIView):
             return Response({"error": "Product not found"}, status=status.HTTP_404_NOT_FOUND)
             
         logs = InventoryLog.objects.filter(shop=shop, product=product).order_by('-created_at')
-        serializer = InventoryLogSerializer(logs, many=True)
-        return Response(serializer.data)
+        archived_logs = None
+        if reads_archive(shop):
+            archived_logs = ArchivedInventoryLog.objects.filter(shop_id=shop.id, product_id=product.id).order_by('-created_at')
+        return Response(inventory_log_rows(logs, archived_logs))
 
 @method_decorator(csrf_exempt, name='dispatch')
 class CashierTopProductsView(APIView):
@@ -1849,7 +1912,7 @@ class BarcodeLookupView(APIView):
         ).filter(
             models.Q(barcode=barcode) | 
             models.Q(line_code=barcode) |
-            models.Q(additional_barcodes__contains=barcode)
+            models.Q(id__in=ProductBarcode.objects.filter(shop=shop, barcode=barcode).values('product_id'))
         ).first()
         
         if product:
@@ -1902,16 +1965,25 @@ class SalesHistoryView(APIView):
         except ShopConfiguration.DoesNotExist:
             return Response({"error": "Shop not found"}, status=status.HTTP_404_NOT_FOUND)
         
-        sales = Sale.objects.filter(shop=shop).order_by('-created_at')
+        sales = list(Sale.objects.filter(shop=shop).order_by('-created_at'))
+        if reads_archive(shop):
+            # Archived sales carry the cashier and product names from when they were archived
+            archived = ArchivedSale.objects.filter(shop_id=shop.id).prefetch_related('items')
+            sales = sorted(sales + list(archived), key=lambda sale: sale.created_at, reverse=True)
         
         # Enhanced serialization with more details for the frontend
         sales_data = []
         for sale in sales:
+            archived = isinstance(sale, ArchivedSale)
+            if archived:
+                cashier_name = sale.cashier_name or 'Unknown'
+            else:
+                cashier_name = sale.cashier.name if sale.cashier else 'Unknown'
             sale_data = {
                 'id': sale.id,
                 'receipt_number': f'R{sale.id:03d}',  # Format as R001, R002, etc.
                 'created_at': sale.created_at.isoformat(),
-                'cashier_name': sale.cashier.name if sale.cashier else 'Unknown',
+                'cashier_name': cashier_name,
                 'payment_method': sale.payment_method,
                 'customer_name': sale.customer_name or '',
                 'total_amount': float(sale.total_amount),
@@ -1923,8 +1995,8 @@ class SalesHistoryView(APIView):
             # Add sale items with product details
             for item in sale.items.all():
                 sale_data['items'].append({
-                    'product_id': item.product.id,
-                    'product_name': item.product.name,
+                    'product_id': item.product_id,
+                    'product_name': item.product_name if archived else item.product.name,
                     'quantity': float(item.quantity),
                     'unit_price': float(item.unit_price),
                     'total_price': float(item.total_price)
@@ -1935,6 +2007,79 @@ class SalesHistoryView(APIView):
         return Response(sales_data)
 
 
+@method_decorator(csrf_exempt, name='dispatch')
+class BulkAddWasteBatchItemsView(APIView):
+    """Add many products to a draft waste batch in a single request"""
+    def post(self, request, batch_id):
+        shop = ShopConfiguration.objects.get()
+        try:
+            batch = WasteBatch.objects.get(id=batch_id, shop=shop)
+        except WasteBatch.DoesNotExist:
+            return Response({"error": "Waste batch not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        if batch.status != 'DRAFT':
+            return Response({"error": "Cannot add items to completed or cancelled batch"}, status=status.HTTP_400_BAD_REQUEST)
+
+        items_data = request.data.get('items')
+        if not isinstance(items_data, list) or not items_data:
+            return Response({"error": "items must be a non-empty list"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Items may name a product by id or by line code / barcode
+        resolver = IdentifierResolver(shop)
+        resolver.prime(
+            item.get('identifier') for item in items_data if isinstance(item, dict) and isinstance(item.get('identifier'), str)
+        )
+
+        items = []
+        for index, item_data in enumerate(items_data):
+            if not isinstance(item_data, dict):
+                return Response({"error": f"Invalid item at index {index}"}, status=status.HTTP_400_BAD_REQUEST)
+            product_id = item_data.get('product_id')
+            if not product_id and item_data.get('identifier'):
+                if not isinstance(item_data['identifier'], str):
+                    return Response({"error": f"Invalid item at index {index}"}, status=status.HTTP_400_BAD_REQUEST)
+                product = resolver.resolve(item_data['identifier'])
+                if not product:
+                    return Response({"error": f"Product not found: {item_data['identifier']}"}, status=status.HTTP_400_BAD_REQUEST)
+                product_id = product.id
+            try:
+                items.append({
+                    'product_id': int(product_id),
+                    'quantity': Decimal(str(item_data.get('quantity', 0))),
+                    'reason': item_data.get('reason'),
+                    'reason_details': item_data.get('reason_details'),
+                })
+            except (ArithmeticError, TypeError, ValueError):
+                return Response({"error": f"Invalid item at index {index}"}, status=status.HTTP_400_BAD_REQUEST)
+            # NaN, Infinity and 1e40 parse, but cannot be compared or stored
+            if not fits_field(items[-1]['quantity'], Waste._meta.get_field('quantity')):
+                return Response({"error": f"Invalid item at index {index}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            waste_items = batch.add_waste_items(items)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            "message": f"Added {len(waste_items)} items to waste batch {batch.batch_number}",
+            "batch_id": batch.id,
+            "batch_number": batch.batch_number,
+            "added_count": len(waste_items),
+            "total_waste_value": float(batch.total_waste_value),
+            "total_waste_quantity": float(batch.total_waste_quantity),
+            "items": [
+                {
+                    "id": waste_item.id,
+                    "product_id": waste_item.product_id,
+                    "product_name": waste_item.product.name,
+                    "quantity": float(waste_item.quantity),
+                    "reason": waste_item.reason,
+                    "waste_value": float(waste_item.waste_value),
+                }
+                for waste_item in waste_items
+            ]
+        }, status=status.HTTP_201_CREATED)
+
 class StockTransferViewSet(viewsets.ViewSet):
     """ViewSet for Stock Transfer operations"""
     
@@ -1946,7 +2091,6 @@ class StockTransferViewSet(viewsets.ViewSet):
             if not shop_id:
                 return Response({'error': 'Shop ID required in X-Shop-ID header'}, status=status.HTTP_400_BAD_REQUEST)
             
-            print(f"🔍 DEBUG: Looking for shop with shop_id: {shop_id}")
             shop = get_object_or_404(ShopConfiguration, shop_id=shop_id)
             transfers = StockTransfer.objects.filter(shop=shop).order_by('-created_at')
             
@@ -1965,38 +2109,24 @@ class StockTransferViewSet(viewsets.ViewSet):
     def create(self, request):
         """Create a new stock transfer"""
         try:
-            print(f"🔍 DEBUG: StockTransferViewSet.create called")
-            print(f"🔍 DEBUG: Request data: {request.data}")
-            print(f"🔍 DEBUG: Request headers: {dict(request.META)}")
-            
             # Get shop credentials from request headers
             shop_id = request.META.get('HTTP_X_SHOP_ID')
-            print(f"🔍 DEBUG: Shop ID from header: {shop_id}")
-            
             if not shop_id:
-                print(f"❌ DEBUG: No shop ID provided")
                 return Response({'error': 'Shop ID required in X-Shop-ID header'}, status=status.HTTP_400_BAD_REQUEST)
             
             shop = get_object_or_404(ShopConfiguration, shop_id=shop_id)
-            print(f"🔍 DEBUG: Shop found: {shop.name}")
             
             # Get cashier from request - optional for shop owner
             cashier_id = request.META.get('HTTP_X_CASHIER_ID')
             cashier = None
             if cashier_id:
-                print(f"🔍 DEBUG: Looking for cashier with id: {cashier_id}")
                 try:
                     cashier = Cashier.objects.get(id=cashier_id, shop=shop)
-                    print(f"🔍 DEBUG: Cashier found: {cashier.name}")
                 except Cashier.DoesNotExist:
-                    print(f"❌ DEBUG: Cashier not found with id: {cashier_id}")
                     return Response({'error': 'Invalid cashier ID'}, status=status.HTTP_400_BAD_REQUEST)
-            else:
-                print(f"🔍 DEBUG: No cashier ID provided, assuming shop owner operation")
             
             # Extract transfer data from request
             data = request.data.copy()
-            print(f"🔍 DEBUG: Transfer data: {data}")
             
             # Create transfer instance
             transfer = StockTransfer(
@@ -2012,49 +2142,28 @@ class StockTransferViewSet(viewsets.ViewSet):
                 performed_by=cashier,  # Can be None for shop owner operations
                 notes=data.get('notes', '')
             )
+            transfer.identifier_resolver = IdentifierResolver(shop)
             
-            print(f"🔍 DEBUG: StockTransfer instance created")
-            
-            # Validate transfer
+            # Validate transfer - also resolves both products
             errors = transfer.validate_transfer()
-            print(f"🔍 DEBUG: Validation errors: {errors}")
             if errors:
-                print(f"❌ DEBUG: Validation failed")
                 return Response({
                     'success': False,
                     'error': 'Validation failed',
                     'details': errors
                 }, status=status.HTTP_400_BAD_REQUEST)
             
-            # Find products if identifiers provided
-            if transfer.from_line_code or transfer.from_barcode:
-                identifier = transfer.from_line_code or transfer.from_barcode
-                print(f"🔍 DEBUG: Finding from_product with identifier: {identifier}")
-                transfer.from_product = transfer._find_product_by_identifier(identifier)
-                print(f"🔍 DEBUG: from_product found: {transfer.from_product.name if transfer.from_product else 'Not found'}")
-            
-            if transfer.to_line_code or transfer.to_barcode:
-                identifier = transfer.to_line_code or transfer.to_barcode
-                print(f"🔍 DEBUG: Finding to_product with identifier: {identifier}")
-                transfer.to_product = transfer._find_product_by_identifier(identifier)
-                print(f"🔍 DEBUG: to_product found: {transfer.to_product.name if transfer.to_product else 'Not found'}")
-            
             # Process the transfer
-            print(f"🔍 DEBUG: About to call process_transfer()")
             success, messages = transfer.process_transfer()
-            print(f"🔍 DEBUG: process_transfer returned - success: {success}, messages: {messages}")
             
             if success:
-                print(f"✅ DEBUG: Transfer successful, serializing data...")
                 serializer = StockTransferSerializer(transfer)
-                print(f"✅ DEBUG: Serialization complete, returning success response")
                 return Response({
                     'success': True,
                     'message': 'Stock transfer completed successfully',
                     'data': serializer.data
                 }, status=status.HTTP_201_CREATED)
             else:
-                print(f"❌ DEBUG: Transfer failed")
                 return Response({
                     'success': False,
                     'error': 'Transfer failed',
@@ -2062,10 +2171,81 @@ class StockTransferViewSet(viewsets.ViewSet):
                 }, status=status.HTTP_400_BAD_REQUEST)
                 
         except Exception as e:
-            print(f"❌ DEBUG: Exception in create method: {str(e)}")
-            print(f"❌ DEBUG: Exception type: {type(e)}")
-            import traceback
-            print(f"❌ DEBUG: Traceback: {traceback.format_exc()}")
+            return Response({
+                'success': False,
+                'error': f'Internal server error: {str(e)}'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """Execute several stock transfers atomically: all succeed or none are applied"""
+        try:
+            shop_id = request.META.get('HTTP_X_SHOP_ID')
+            if not shop_id:
+                return Response({'error': 'Shop ID required in X-Shop-ID header'}, status=status.HTTP_400_BAD_REQUEST)
+            shop = get_object_or_404(ShopConfiguration, shop_id=shop_id)
+            
+            cashier = None
+            cashier_id = request.META.get('HTTP_X_CASHIER_ID')
+            if cashier_id:
+                try:
+                    cashier = Cashier.objects.get(id=cashier_id, shop=shop)
+                except Cashier.DoesNotExist:
+                    return Response({'error': 'Invalid cashier ID'}, status=status.HTTP_400_BAD_REQUEST)
+            
+            items = request.data.get('transfers')
+            if not isinstance(items, list) or not items:
+                return Response({
+                    'success': False,
+                    'error': 'transfers must be a non-empty list'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
+            transfers = []
+            for index, data in enumerate(items):
+                try:
+                    transfers.append(StockTransfer(
+                        shop=shop,
+                        transfer_type=data.get('transfer_type', 'CONVERSION'),
+                        from_line_code=data.get('from_line_code', ''),
+                        from_barcode=data.get('from_barcode', ''),
+                        from_quantity=Decimal(str(data.get('from_quantity', 0))),
+                        to_line_code=data.get('to_line_code', ''),
+                        to_barcode=data.get('to_barcode', ''),
+                        to_quantity=Decimal(str(data.get('to_quantity', 0))),
+                        reason=data.get('reason', ''),
+                        performed_by=cashier,
+                        notes=data.get('notes', '')
+                    ))
+                except (ArithmeticError, AttributeError, ValueError):
+                    return Response({
+                        'success': False,
+                        'error': f'Invalid transfer at index {index}'
+                    }, status=status.HTTP_400_BAD_REQUEST)
+                # NaN, Infinity and 1e40 parse, but cannot be compared or stored
+                if not all(fits_field(getattr(transfers[-1], field), StockTransfer._meta.get_field(field))
+                           for field in ('from_quantity', 'to_quantity')):
+                    return Response({
+                        'success': False,
+                        'error': f'Invalid transfer at index {index}'
+                    }, status=status.HTTP_400_BAD_REQUEST)
+            
+            success, results = StockTransfer.process_batch(shop, transfers)
+            details = [{'index': index, **result} for index, result in enumerate(results)]
+            if not success:
+                return Response({
+                    'success': False,
+                    'error': 'Batch validation failed - no transfers were applied',
+                    'details': [detail for detail in details if detail['errors']]
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
+            return Response({
+                'success': True,
+                'message': f'{len(transfers)} stock transfers completed successfully',
+                'data': StockTransferSerializer(transfers, many=True).data,
+                'warnings': [detail for detail in details if detail['warnings']]
+            }, status=status.HTTP_201_CREATED)
+            
+        except Exception as e:
             return Response({
                 'success': False,
                 'error': f'Internal server error: {str(e)}'
@@ -2080,7 +2260,6 @@ class StockTransferViewSet(viewsets.ViewSet):
             if not shop_id:
                 return Response({'error': 'Shop ID required in X-Shop-ID header'}, status=status.HTTP_400_BAD_REQUEST)
             
-            print(f"🔍 DEBUG: Finding product for shop_id: {shop_id}")
             shop = get_object_or_404(ShopConfiguration, shop_id=shop_id)
             
             # Get search identifier
@@ -2092,24 +2271,8 @@ class StockTransferViewSet(viewsets.ViewSet):
                 }, status=status.HTTP_400_BAD_REQUEST)
             
             # Search for product
-            product = None
-            search_method = ''
-            
-            try:
-                product = Product.objects.get(line_code=identifier, shop=shop)
-                search_method = 'line_code'
-            except Product.DoesNotExist:
-                try:
-                    product = Product.objects.get(barcode=identifier, shop=shop)
-                    search_method = 'barcode'
-                except Product.DoesNotExist:
-                    # Check additional barcodes
-                    product = Product.objects.filter(
-                        shop=shop,
-                        additional_barcodes__icontains=identifier
-                    ).first()
-                    if product:
-                        search_method = 'additional_barcode'
+            product = IdentifierResolver(shop).resolve(identifier)
+            search_method = IdentifierResolver.match_method(product, identifier) if product else ''
             
             if product:
                 serializer = ProductSerializer(product)
@@ -2143,7 +2306,6 @@ class StockTransferViewSet(viewsets.ViewSet):
             if not shop_id:
                 return Response({'error': 'Shop ID required in X-Shop-ID header'}, status=status.HTTP_400_BAD_REQUEST)
             
-            print(f"🔍 DEBUG: Validating transfer for shop_id: {shop_id}")
             shop = get_object_or_404(ShopConfiguration, shop_id=shop_id)
             
             # Create temporary transfer for validation
@@ -2160,16 +2322,9 @@ class StockTransferViewSet(viewsets.ViewSet):
                 reason=data.get('reason', ''),
             )
             
-            # Find products if identifiers provided
-            if transfer.from_line_code or transfer.from_barcode:
-                identifier = transfer.from_line_code or transfer.from_barcode
-                transfer.from_product = transfer._find_product_by_identifier(identifier)
-            
-            if transfer.to_line_code or transfer.to_barcode:
-                identifier = transfer.to_line_code or transfer.to_barcode
-                transfer.to_product = transfer._find_product_by_identifier(identifier)
+            transfer.identifier_resolver = IdentifierResolver(shop)
             
-            # Validate transfer
+            # Validate transfer - also resolves both products
             errors = transfer.validate_transfer()
             
             # Calculate conversion ratio
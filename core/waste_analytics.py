@@ -0,0 +1,135 @@
+"""
+Waste analytics cube.
+
+WasteRollup holds one row of totals per (shop, business day, reason, product, cashier).
+record_wastes() folds new or cancelled waste into it as it happens, rebuild_rollup()
+recomputes it from the Waste table, and waste_cube() answers any slice of it with a
+single grouped query whose cost depends on days × products, not on waste volume.
+"""
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
+
+from .models import Waste, WasteRollup
+from .quantities import ZERO
+from .reports import invalidate_pnl
+from .time_windows import SHOP_TIMEZONE, day_start, day_window
+
+# group_by name -> (rollup field, output key)
+DIMENSIONS = {
+    'day': ('day', 'day'),
+    'week': (TruncWeek('day'), 'week'),
+    'month': (TruncMonth('day'), 'month'),
+    'reason': ('reason', 'reason'),
+    'product': ('product_id', 'product_id'),
+    'category': ('product__category', 'category'),
+    'cashier': ('recorded_by_id', 'cashier_id'),
+}
+
+
+def _rollup_key(waste):
+    return (
+        waste.shop_id,
+        waste.created_at.astimezone(SHOP_TIMEZONE).date(),
+        waste.reason,
+        waste.product_id,
+        waste.recorded_by_id,
+    )
+
+
+def record_wastes(wastes, sign=1):
+    """Add saved Waste records to the rollup, or take them out again with sign=-1"""
+    totals = {}
+    for waste in wastes:
+        count, quantity, value = totals.get(_rollup_key(waste), (0, ZERO, ZERO))
+        totals[_rollup_key(waste)] = (count + 1, quantity + waste.quantity, value + waste.waste_value)
+
+    with transaction.atomic():
+        for (shop_id, day, reason, product_id, recorded_by_id), (count, quantity, value) in totals.items():
+            key = {'shop_id': shop_id, 'day': day, 'reason': reason, 'product_id': product_id, 'recorded_by_id': recorded_by_id}
+            increments = {
+                'waste_count': F('waste_count') + sign * count,
+                'total_quantity': F('total_quantity') + sign * quantity,
+                'total_value': F('total_value') + sign * value,
+            }
+            if WasteRollup.objects.filter(**key).update(**increments) or sign < 0:
+                continue
+            # First waste for the key. The unique constraints make a concurrent first insert
+            # fail, in which case get_or_create returns the winner's row and we add to it.
+            _, created = WasteRollup.objects.get_or_create(
+                **key, defaults={'waste_count': count, 'total_quantity': quantity, 'total_value': value}
+            )
+            if not created:
+                WasteRollup.objects.filter(**key).update(**increments)
+        for shop_id, day in {key[:2] for key in totals}:
+            invalidate_pnl(shop_id, day)
+
+
+def rebuild_rollup(shop, start_day=None, end_day=None):
+    """
+    Recompute rollup rows for the business days start_day..end_day (all history when
+    omitted) from the Waste table. Returns the number of rollup rows written.
+    """
+    wastes = Waste.objects.filter(shop=shop)
+    rollups = WasteRollup.objects.filter(shop=shop)
+    if start_day:
+        wastes = wastes.filter(created_at__gte=day_start(start_day))
+        rollups = rollups.filter(day__gte=start_day)
+    if end_day:
+        wastes = wastes.filter(created_at__lt=day_window(end_day)[1])
+        rollups = rollups.filter(day__lte=end_day)
+
+    rows = wastes.annotate(
+        day=TruncDate('created_at', tzinfo=SHOP_TIMEZONE)
+    ).values('day', 'reason', 'product_id', 'recorded_by_id').annotate(
+        waste_count=Count('id'),
+        total_quantity=Sum('quantity'),
+        total_value=Sum('waste_value'),
+    ).order_by()
+
+    with transaction.atomic():
+        rollups.delete()
+        created = WasteRollup.objects.bulk_create(
+            [WasteRollup(shop=shop, **row) for row in rows],
+            batch_size=500,
+        )
+    return len(created)
+
+
+def waste_cube(shop, start_day=None, end_day=None, group_by=('reason',), filters=None):
+    """
+    Waste totals over business days start_day..end_day, grouped by any of DIMENSIONS.
+    `filters` may hold reason, product_id, category and cashier_id.
+    Returns a list of dicts with the group keys plus count, quantity and value.
+    """
+    rollups = WasteRollup.objects.filter(shop=shop)
+    if start_day:
+        rollups = rollups.filter(day__gte=start_day)
+    if end_day:
+        rollups = rollups.filter(day__lte=end_day)
+
+    filters = filters or {}
+    if filters.get('reason'):
+        rollups = rollups.filter(reason=filters['reason'])
+    if filters.get('product_id'):
+        rollups = rollups.filter(product_id=filters['product_id'])
+    if filters.get('category'):
+        rollups = rollups.filter(product__category=filters['category'])
+    if filters.get('cashier_id'):
+        rollups = rollups.filter(recorded_by_id=filters['cashier_id'])
+
+    plain_fields = []
+    expressions = {}
+    for name in group_by:
+        field, key = DIMENSIONS[name]
+        if field == key:
+            plain_fields.append(key)
+        else:
+            expressions[key] = F(field) if isinstance(field, str) else field
+
+    rows = rollups.values(*plain_fields, **expressions).annotate(
+        count=Sum('waste_count'),
+        quantity=Sum('total_quantity'),
+        value=Sum('total_value'),
+    ).filter(count__gt=0).order_by(*(DIMENSIONS[name][1] for name in group_by))
+    return list(rows)
@@ -0,0 +1,73 @@
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+from django.views.decorators.csrf import csrf_exempt
+from django.utils.decorators import method_decorator
+from django.utils.dateparse import parse_date
+from datetime import timedelta
+from .models import ShopConfiguration
+from .time_windows import local_today
+from .waste_analytics import DIMENSIONS, waste_cube
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class WasteAnalyticsView(APIView):
+    """
+    Waste totals sliced by any combination of day, week, month, reason, product,
+    category and cashier, answered from the WasteRollup table.
+    """
+    def get(self, request):
+        shop = ShopConfiguration.objects.get()
+
+        end_date = local_today()
+        start_date = end_date - timedelta(days=30)
+        for name in ('start_date', 'end_date'):
+            value = request.query_params.get(name)
+            if value:
+                day = parse_date(value)
+                if day is None:
+                    return Response({"error": f"Invalid {name}: {value}"}, status=status.HTTP_400_BAD_REQUEST)
+                if name == 'start_date':
+                    start_date = day
+                else:
+                    end_date = day
+
+        group_by = [name for name in request.query_params.get('group_by', 'reason').split(',') if name]
+        unknown = [name for name in group_by if name not in DIMENSIONS]
+        if unknown:
+            return Response({
+                "error": f"Unknown group_by: {', '.join(unknown)}. Choose from {', '.join(DIMENSIONS)}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        filters = {name: request.query_params.get(name) for name in ('reason', 'product_id', 'category', 'cashier_id')}
+        rows = waste_cube(shop, start_date, end_date, group_by, filters)
+
+        results = []
+        total_value = 0
+        total_quantity = 0
+        total_count = 0
+        for row in rows:
+            total_value += row['value'] or 0
+            total_quantity += row['quantity'] or 0
+            total_count += row['count'] or 0
+            results.append({
+                **{key: value.isoformat() if hasattr(value, 'isoformat') else value
+                   for key, value in row.items() if key not in ('count', 'quantity', 'value')},
+                'waste_count': row['count'],
+                'total_quantity': float(row['quantity'] or 0),
+                'total_value': float(row['value'] or 0),
+            })
+
+        return Response({
+            'period': {
+                'start_date': start_date.isoformat(),
+                'end_date': end_date.isoformat()
+            },
+            'group_by': group_by,
+            'results': results,
+            'summary': {
+                'waste_count': total_count,
+                'total_quantity': float(total_quantity),
+                'total_value': float(total_value)
+            }
+        }, status=status.HTTP_200_OK)
@@ -18,6 +18,7 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'luminan_backend.settings')
 django.setup()
 
 from core.models import ShopConfiguration, Product, Expense
+from core.expenses import record_expense
 
 def test_expense_creation():
     """Test creating staff lunch expenses with product lookup"""
@@ -48,7 +49,7 @@ def test_expense_creation():
         
         # Test 1: Create Staff Lunch - Stock Type
         print("\nTest 1: Creating Staff Lunch (Stock Type)")
-        expense1 = Expense.objects.create(
+        expense1 = record_expense(Expense(
             shop=shop,
             category='Staff Lunch',
             description='Staff lunch - bread consumption',
@@ -61,7 +62,7 @@ def test_expense_creation():
             product=product,
             quantity=Decimal('2'),
             staff_lunch_type='stock'
-        )
+        ))
         print(f"[OK] Created expense ID: {expense1.id}")
         print(f"   - Product: {expense1.product_name}")
         print(f"   - Quantity: {expense1.quantity}")
@@ -73,7 +74,7 @@ def test_expense_creation():
         
         # Test 2: Create Staff Lunch - Money Type
         print("\nTest 2: Creating Staff Lunch (Money Type)")
-        expense2 = Expense.objects.create(
+        expense2 = record_expense(Expense(
             shop=shop,
             category='Staff Lunch',
             description='Staff lunch money allowance',
@@ -85,7 +86,7 @@ def test_expense_creation():
             notes='Money given to staff for lunch',
             quantity=Decimal('3'),
             staff_lunch_type='money'
-        )
+        ))
         print(f"[OK] Created expense ID: {expense2.id}")
         print(f"   - Quantity: {expense2.quantity}")
         print(f"   - Type: {expense2.staff_lunch_type}")
@@ -93,7 +94,7 @@ def test_expense_creation():
         
         # Test 3: Create Product Expense
         print("\nTest 3: Creating Product Expense")
-        expense3 = Expense.objects.create(
+        expense3 = record_expense(Expense(
             shop=shop,
             category='Product Expense',
             description='Bulk purchase of supplies',
@@ -108,7 +109,7 @@ def test_expense_creation():
             product_barcode=product.barcode,
             product_name=product.name,
             product_cost_price=product.cost_price
-        )
+        ))
         print(f"[OK] Created expense ID: {expense3.id}")
         print(f"   - Category: {expense3.category}")
         print(f"   - Product: {expense3.product_name}")
@@ -0,0 +1,99 @@
+from datetime import timedelta
+from decimal import Decimal
+
+import pytest
+from django.db.models import F
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from core import archive
+from core.archive import INVENTORY_LOG_FIELDS, SALE_FIELDS, SALE_ITEM_FIELDS, archive_history
+from core.cost_layers import recost_inventory
+from core.exports import export_stream
+from core.models import (
+    ArchiveRun, ArchivedInventoryLog, ArchivedSale, ArchivedSaleItem, CostLayer, InventoryLog, Sale, SaleItem,
+)
+from core.stock_ledger import ledger_deltas, stock_as_of
+from core.time_windows import local_today
+
+
+@pytest.fixture
+def old_sale(shop, cashier, make_product):
+    """A sale, its item and its ledger row from 200 days ago"""
+    sold_at = timezone.now() - timedelta(days=200)
+    product = make_product(stock_quantity=Decimal('9.00'))
+    sale = Sale.objects.create(
+        shop=shop, cashier=cashier, total_amount=Decimal('2.00'), payment_method='cash', status='completed',
+        created_at=sold_at,
+    )
+    SaleItem.objects.create(
+        sale=sale, product=product, quantity=Decimal('1.00'), unit_price=Decimal('2.00'), unit_cost=Decimal('1.00'),
+        total_price=Decimal('2.00'),
+    )
+    log = InventoryLog.objects.create(
+        shop=shop, product=product, reason_code='SALE', quantity_change=Decimal('-1.00'),
+        previous_quantity=Decimal('10.00'), new_quantity=Decimal('9.00'), cost_price=Decimal('1.00'),
+    )
+    InventoryLog.objects.filter(id=log.id).update(created_at=sold_at)
+    return sale
+
+
+def copy_without_deleting(shop, sale):
+    """What a run leaves behind when the archive database committed and the hot one did not"""
+    ArchiveRun.objects.create(shop=shop, archived_through=local_today() - timedelta(days=100), cutoff=timezone.now())
+    archive._copy_to_archive(ArchivedSale, list(Sale.objects.filter(id=sale.id).values(
+        *SALE_FIELDS, cashier_name=F('cashier__name'), refunded_by_name=F('refunded_by__name'),
+    )))
+    archive._copy_to_archive(ArchivedSaleItem, list(SaleItem.objects.filter(sale=sale).values(
+        *SALE_ITEM_FIELDS, product_name=F('product__name'), product_price=F('product__price'),
+        product_price_type=F('product__price_type'),
+    )))
+    archive._copy_to_archive(ArchivedInventoryLog, list(InventoryLog.objects.filter(shop=shop).values(
+        *INVENTORY_LOG_FIELDS, product_name=F('product__name'), performed_by_name=F('performed_by__name'),
+    )))
+
+
+def test_rows_in_both_tables_are_listed_once(shop, old_sale):
+    copy_without_deleting(shop, old_sale)
+
+    sales = Client().get(reverse('sale-list')).json()
+    assert [row['id'] for row in sales] == [old_sale.id]
+    assert len(sales[0]['items']) == 1
+    assert len(Client().get(reverse('inventory-audit-trail')).json()) == 1
+
+    today = local_today()
+    for dataset in ('sales', 'sale_items', 'inventory_logs'):
+        csv = b''.join(export_stream(shop, dataset, today - timedelta(days=365), today)).decode()
+        assert len(csv.splitlines()) == 2, dataset
+
+
+@pytest.mark.parametrize('failing_model', [ArchivedSaleItem, ArchivedInventoryLog])
+def test_failed_move_leaves_no_archived_copies(shop, old_sale, monkeypatch, failing_model):
+    copy_to_archive = archive._copy_to_archive
+
+    def copy_then_fail(archived_model, rows):
+        # The archive has committed the copy; the hot transaction is what fails
+        copy_to_archive(archived_model, rows)
+        if archived_model is failing_model:
+            raise RuntimeError('connection lost')
+
+    monkeypatch.setattr(archive, '_copy_to_archive', copy_then_fail)
+    with pytest.raises(RuntimeError):
+        archive_history(shop)
+
+    assert ArchiveRun.objects.get().status == 'failed'
+    assert Sale.objects.filter(id=old_sale.id).exists() != ArchivedSale.objects.filter(id=old_sale.id).exists()
+    assert InventoryLog.objects.exists() and not ArchivedInventoryLog.objects.exists()
+
+
+def test_rows_in_both_tables_are_counted_once(shop, old_sale):
+    product = old_sale.items.get().product
+    copy_without_deleting(shop, old_sale)
+
+    assert ledger_deltas(shop) == {product.id: Decimal('-1.00')}
+    assert stock_as_of(shop, timezone.now() - timedelta(days=300))[product.id]['quantity'] == Decimal('10.00')
+
+    recost_inventory(shop)
+    # Stock the ledger does not explain: 9 on hand less the one sale
+    assert CostLayer.objects.get(product=product).original_quantity == Decimal('10.00')
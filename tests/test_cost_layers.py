@@ -0,0 +1,163 @@
+import json
+from decimal import Decimal
+
+import pytest
+from django.db import transaction
+from django.test import Client
+from django.urls import reverse
+
+from core.cost_layers import recost_inventory
+from core.models import CostLayer, StaffLunch, StockMovement
+from core.stock_ledger import post_stock_changes
+
+
+def receive(shop, product, quantity, cost):
+    with transaction.atomic():
+        post_stock_changes(shop, [{'product_id': product.id, 'quantity_change': Decimal(quantity), 'cost_price': Decimal(cost)}], 'RECEIPT')
+
+
+def consume(shop, product, quantity):
+    with transaction.atomic():
+        post_stock_changes(shop, [{'product_id': product.id, 'quantity_change': -Decimal(quantity)}], 'DAMAGE')
+    return StockMovement.objects.filter(product=product, movement_type='DAMAGE').latest('id')
+
+
+def open_layers(product):
+    return list(
+        CostLayer.objects.filter(product=product, remaining_quantity__gt=0).order_by('received_at', 'id')
+        .values_list('remaining_quantity', 'unit_cost')
+    )
+
+
+@pytest.fixture
+def received(shop, make_product):
+    """10 units at 1.00, then 10 at 3.00, into a product with no stock"""
+    def make(costing_method):
+        shop.costing_method = costing_method
+        shop.save()
+        product = make_product(stock_quantity=Decimal('0.00'))
+        receive(shop, product, '10', '1.00')
+        receive(shop, product, '10', '3.00')
+        return product
+    return make
+
+
+def test_fifo_consumes_the_oldest_layers_first(shop, received):
+    product = received('fifo')
+
+    movement = consume(shop, product, '15')
+
+    # 10 at 1.00 and 5 at 3.00
+    assert movement.cost_price == Decimal('1.67')
+    assert open_layers(product) == [(Decimal('5.00'), Decimal('3.0000'))]
+    product.refresh_from_db()
+    assert (product.stock_quantity, product.cost_price) == (Decimal('5.00'), Decimal('3.00'))
+
+
+def test_average_consumes_at_the_pooled_cost(shop, received):
+    product = received('average')
+
+    movement = consume(shop, product, '15')
+
+    assert movement.cost_price == Decimal('2.00')
+    assert open_layers(product) == [(Decimal('5.00'), Decimal('2.0000'))]
+    product.refresh_from_db()
+    assert (product.stock_quantity, product.cost_price) == (Decimal('5.00'), Decimal('2.00'))
+
+
+@pytest.mark.parametrize('costing_method', ['fifo', 'average'])
+def test_recost_inventory_rebuilds_the_layers_from_the_ledger(shop, received, costing_method):
+    product = received(costing_method)
+    consume(shop, product, '15')
+    layers = open_layers(product)
+    CostLayer.objects.all().delete()
+
+    assert recost_inventory(shop) == len(layers)
+    assert open_layers(product) == layers
+
+
+def test_recost_inventory_replays_under_another_method(shop, received):
+    product = received('average')
+    consume(shop, product, '15')
+
+    recost_inventory(shop, method='fifo')
+
+    assert open_layers(product) == [(Decimal('5.00'), Decimal('3.0000'))]
+    product.refresh_from_db()
+    assert product.cost_price == Decimal('3.00')
+
+
+def test_valuation_endpoint_lists_layers_and_totals(shop, received, make_product):
+    product = received('fifo')
+    make_product(name='Unlayered')
+
+    response = Client().get(reverse('cost-layer-valuation'), {'product_id': product.id})
+
+    assert response.status_code == 200, response.content
+    body = response.json()
+    assert body['costing_method'] == 'fifo'
+    assert [(layer['remaining_quantity'], layer['value']) for layer in body['layers']] == [(10.0, 10.0), (10.0, 30.0)]
+    assert body['products'] == [{
+        'product_id': product.id, 'product_name': 'Bread', 'quantity': 20.0, 'value': 40.0, 'average_cost': 2.0,
+    }]
+    assert (body['total_quantity'], body['total_value']) == (20.0, 40.0)
+
+
+def test_valuation_endpoint_rejects_bad_product_ids(shop):
+    response = Client().get(reverse('cost-layer-valuation'), {'product_id': 'x'})
+    assert response.status_code == 400
+
+
+def patch_product(product, data):
+    return Client().patch(reverse('product-detail', kwargs={'product_id': product.id}), json.dumps(data), content_type='application/json')
+
+
+def test_product_stock_edit_is_posted_through_the_layers(shop, received):
+    product = received('fifo')
+
+    assert patch_product(product, {'name': 'Rye', 'stock_quantity': '12'}).status_code == 200
+
+    product.refresh_from_db()
+    assert (product.name, product.stock_quantity) == ('Rye', Decimal('12.00'))
+    movement = StockMovement.objects.get(product=product, movement_type='ADJUSTMENT')
+    assert (movement.quantity_change, movement.cost_price) == (Decimal('-8.00'), Decimal('1.00'))
+    assert open_layers(product) == [(Decimal('2.00'), Decimal('1.0000')), (Decimal('10.00'), Decimal('3.0000'))]
+
+
+def test_product_cost_edit_is_left_to_the_layers(shop, received):
+    product = received('fifo')
+
+    patch_product(product, {'cost_price': '9.00'})
+
+    product.refresh_from_db()
+    assert product.cost_price == Decimal('2.00')
+    assert not StockMovement.objects.filter(movement_type='ADJUSTMENT').exists()
+
+
+def test_product_cost_edit_is_taken_without_layers(shop, product):
+    patch_product(product, {'cost_price': '1.50', 'stock_quantity': '25'})
+
+    product.refresh_from_db()
+    assert (product.cost_price, product.stock_quantity) == (Decimal('1.50'), Decimal('25.00'))
+    # The 20 units on hand open at the new cost and the 5 added join them at it
+    assert open_layers(product) == [(Decimal('25.00'), Decimal('1.5000'))]
+
+
+def test_staff_lunch_moves_stock_once_through_the_layers(shop, cashier, received):
+    product = received('fifo')
+    response = Client().post(reverse('staff-lunch-list'), json.dumps({
+        'password': '-', 'product_id': product.id, 'quantity': '12', 'cashier_id': cashier.id,
+    }), content_type='application/json')
+
+    assert response.status_code == 201, response.content
+    product.refresh_from_db()
+    assert product.stock_quantity == Decimal('8.00')
+    movement = StockMovement.objects.get(product=product, movement_type='STAFF_LUNCH')
+    assert (movement.quantity_change, movement.cost_price, movement.performed_by) == (Decimal('-12.00'), Decimal('1.33'), cashier)
+    assert open_layers(product) == [(Decimal('8.00'), Decimal('3.0000'))]
+
+    lunch = StaffLunch.objects.get()
+    lunch.notes = 'Edited'
+    lunch.save()
+    product.refresh_from_db()
+    assert product.stock_quantity == Decimal('8.00')
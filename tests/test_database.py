@@ -0,0 +1,41 @@
+"""
+Backend-specific paths. They run on whichever database DATABASE_URL selects (see
+conftest.py), so the PostgreSQL-only branches are covered once it points at PostgreSQL.
+"""
+from decimal import Decimal
+
+import pytest
+from django.db import connection
+
+from core.bulk_load import copy_insert, uses_copy
+from core.management.commands.check_database import run_checks
+from core.models import Product
+
+postgresql_only = pytest.mark.skipif(connection.vendor != 'postgresql', reason="needs DATABASE_URL=postgres://...")
+
+
+def test_check_database_scenarios(db):
+    results = []
+    run_checks(lambda name, ok: results.append((name, ok)))
+
+    assert results
+    assert [name for name, ok in results if not ok] == []
+
+
+@postgresql_only
+def test_bulk_load_uses_copy_on_postgresql():
+    assert uses_copy(connection)
+
+
+def test_copy_insert_writes_defaults_and_given_keys(shop):
+    products = [
+        Product(shop=shop, name=f'Loaded {i}', price=Decimal('1.00'), cost_price=Decimal('0.50'), category='General')
+        for i in range(3)
+    ]
+    products[0].id = 10_000_001
+
+    assert copy_insert(Product, products) == 3
+    loaded = Product.objects.filter(shop=shop).order_by('name')
+    assert [product.name for product in loaded] == ['Loaded 0', 'Loaded 1', 'Loaded 2']
+    assert loaded[0].id == 10_000_001
+    assert all(product.created_at is not None for product in loaded)
@@ -0,0 +1,60 @@
+import json
+from decimal import Decimal
+
+import pytest
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.models import Expense, InventoryLog, StockMovement
+
+
+@pytest.fixture
+def product_fields():
+    return {'line_code': 'PIE1'}
+
+
+def post_expense(data):
+    with CaptureQueriesContext(connection) as queries:
+        response = Client().post(
+            reverse('expense-list'), json.dumps({'password': '-', 'date': '2026-10-19', **data}), content_type='application/json',
+        )
+    return response, len(queries)
+
+
+def test_staff_lunch_from_stock_moves_stock_once(cashier, product):
+    response, queries = post_expense({
+        'category': 'Staff Lunch', 'description': 'Lunch', 'amount': '2.50', 'product_lookup_code': 'PIE1',
+        'quantity': '2', 'staff_lunch_type': 'stock', 'cashier_id': cashier.id,
+    })
+
+    assert response.status_code == 201, response.content
+    product.refresh_from_db()
+    assert product.stock_quantity == Decimal('18.00')
+    movement = StockMovement.objects.get(product=product)
+    assert (movement.movement_type, movement.quantity_change, movement.performed_by) == ('STAFF_LUNCH', Decimal('-2.00'), cashier)
+    assert InventoryLog.objects.filter(product=product, reason_code='EXPENSE').count() == 1
+    assert Expense.objects.get().recorded_by == cashier
+    # Shop, product lookup, cashier, serializer product check, then in one transaction: lock the product,
+    # insert the expense, consume a cost layer, move the stock, sync change, ledger and audit rows
+    assert queries == 14
+
+
+def test_expense_without_product_has_no_stock_side_effects(cashier, product):
+    response, queries = post_expense({
+        'category': 'Staff Lunch', 'description': 'Lunch money', 'amount': '5.00', 'product_lookup_code': 'PIE1',
+        'quantity': '1', 'staff_lunch_type': 'money', 'cashier_id': cashier.id,
+    })
+    assert response.status_code == 201, response.content
+    product.refresh_from_db()
+    assert product.stock_quantity == Decimal('20.00')
+    assert not StockMovement.objects.exists()
+
+    response, queries = post_expense({'category': 'Product Expense', 'description': 'Bags', 'amount': '4.00'})
+    assert response.status_code == 201, response.content
+    assert not StockMovement.objects.exists()
+    # Only the lunch tied to a product gets an audit row
+    assert InventoryLog.objects.filter(reason_code='EXPENSE').count() == 1
+    assert Expense.objects.count() == 2
+    assert queries == 4
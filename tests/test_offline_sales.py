@@ -0,0 +1,99 @@
+import json
+import uuid
+from decimal import Decimal
+
+import pytest
+from django.db import IntegrityError
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from core import offline_sales
+from core.models import InventoryLog, Sale, StockSnapshot
+from core.offline_sales import ingest_sales
+from core.stock_ledger import stock_as_of, take_snapshots
+
+
+def offline_sale(cashier, product, **item):
+    return {
+        'client_uuid': str(uuid.uuid4()), 'captured_at': '2026-10-19T09:30:00', 'cashier_id': cashier.id,
+        'payment_method': 'cash', 'items': [{'product_id': product.id, 'quantity': '2', **item}],
+    }
+
+
+@pytest.mark.parametrize('item', [
+    {'quantity': 'NaN'},
+    {'quantity': 'Infinity'},
+    {'quantity': '-Infinity'},
+    {'unit_price': 'NaN'},
+    {'unit_price': 'Infinity'},
+])
+def test_non_finite_lines_are_rejected(shop, cashier, product, item):
+    good = offline_sale(cashier, product)
+    outcomes = ingest_sales(shop, [offline_sale(cashier, product, **item), good])
+
+    assert [outcome['status'] for outcome in outcomes] == ['rejected', 'created']
+    assert Sale.objects.get().client_uuid == uuid.UUID(good['client_uuid'])
+    product.refresh_from_db()
+    assert product.stock_quantity == Decimal('18.00')
+
+
+def test_lost_race_is_retried_once(shop, cashier, product, monkeypatch):
+    post_sales = offline_sales._post_sales
+    calls = []
+
+    def racing(*args):
+        calls.append(args)
+        if len(calls) == 1:
+            raise IntegrityError('duplicate client_uuid')
+        return post_sales(*args)
+
+    monkeypatch.setattr(offline_sales, '_post_sales', racing)
+    assert ingest_sales(shop, [offline_sale(cashier, product)])[0]['status'] == 'created'
+    assert len(calls) == 2
+
+
+def test_persistent_conflict_is_not_retried_forever(shop, cashier, product, monkeypatch):
+    calls = []
+
+    def conflicting(*args):
+        calls.append(args)
+        raise IntegrityError('not a race')
+
+    monkeypatch.setattr(offline_sales, '_post_sales', conflicting)
+    with pytest.raises(IntegrityError):
+        ingest_sales(shop, [offline_sale(cashier, product)])
+    assert len(calls) == offline_sales.POST_ATTEMPTS
+
+
+def test_ledger_rows_keep_the_captured_time(shop, cashier, product):
+    ingest_sales(shop, [offline_sale(cashier, product)])
+
+    log = InventoryLog.objects.get(product=product, reason_code='SALE')
+    stored = Sale.objects.get()
+    assert log.created_at == stored.created_at < stored.synced_at
+
+
+def test_backdated_sale_drops_later_snapshots(shop, cashier, product):
+    take_snapshots(shop)
+    ingest_sales(shop, [offline_sale(cashier, product)])
+
+    assert not StockSnapshot.objects.filter(product=product).exists()
+    assert stock_as_of(shop, timezone.now())[product.id]['quantity'] == Decimal('18.00')
+
+
+def test_reposting_a_batch_through_the_endpoint_is_idempotent(shop, cashier, product):
+    sales = [offline_sale(cashier, product), offline_sale(cashier, product, quantity='1.5')]
+
+    def post():
+        return Client().post(reverse('offline-sale-batch'), json.dumps({'sales': sales}), content_type='application/json')
+
+    first, second = post(), post()
+
+    assert (first.status_code, first.json()['created'], first.json()['duplicates']) == (200, 2, 0)
+    assert (second.status_code, second.json()['created'], second.json()['duplicates']) == (200, 0, 2)
+    assert [result['sale_id'] for result in second.json()['results']] == [result['sale_id'] for result in first.json()['results']]
+    assert Sale.objects.count() == 2
+    assert InventoryLog.objects.filter(product=product, reason_code='SALE').count() == 2
+    product.refresh_from_db()
+    assert product.stock_quantity == Decimal('16.50')
@@ -0,0 +1,151 @@
+import random
+from decimal import Decimal
+
+import pytest
+
+from core.expenses import record_expense
+from core.models import Expense, Product, StockMovement, StockTransfer, Waste
+from core.quantities import fits_field, line_value, money, qty, ratio, stock_value, to_decimal
+from core.stock_ledger import ledger_deltas, post_stock_changes
+
+RUNS = 2000
+
+
+def hundredths(rng, low=-100_000, high=100_000):
+    """A random two-place value as (integer hundredths, Decimal)"""
+    units = rng.randint(low, high)
+    return units, Decimal(units).scaleb(-2)
+
+
+def cents_half_up(numerator, denominator):
+    """numerator / denominator rounded half up to a whole number, in integers only"""
+    quotient, remainder = divmod(abs(numerator), denominator)
+    if remainder * 2 >= denominator:
+        quotient += 1
+    return quotient if numerator >= 0 else -quotient
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_quantize_is_exact_and_idempotent(seed):
+    rng = random.Random(seed)
+    for _ in range(RUNS):
+        _, value = hundredths(rng)
+        raw = value + Decimal(rng.randint(0, 9999)).scaleb(-6)
+        assert qty(raw).as_tuple().exponent == -2
+        assert qty(qty(raw)) == qty(raw)
+        assert qty(str(qty(raw))) == qty(raw)
+        # Floats go through their shortest repr, so two-place floats round-trip exactly
+        assert qty(float(value)) == value
+        assert money(value) == value
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_sums_of_quantities_do_not_drift(seed):
+    rng = random.Random(seed)
+    units = [rng.randint(-50_000, 50_000) for _ in range(RUNS)]
+    total = sum((qty(Decimal(value).scaleb(-2)) for value in units), Decimal('0.00'))
+    assert total == Decimal(sum(units)).scaleb(-2)
+    assert total.as_tuple().exponent == -2
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_line_and_stock_values_round_once_to_the_cent(seed):
+    rng = random.Random(seed)
+    for _ in range(RUNS):
+        quantity_units, quantity = hundredths(rng)
+        price_units, price = hundredths(rng, 0)
+        expected = Decimal(cents_half_up(quantity_units * price_units, 100)).scaleb(-2)
+        assert line_value(quantity, price) == expected
+        assert line_value(str(quantity), float(price)) == expected
+        assert stock_value(quantity, price) == (expected if quantity > 0 else Decimal('0.00'))
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_ratio(seed):
+    rng = random.Random(seed)
+    for _ in range(RUNS):
+        numerator_units, numerator = hundredths(rng)
+        denominator_units, denominator = hundredths(rng)
+        if numerator <= 0 or denominator <= 0:
+            assert ratio(numerator, denominator) == 1
+            continue
+        expected = Decimal(cents_half_up(numerator_units * 10_000, denominator_units)).scaleb(-4)
+        assert ratio(numerator, denominator) == expected
+
+
+def test_to_decimal_accepts_field_inputs():
+    assert to_decimal(None) == 0
+    assert to_decimal('') == 0
+    assert to_decimal(' 2.50 ') == Decimal('2.50')
+    assert to_decimal(0.1) == Decimal('0.1')
+    assert to_decimal(3) == Decimal('3')
+
+
+@pytest.mark.parametrize('value, fits', [
+    ('99999999.99', True),
+    ('-99999999.99', True),
+    ('0.001', True),
+    ('99999999.994', True),
+    ('99999999.995', False),
+    ('100000000', False),
+    ('1e40', False),
+    ('NaN', False),
+    ('-Infinity', False),
+])
+def test_fits_field_bounds_to_the_stored_precision(value, fits):
+    assert fits_field(Decimal(value), Product._meta.get_field('stock_quantity')) is fits
+
+
+def random_stock_changes(shop, cashier, rng, products):
+    changes = [
+        {'product_id': rng.choice(products).id, 'quantity_change': hundredths(rng, -1_000, 1_000)[1]}
+        for _ in range(rng.randint(1, 10))
+    ]
+    post_stock_changes(shop, changes, rng.choice(['DAMAGE', 'TRANSFER', 'ADJUSTMENT', 'RECEIPT']))
+
+
+def random_transfers(shop, cashier, rng, products):
+    transfers = []
+    for _ in range(rng.randint(1, 4)):
+        source, destination = rng.sample(products, 2)
+        transfers.append(StockTransfer(
+            shop=shop, transfer_type=rng.choice(['TRANSFER', 'CONVERSION']), from_line_code=source.line_code,
+            from_quantity=hundredths(rng, 1, 2_000)[1], to_line_code=destination.line_code,
+            to_quantity=hundredths(rng, 1, 2_000)[1], performed_by=cashier,
+        ))
+    if len(transfers) == 1:
+        transfers[0].process_transfer()
+    else:
+        StockTransfer.process_batch(shop, transfers)
+
+
+def random_waste(shop, cashier, rng, products):
+    product = Product.objects.get(id=rng.choice(products).id)
+    Waste(shop=shop, product=product, quantity=hundredths(rng, 1, 1_000)[1], reason='DAMAGED', recorded_by=cashier).save()
+
+
+def random_staff_lunch(shop, cashier, rng, products):
+    record_expense(Expense(
+        shop=shop, category='Staff Lunch', description='Lunch', amount=Decimal('1.00'), staff_lunch_type='stock',
+        product_id=rng.choice(products).id, quantity=hundredths(rng, 1, 500)[1], recorded_by=cashier,
+    ))
+
+
+def test_ledger_matches_stock_after_random_movements(shop, cashier, make_product):
+    rng = random.Random(0)
+    products = [
+        make_product(name=f'Product {number}', line_code=f'P{number}', stock_quantity=Decimal('500.00'))
+        for number in range(5)
+    ]
+    writers = [random_stock_changes, random_transfers, random_waste, random_staff_lunch]
+    for _ in range(200):
+        rng.choice(writers)(shop, cashier, rng, products)
+
+    assert StockTransfer.objects.filter(status='COMPLETED').exists()
+    assert Expense.objects.exists()
+    # Waste.save() swallows stock errors, so check each waste moved stock
+    assert StockMovement.objects.filter(notes__startswith='Waste recorded').count() == Waste.objects.count() > 0
+    deltas = ledger_deltas(shop)
+    for product in Product.objects.filter(shop=shop):
+        # SQLite sums decimals as floats; quantize back to the stored precision
+        assert product.stock_quantity == Decimal('500.00') + qty(deltas.get(product.id, 0))
@@ -0,0 +1,37 @@
+"""
+Query-count gate (core/query_counts.py): every endpoint against the checked-in baseline.
+Timings vary between machines and are left to `manage.py check_query_counts`, which also
+re-records the baseline with --update.
+"""
+import contextlib
+
+import pytest
+from django.db import connections, transaction
+
+from core.query_counts import cases, load_baseline, measure_case, regressions, seed_fixtures
+
+BASELINE = load_baseline()
+
+
+@pytest.fixture(scope='module')
+def seeded(django_databases):
+    """The fixed dataset, seeded once for the module and rolled back afterwards"""
+    with contextlib.ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(transaction.atomic(using=alias))
+        yield seed_fixtures()
+        for alias in connections:
+            transaction.set_rollback(True, using=alias)
+
+
+@pytest.mark.parametrize('case', list(cases()), ids=lambda case: case[0])
+def test_endpoint_within_query_budget(seeded, case):
+    expected = BASELINE.get(case[0])
+    if expected is None:
+        pytest.skip("not in the baseline; record it with `manage.py check_query_counts --update`")
+
+    result = measure_case(seeded, case, repeat=1)
+
+    assert regressions(result, expected) == [], (
+        f"{case[0]}: {result['queries']} queries ({expected['queries']} in the baseline), status {result['status']}"
+    )
@@ -0,0 +1,18 @@
+import pytest
+from django.db import connection
+
+from core.management.commands.check_query_plans import full_scans, hot_queries
+
+
+@pytest.fixture
+def planner(db):
+    if connection.vendor == 'postgresql':
+        # Tiny test tables make sequential scans cheaper; only fail on what cannot use an index
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+
+@pytest.mark.parametrize('name', [name for name, _ in hot_queries(shop_id=1)])
+def test_hot_query_uses_an_index(planner, shop, name):
+    queryset = dict(hot_queries(shop_id=shop.id))[name]
+    assert full_scans(queryset.explain(), connection.vendor) == []
@@ -0,0 +1,59 @@
+import json
+from decimal import Decimal
+
+import pytest
+from django.test import Client
+from django.urls import reverse
+
+from core.models import GoodsReceivedNote
+
+
+@pytest.fixture
+def product_fields():
+    return {'line_code': 'RICE2'}
+
+
+def receive(line):
+    return Client().post(reverse('goods-received-list'), json.dumps({
+        'supplier_name': 'Wholesaler', 'supplier_invoice': 'INV-1', 'lines': [line],
+    }), content_type='application/json')
+
+
+@pytest.mark.parametrize('line', [
+    {'quantity': 'NaN'},
+    {'quantity': 'Infinity'},
+    {'quantity': '-Infinity'},
+    {'quantity': '3', 'unit_cost': 'NaN'},
+    {'quantity': '3', 'unit_cost': 'Infinity'},
+    {'quantity': 'lots'},
+    {'quantity': '1e40'},
+    {'quantity': '99999999999'},
+    {'quantity': '3', 'unit_cost': '1e40'},
+    {'quantity': '3', 'unit_cost': '123456789.00'},
+    {'identifier': [1], 'quantity': '3'},
+    {'identifier': {'line_code': 'RICE2'}, 'quantity': '3'},
+])
+def test_non_finite_oversized_or_malformed_lines_are_rejected(product, line):
+    response = receive({'identifier': 'RICE2', **line})
+
+    assert response.status_code == 400, response.content
+    assert not GoodsReceivedNote.objects.exists()
+
+
+@pytest.mark.parametrize('line', [
+    {'quantity': '0'},
+    {'quantity': '-2'},
+    {'quantity': '3', 'unit_cost': '-1'},
+    # Each fits its own field, but the new stock level does not
+    {'quantity': '99999999.99'},
+])
+def test_service_checks_still_reject_out_of_range_lines(product, line):
+    assert receive({'identifier': 'RICE2', **line}).status_code == 400
+
+
+def test_receipt_adds_stock(product):
+    response = receive({'identifier': 'RICE2', 'quantity': '3', 'unit_cost': '2.80'})
+
+    assert response.status_code == 201, response.content
+    product.refresh_from_db()
+    assert product.stock_quantity == Decimal('23.00')
@@ -0,0 +1,55 @@
+from decimal import Decimal
+
+import pytest
+from django.core.cache import cache
+from django.test import TestCase
+
+from core.expenses import record_expense
+from core.models import Expense
+from core.reports import _version_key, cached_profit_and_loss, invalidate_pnl
+from core.time_windows import local_today
+
+
+@pytest.fixture
+def empty_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+def spend(shop, amount):
+    with TestCase.captureOnCommitCallbacks(execute=True):
+        record_expense(Expense(
+            shop=shop, category='Product Expense', description='Bags', amount=Decimal(amount), expense_date=local_today(),
+        ))
+
+
+def test_posting_expires_the_cached_report(shop, empty_cache):
+    today = local_today()
+    assert cached_profit_and_loss(shop, today, today)['expenses']['total'] == 0
+    spend(shop, '4.00')
+    assert cached_profit_and_loss(shop, today, today)['expenses']['total'] == 4.0
+
+
+def test_evicted_version_does_not_revive_a_stale_report(shop, empty_cache):
+    today = local_today()
+    cached_profit_and_loss(shop, today, today)
+    spend(shop, '4.00')
+    assert cached_profit_and_loss(shop, today, today)['expenses']['total'] == 4.0
+    spend(shop, '6.00')
+
+    # The version key is culled, as LocMemCache does past MAX_ENTRIES
+    cache.delete(_version_key(shop.id, today.year, today.month))
+    assert cached_profit_and_loss(shop, today, today)['expenses']['total'] == 10.0
+
+
+def test_versions_never_repeat(shop, empty_cache):
+    today = local_today()
+    key = _version_key(shop.id, today.year, today.month)
+    seen = set()
+    for _ in range(3):
+        with TestCase.captureOnCommitCallbacks(execute=True):
+            invalidate_pnl(shop.id, today)
+        seen.add(cache.get(key))
+        cache.delete(key)
+    assert len(seen) == 3
@@ -0,0 +1,62 @@
+import json
+from decimal import Decimal
+
+import pytest
+from django.db import transaction
+from django.test import Client
+from django.urls import reverse
+
+from core.cost_layers import apply_stock_costs
+from core.models import Sale, SaleItem
+from core.stock_ledger import post_stock_changes
+
+
+def checkout(cashier, product, quantity):
+    return Client().post(reverse('sale-list'), json.dumps({
+        'cashier_id': cashier.id,
+        'items': [{'product_id': str(product.id), 'quantity': quantity}],
+        'payment_method': 'cash',
+    }), content_type='application/json')
+
+
+@pytest.mark.parametrize('quantity', ['0', '-1', '0.00', 'NaN', 'Infinity', 'two', '', '1e40', '99999999999'])
+def test_checkout_rejects_quantities_that_are_not_positive(cashier, product, quantity):
+    response = checkout(cashier, product, quantity)
+
+    assert response.status_code == 400, response.content
+    assert not Sale.objects.exists()
+    product.refresh_from_db()
+    assert product.stock_quantity == Decimal('20.00')
+
+
+def test_checkout_rejects_a_total_too_large_to_store(cashier, product):
+    response = checkout(cashier, product, '99999999')
+
+    assert response.status_code == 400, response.content
+    assert not Sale.objects.exists()
+
+
+def test_checkout_costs_the_line_from_its_layers(shop, cashier, product):
+    shop.costing_method = 'fifo'
+    shop.save()
+    with transaction.atomic():
+        post_stock_changes(shop, [{'product_id': product.id, 'quantity_change': Decimal('10'), 'cost_price': Decimal('3.00')}], 'RECEIPT')
+    product.refresh_from_db()
+    # 20 on hand at 1.00 and 10 received at 3.00
+    assert product.cost_price == Decimal('1.67')
+
+    response = checkout(cashier, product, '3')
+
+    assert response.status_code == 201, response.content
+    item = SaleItem.objects.get()
+    # The oldest layer, not the carrying cost
+    assert (item.quantity, item.unit_cost) == (Decimal('3.00'), Decimal('1.00'))
+    product.refresh_from_db()
+    assert (product.stock_quantity, product.cost_price) == (Decimal('27.00'), Decimal('1.74'))
+
+
+@pytest.mark.parametrize('new_stock', ['20.00', '25.00'])
+def test_apply_stock_costs_fills_cost_price_when_nothing_is_consumed(shop, product, new_stock):
+    change = {'product_id': product.id, 'previous_stock': product.stock_quantity, 'new_stock': Decimal(new_stock)}
+    apply_stock_costs(shop, [change], {product.id: product})
+    assert change['cost_price'] == Decimal('1.00')
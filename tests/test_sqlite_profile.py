@@ -0,0 +1,39 @@
+import pytest
+from django.conf import settings
+from django.db.utils import ConnectionHandler
+
+from core.sqlite_profile import PRODUCTION_PRAGMAS, sqlite_database, sqlite_pragmas
+
+PLAIN = {'ENGINE': 'django.db.backends.sqlite3'}
+
+
+@pytest.fixture(autouse=True)
+def no_settings_pragmas(monkeypatch):
+    monkeypatch.delattr(settings, 'SQLITE_PRAGMAS', raising=False)
+
+
+def journal_mode(entry):
+    connection = ConnectionHandler({'default': entry})['default']
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            return cursor.fetchone()[0]
+    finally:
+        connection.close()
+
+
+def test_plain_entries_keep_sqlite_defaults(tmp_path):
+    assert sqlite_pragmas(PLAIN) == {}
+    assert journal_mode({**PLAIN, 'NAME': str(tmp_path / 'plain.sqlite3')}) == 'delete'
+
+
+def test_sqlite_database_opts_in(tmp_path):
+    assert sqlite_pragmas(sqlite_database('db.sqlite3')) == PRODUCTION_PRAGMAS
+    assert sqlite_pragmas(sqlite_database('db.sqlite3', pragmas={'synchronous': 'FULL'})) == {'synchronous': 'FULL'}
+    assert journal_mode(sqlite_database(str(tmp_path / 'tuned.sqlite3'), conn_max_age=0)) == 'wal'
+
+
+def test_settings_pragmas_opt_every_database_in(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'SQLITE_PRAGMAS', {'journal_mode': 'WAL'}, raising=False)
+    assert sqlite_pragmas(PLAIN) == {'journal_mode': 'WAL'}
+    assert journal_mode({**PLAIN, 'NAME': str(tmp_path / 'plain.sqlite3')}) == 'wal'
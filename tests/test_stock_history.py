@@ -0,0 +1,34 @@
+from decimal import Decimal
+
+import pytest
+from django.test import Client
+from django.urls import reverse
+
+
+def stock_as_of(**params):
+    return Client().get(reverse('stock-as-of'), params)
+
+
+@pytest.mark.parametrize('params', [
+    {'at': '2026-13-45'},
+    {'at': '2026-02-30'},
+    {'at': '2026-01-01T25:00:00'},
+    {'at': 'yesterday'},
+    {'at': '2026-01-01', 'product_id': 'abc'},
+    {'at': '2026-01-01', 'product_id': '1.5'},
+])
+def test_invalid_parameters_are_rejected(shop, params):
+    response = stock_as_of(**params)
+    assert response.status_code == 400, response.content
+
+
+def test_stock_of_one_product(product):
+    response = stock_as_of(at='2999-01-01', product_id=str(product.id))
+
+    assert response.status_code == 200, response.content
+    [row] = response.json()['products']
+    assert (row['product_id'], Decimal(str(row['stock_quantity']))) == (product.id, Decimal('20.00'))
+
+
+def test_unknown_product_is_not_found(shop):
+    assert stock_as_of(at='2026-01-01', product_id='999999').status_code == 404
@@ -0,0 +1,118 @@
+import json
+from decimal import Decimal
+
+import pytest
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.models import Product, StockMovement, StockTransfer
+from core.product_lookup import IdentifierResolver
+
+
+@pytest.fixture
+def products(make_product):
+    return [
+        make_product(
+            name=f'Product {number}', stock_quantity=Decimal('100'), line_code=f'LC{number}', barcode=f'600{number:04d}',
+            additional_barcodes=[f'700{number:04d}'],
+        )
+        for number in range(10)
+    ]
+
+
+def transfers_between(shop, cashier, pairs):
+    return [
+        StockTransfer(
+            shop=shop, transfer_type='TRANSFER', from_line_code=source.line_code, from_quantity=Decimal('2'),
+            to_barcode=destination.barcode, to_quantity=Decimal('2'), performed_by=cashier,
+        )
+        for source, destination in pairs
+    ]
+
+
+def post_action(shop, name, body):
+    return Client().post(reverse(name), json.dumps(body), content_type='application/json', HTTP_X_SHOP_ID=str(shop.shop_id))
+
+
+def post_batch(shop, transfers):
+    return post_action(shop, 'stocktransfer-batch', {'transfers': transfers})
+
+
+def test_resolver_primes_once_and_memoizes_hits_and_misses(shop, products):
+    resolver = IdentifierResolver(shop)
+    identifiers = ['LC1', '6000002', '7000003', 'missing']
+    with CaptureQueriesContext(connection) as primed:
+        resolver.prime(identifiers)
+    with CaptureQueriesContext(connection) as repeated:
+        resolved = [resolver.resolve(identifier) for identifier in identifiers * 2]
+
+    assert len(primed) == 1
+    assert len(repeated) == 0
+    assert resolved[:4] == [products[1], products[2], products[3], None]
+    assert [IdentifierResolver.match_method(product, identifier)
+            for product, identifier in zip(resolved[:3], identifiers)] == ['line_code', 'barcode', 'additional_barcode']
+
+
+@pytest.mark.parametrize('size', [1, 5])
+def test_batch_query_count_does_not_grow_with_transfers(shop, cashier, products, size):
+    transfers = transfers_between(shop, cashier, zip(products[:size], products[size:2 * size]))
+    with CaptureQueriesContext(connection) as queries:
+        success, results = StockTransfer.process_batch(shop, transfers)
+
+    assert success, results
+    # Savepoint, lock and resolve both sides, insert the transfers, read and add cost layers,
+    # move the stock, record the sync change, insert the ledger rows, release
+    assert len(queries) == 9, [query['sql'] for query in queries]
+    stock = dict(Product.objects.filter(shop=shop).values_list('id', 'stock_quantity'))
+    for source, destination in zip(products[:size], products[size:2 * size]):
+        assert stock[source.id] == Decimal('98')
+        assert stock[destination.id] == Decimal('102')
+    assert StockMovement.objects.filter(shop=shop, movement_type='TRANSFER').count() == 2 * size
+
+
+@pytest.mark.parametrize('quantity', ['NaN', 'sNaN', 'Infinity', '-Infinity', '1e40', '99999999999'])
+@pytest.mark.parametrize('side', ['from_quantity', 'to_quantity'])
+def test_batch_rejects_non_finite_or_oversized_quantities(shop, products, side, quantity):
+    transfer = {'transfer_type': 'TRANSFER', 'from_line_code': 'LC0', 'from_quantity': '1', 'to_line_code': 'LC1', 'to_quantity': '1'}
+    response = post_batch(shop, [transfer, {**transfer, side: quantity}])
+
+    assert response.status_code == 400, response.content
+    assert response.json()['error'] == 'Invalid transfer at index 1'
+    assert not StockTransfer.objects.exists()
+
+
+def test_batch_falls_back_to_a_name_search_like_single_transfers(shop, products):
+    response = post_batch(shop, [{
+        'transfer_type': 'TRANSFER', 'from_line_code': 'product 3', 'from_quantity': '2',
+        'to_line_code': 'LC4', 'to_quantity': '2',
+    }])
+
+    assert response.status_code == 201, response.content
+    stock = dict(Product.objects.filter(shop=shop).values_list('id', 'stock_quantity'))
+    assert stock[products[3].id] == Decimal('98')
+    assert stock[products[4].id] == Decimal('102')
+
+
+
+TRANSFER = {'transfer_type': 'TRANSFER', 'from_line_code': 'LC0', 'from_quantity': '2', 'to_barcode': '7000001', 'to_quantity': '2'}
+
+
+# Each counts the shop lookup and one query resolving every identifier, plus one per name
+# search. create then runs process_batch on the resolved products: savepoint, lock, insert
+# the transfer, read and add cost layers, move the stock, record the sync change, insert
+# the ledger rows, release
+@pytest.mark.parametrize('name, body, expected_status, expected_queries', [
+    ('stocktransfer-list', TRANSFER, 201, 11),
+    ('stocktransfer-validate-transfer', TRANSFER, 200, 2),
+    ('stocktransfer-validate-transfer', {**TRANSFER, 'from_line_code': 'product 5'}, 200, 3),
+    ('stocktransfer-find-product', {'identifier': '7000003'}, 200, 2),
+    ('stocktransfer-find-product', {'identifier': 'missing'}, 404, 2),
+], ids=['create', 'validate', 'validate-by-name', 'find-product', 'find-product-miss'])
+def test_endpoint_query_counts(shop, products, name, body, expected_status, expected_queries):
+    with CaptureQueriesContext(connection) as queries:
+        response = post_action(shop, name, body)
+
+    assert response.status_code == expected_status, response.content
+    assert len(queries) == expected_queries, [query['sql'] for query in queries]
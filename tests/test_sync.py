@@ -0,0 +1,43 @@
+import pytest
+
+from core.etags import resource_version
+from core.models import SyncChange, SyncSequence
+from core.sync import changes_since, sequence_changes
+
+
+@pytest.fixture
+def products(make_product):
+    return [make_product(name=name) for name in ('Tea', 'Sugar', 'Salt')]
+
+
+def test_changes_are_numbered_on_read(shop, products):
+    assert SyncChange.objects.filter(position__isnull=True).exists()
+
+    cursor = sequence_changes(shop)
+
+    assert not SyncChange.objects.filter(position__isnull=True).exists()
+    assert cursor == SyncSequence.objects.get(shop=shop).last_position
+    assert sequence_changes(shop) == cursor
+
+
+def test_late_commit_is_delivered_after_the_cursor(shop, products):
+    tea, sugar, salt = products
+    first = changes_since(shop, None)['cursor']
+
+    # A transaction that took a lower id commits only after a larger id was numbered
+    late = SyncChange.objects.create(shop=shop, resource='product', object_id=sugar.id)
+    SyncChange.objects.create(shop=shop, resource='product', object_id=salt.id)
+    middle = changes_since(shop, first)['cursor']
+    late.position = None
+    late.save(update_fields=['position'])
+
+    delta = changes_since(shop, middle)
+
+    assert [row['id'] for row in delta['products']] == [sugar.id]
+    assert delta['cursor'] > middle
+
+
+def test_etag_version_moves_with_a_late_commit(shop, products):
+    before = resource_version(shop, 'product')
+    SyncChange.objects.create(shop=shop, resource='product', object_id=products[0].id)
+    assert resource_version(shop, 'product') > before
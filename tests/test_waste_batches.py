@@ -0,0 +1,49 @@
+import json
+from decimal import Decimal
+
+import pytest
+from django.test import Client
+from django.urls import reverse
+
+from core.models import Waste, WasteBatch
+
+
+@pytest.fixture
+def product_fields():
+    return {'line_code': 'BRD1'}
+
+
+@pytest.fixture
+def batch(shop):
+    return WasteBatch.objects.create(shop=shop, reason='DAMAGED')
+
+
+def add_items(batch, items):
+    return Client().post(
+        reverse('waste-batch-items-bulk', kwargs={'batch_id': batch.id}), json.dumps({'items': items}),
+        content_type='application/json',
+    )
+
+
+@pytest.mark.parametrize('quantity', ['NaN', 'Infinity', '-Infinity', '1e40', '99999999999'])
+def test_non_finite_or_oversized_quantities_are_rejected(batch, product, quantity):
+    response = add_items(batch, [{'product_id': product.id, 'quantity': quantity}])
+
+    assert response.status_code == 400, response.content
+    assert not Waste.objects.exists()
+
+
+@pytest.mark.parametrize('identifier', [[1], {'line_code': 'BRD1'}, 7])
+def test_identifiers_must_be_strings(batch, product, identifier):
+    response = add_items(batch, [{'identifier': identifier, 'quantity': '1'}])
+
+    assert response.status_code == 400, response.content
+    assert response.json()['error'] == 'Invalid item at index 0'
+
+
+def test_items_by_identifier_move_stock(batch, product):
+    response = add_items(batch, [{'identifier': 'BRD1', 'quantity': '1.5'}])
+
+    assert response.status_code == 201, response.content
+    product.refresh_from_db()
+    assert product.stock_quantity == Decimal('18.50')
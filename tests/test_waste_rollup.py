@@ -0,0 +1,44 @@
+from decimal import Decimal
+
+import pytest
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from core.models import Waste, WasteRollup
+from core.waste_analytics import record_wastes
+
+
+def waste(product, cashier=None, quantity='1.50'):
+    # record_wastes only reads the key and the totals, so unsaved records are enough
+    return Waste(
+        shop=product.shop, product=product, recorded_by=cashier, reason='EXPIRED', quantity=Decimal(quantity),
+        waste_value=Decimal(quantity) * product.cost_price, created_at=timezone.now(),
+    )
+
+
+@pytest.mark.parametrize('with_cashier', [False, True])
+def test_rollup_key_is_unique_with_and_without_cashier(product, cashier, with_cashier):
+    recorded_by = cashier if with_cashier else None
+    record_wastes([waste(product, recorded_by)])
+    row = WasteRollup.objects.get(product=product)
+
+    with pytest.raises(IntegrityError), transaction.atomic():
+        WasteRollup.objects.create(
+            shop=row.shop, day=row.day, reason=row.reason, product=product, recorded_by=recorded_by,
+        )
+
+
+def test_record_and_unrecord_fold_into_one_row(product, cashier):
+    wastes = [waste(product), waste(product, quantity='2.25'), waste(product, cashier)]
+    record_wastes(wastes[:1])
+    record_wastes(wastes[1:])
+
+    without_cashier = WasteRollup.objects.get(product=product, recorded_by=None)
+    assert (without_cashier.waste_count, without_cashier.total_quantity) == (2, Decimal('3.75'))
+    assert WasteRollup.objects.get(product=product, recorded_by=cashier).waste_count == 1
+
+    record_wastes(wastes[:1], sign=-1)
+    without_cashier.refresh_from_db()
+    assert (without_cashier.waste_count, without_cashier.total_quantity, without_cashier.total_value) == (
+        1, Decimal('2.25'), Decimal('2.25'),
+    )